@@ -0,0 +1,236 @@
+import argparse
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from utils import get_db_connection, init_db
+from stages import STAGES, StageContext
+from processors.snapshot import publish_snapshot
+
+# Backfill stages in the order they run for each ticker. Each takes
+# (ctx, ticker, params, cursor, save_cursor): cursor is the stage's saved progress
+# (a dict) and save_cursor(dict) persists new progress right after each upstream
+# unit of work, so a restarted run skips everything already fetched.
+BACKFILL_STAGES = {}
+
+def backfill_stage(name):
+    def register(run):
+        BACKFILL_STAGES[name] = run
+        return run
+    return register
+
+@backfill_stage("company")
+def backfill_company(ctx, ticker, params, cursor, save_cursor):
+    STAGES["company"].run(ctx, ticker)
+
+@backfill_stage("financials")
+def backfill_financials(ctx, ticker, params, cursor, save_cursor):
+    done = set(cursor.get("years", []))
+
+    def on_year(year):
+        done.add(year)
+        save_cursor({"years": sorted(done)})
+
+    ctx.collector("financials").backfill(ticker, years=params["years"], done_years=done, on_year=on_year, strict=True)
+
+@backfill_stage("disclosures")
+def backfill_disclosures(ctx, ticker, params, cursor, save_cursor):
+    """Lists one calendar year at a time; a year is done once all its documents are fetched."""
+    collector = ctx.collector("disclosures")
+    years = set(cursor.get("years", []))
+    documents = set(cursor.get("documents", [])) # fetched documents of unfinished years
+    incomplete = []
+    current = date.today().year
+    for year in range(current - params["years"] + 1, current + 1):
+        if year in years:
+            continue
+        reports = collector.list_reports(ticker, f"{year}0101", f"{year}1231")
+        missing = False
+        for report in reports:
+            if report["rcept_no"] in documents:
+                continue
+            if report["rcept_no"] in collector.save_reports(ticker, [report]):
+                documents.add(report["rcept_no"])
+                save_cursor({"years": sorted(years), "documents": sorted(documents)})
+            else:
+                missing = True
+        if missing:
+            incomplete.append(year)
+            continue
+        years.add(year)
+        documents -= {report["rcept_no"] for report in reports}
+        save_cursor({"years": sorted(years), "documents": sorted(documents)})
+    if incomplete:
+        raise RuntimeError(f"documents could not be fetched for {', '.join(map(str, incomplete))}")
+
+@backfill_stage("market")
+def backfill_market(ctx, ticker, params, cursor, save_cursor):
+    ctx.collector("market").fetch_daily_data(ticker, days=365 * params["years"])
+
+@backfill_stage("derived")
+def backfill_derived(ctx, ticker, params, cursor, save_cursor):
+    from collector import collect_all
+    results = collect_all(ticker, ctx, stages=["ratios", "markdown"], force=True)
+    failed = [name for name, (status, *_) in results.items() if status == "error"]
+    if failed:
+        raise RuntimeError(f"stage(s) failed: {', '.join(failed)}")
+
+class RunLedger:
+    """
+    Progress of one backfill run in run_ledger: status and cursor per (ticker, stage).
+    Every update commits at once, so a crash loses at most the unit in flight.
+    """
+    def __init__(self, run_id):
+        init_db()
+        self.run_id = run_id
+
+    def _write(self, sql, params):
+        conn = get_db_connection()
+        try:
+            conn.execute(sql, params)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def start(self, params):
+        """Registers the run, or returns the parameters it was started with."""
+        conn = get_db_connection()
+        try:
+            row = conn.execute("SELECT params FROM backfill_runs WHERE run_id = ?", (self.run_id,)).fetchone()
+            if row:
+                conn.execute("UPDATE backfill_runs SET status = 'running', finished_at = NULL WHERE run_id = ?", (self.run_id,))
+                conn.commit()
+                return json.loads(row['params']), True
+            conn.execute("INSERT INTO backfill_runs (run_id, params) VALUES (?, ?)", (self.run_id, json.dumps(params)))
+            conn.executemany(
+                "INSERT INTO run_ledger (run_id, ticker, stage) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+                [(self.run_id, ticker, stage) for ticker in params["tickers"] for stage in params["stages"]]
+            )
+            conn.commit()
+            return params, False
+        finally:
+            conn.close()
+
+    def entries(self, ticker):
+        """{stage: row} for a ticker."""
+        conn = get_db_connection()
+        try:
+            return {row['stage']: row for row in conn.execute(
+                "SELECT stage, status, cursor, attempts FROM run_ledger WHERE run_id = ? AND ticker = ?",
+                (self.run_id, ticker)
+            )}
+        finally:
+            conn.close()
+
+    def begin(self, ticker, stage):
+        self._write("""
+            UPDATE run_ledger SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE run_id = ? AND ticker = ? AND stage = ?
+        """, (self.run_id, ticker, stage))
+
+    def save_cursor(self, ticker, stage, cursor):
+        self._write("""
+            UPDATE run_ledger SET cursor = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE run_id = ? AND ticker = ? AND stage = ?
+        """, (json.dumps(cursor), self.run_id, ticker, stage))
+
+    def finish(self, ticker, stage, error=None):
+        self._write("""
+            UPDATE run_ledger SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE run_id = ? AND ticker = ? AND stage = ?
+        """, ("error" if error else "done", error, self.run_id, ticker, stage))
+
+    def summary(self):
+        conn = get_db_connection()
+        try:
+            return {row['status']: row['n'] for row in conn.execute(
+                "SELECT status, COUNT(*) AS n FROM run_ledger WHERE run_id = ? GROUP BY status", (self.run_id,)
+            )}
+        finally:
+            conn.close()
+
+    def close(self, done):
+        if done:
+            self._write(
+                "UPDATE backfill_runs SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE run_id = ?", (self.run_id,)
+            )
+
+class Backfill:
+    """
+    Resumable universe backfill. Every (ticker, stage) of a run is recorded in
+    run_ledger; restarting with the same run id skips finished stages and resumes
+    paginated ones from their cursor. Writes go through upsert_data, so replaying
+    the unit that was in flight when a run died changes nothing.
+    """
+    def __init__(self, run_id, workers=1):
+        self.ledger = RunLedger(run_id)
+        self.workers = workers
+        self.ctx = StageContext()
+
+    def run_ticker(self, ticker, params):
+        entries = self.ledger.entries(ticker)
+        for stage in params["stages"]:
+            entry = entries.get(stage)
+            if entry is None or entry['status'] == "done":
+                continue
+            cursor = json.loads(entry['cursor']) if entry['cursor'] else {}
+            print(f"\n[{ticker}] {stage} (attempt {entry['attempts'] + 1}{', resuming' if cursor else ''})")
+            self.ledger.begin(ticker, stage)
+            try:
+                BACKFILL_STAGES[stage](self.ctx, ticker, params, cursor,
+                                       lambda c, stage=stage: self.ledger.save_cursor(ticker, stage, c))
+            except Exception as e:
+                print(f"[{ticker}] {stage} failed: {e}")
+                self.ledger.finish(ticker, stage, str(e))
+                return False # later stages build on this one; retried on the next run
+            self.ledger.finish(ticker, stage)
+        return True
+
+    def run(self, params):
+        params, resumed = self.ledger.start(params)
+        if resumed:
+            print(f"Resuming run {self.ledger.run_id}: {len(params['tickers'])} tickers, "
+                  f"{params['years']} years, stages {','.join(params['stages'])}")
+        else:
+            print(f"Started run {self.ledger.run_id}: {len(params['tickers'])} tickers, {params['years']} years")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda ticker: self.run_ticker(ticker, params), params["tickers"]))
+
+        summary = self.ledger.summary()
+        done = summary.get("done", 0) == sum(summary.values())
+        self.ledger.close(done)
+        print(f"\nRun {self.ledger.run_id}: " + ", ".join(f"{n} {status}" for status, n in sorted(summary.items()))
+              + f" in {time.perf_counter() - started:.1f}s")
+        if not done:
+            print(f"Re-run with --run-id {self.ledger.run_id} to continue.")
+        if any(results):
+            publish_snapshot()
+        return done
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpointed, resumable backfill of many companies")
+    parser.add_argument("tickers", nargs="*", help="Tickers to backfill (default: every company in the database)")
+    parser.add_argument("--run-id", help="Run to start or resume (default: a new id)")
+    parser.add_argument("--years", type=int, default=10, help="Years of history to backfill")
+    parser.add_argument("--stages", type=lambda s: s.split(","), default=list(BACKFILL_STAGES),
+                        help=f"Comma-separated subset of: {', '.join(BACKFILL_STAGES)}")
+    parser.add_argument("--workers", type=int, default=1, help="Tickers backfilled in parallel")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.stages if s not in BACKFILL_STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    tickers = args.tickers
+    if not tickers:
+        init_db()
+        conn = get_db_connection()
+        tickers = [row['ticker'] for row in conn.execute("SELECT ticker FROM companies ORDER BY ticker")]
+        conn.close()
+
+    run_id = args.run_id or f"backfill-{date.today():%Y%m%d}-{uuid.uuid4().hex[:6]}"
+    stages = [s for s in BACKFILL_STAGES if s in args.stages]
+    Backfill(run_id, workers=args.workers).run({"tickers": tickers, "years": args.years, "stages": stages})
@@ -0,0 +1,81 @@
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+
+from coordinator import LeaseCoordinator, LeaseWorker
+
+STAGES = ["company", "financials", "disclosures", "market"]
+
+def node(path, worker_id, work_seconds, batch, lease_seconds, executed):
+    """One collector node; stages sleep for work_seconds, standing in for DART round trips."""
+    def execute(ticker, stage_names):
+        time.sleep(work_seconds * len(stage_names))
+        with executed.get_lock():
+            executed.value += len(stage_names)
+        return {name: "ok" for name in stage_names}
+
+    LeaseWorker(LeaseCoordinator(path), worker_id, batch=batch, lease_seconds=lease_seconds, execute=execute).run(once=True)
+
+def crashed_node(path, batch, lease_seconds):
+    """Claims a batch and dies without reporting or heartbeating."""
+    LeaseCoordinator(path).claim("crashed", batch, lease_seconds)
+    os._exit(1)
+
+def run(workers, args, crash=False):
+    workdir = tempfile.mkdtemp(prefix="bench_leases_")
+    path = os.path.join(workdir, "coordinator.db")
+    coordinator = LeaseCoordinator(path)
+    coordinator.submit([(f"{i:06d}", stage) for i in range(args.tickers) for stage in STAGES])
+    total = args.tickers * len(STAGES)
+
+    executed = mp.Value("i", 0)
+    if crash:
+        p = mp.Process(target=crashed_node, args=(path, args.batch, args.lease_seconds))
+        p.start()
+        p.join()
+
+    started = time.perf_counter()
+    procs = [mp.Process(target=node, args=(path, f"node-{n}", args.work_ms / 1000, args.batch, args.lease_seconds, executed))
+             for n in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    if crash:
+        # Nodes exit when nothing is claimable; the crashed batch becomes claimable on expiry.
+        while coordinator.stats().get('leased'):
+            time.sleep(args.lease_seconds)
+            node(path, "late", args.work_ms / 1000, args.batch, args.lease_seconds, executed)
+    wall = time.perf_counter() - started
+
+    done = coordinator.stats().get('done', 0)
+    reclaimed = coordinator.conn.execute("SELECT COUNT(*) FROM work_leases WHERE attempts > 1").fetchone()[0]
+    coordinator.conn.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return total, done, executed.value, reclaimed, wall
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of lease-based work distribution vs. number of worker processes")
+    parser.add_argument("--tickers", type=int, default=100)
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts")
+    parser.add_argument("--work-ms", type=float, default=25, help="Simulated time per stage")
+    parser.add_argument("--batch", type=int, default=4, help="Units claimed at a time")
+    parser.add_argument("--lease-seconds", type=float, default=2)
+    args = parser.parse_args()
+
+    print(f"{args.tickers * len(STAGES)} units, {args.work_ms:.0f} ms per unit, batches of {args.batch}\n")
+    print(f"{'workers':>7} {'done':>6} {'runs':>6} {'wall s':>7} {'units/s':>8} {'speed-up':>9} {'efficiency':>11}")
+    base = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        total, done, executed, _, wall = run(workers, args)
+        rate = done / wall
+        base = base or rate / workers
+        print(f"{workers:>7} {done:>6} {executed:>6} {wall:>7.2f} {rate:>8.1f} {rate / base:>8.2f}x {rate / base / workers:>10.0%}")
+
+    # A node that dies holding a batch: its units are reclaimed once the lease expires and run once.
+    total, done, executed, reclaimed, wall = run(2, args, crash=True)
+    print(f"\nCrashed node holding {args.batch} unit(s): {reclaimed} reclaimed, {done}/{total} done, "
+          f"{executed} stage runs, {wall:.2f}s")
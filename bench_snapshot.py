@@ -0,0 +1,141 @@
+import argparse
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import utils
+from processors.snapshot import publish_snapshot
+
+# The analyze route's queries for one company page.
+PAGE_QUERIES = [
+    "SELECT * FROM companies WHERE ticker = ?",
+    "SELECT * FROM financials WHERE ticker = ? ORDER BY year DESC, quarter DESC LIMIT 4",
+    "SELECT * FROM market_daily WHERE ticker = ? ORDER BY date DESC LIMIT 365",
+    "SELECT * FROM shareholders WHERE ticker = ? ORDER BY share_ratio DESC LIMIT 5",
+    "SELECT * FROM company_segments WHERE ticker = ? ORDER BY period DESC, revenue_krw DESC LIMIT 10",
+]
+
+def seed(path, companies, days):
+    """Builds a database with the production schema and synthetic rows."""
+    utils.DB_FILE = path
+    utils.init_db()
+    conn = sqlite3.connect(path)
+    tickers = [f"{i:06d}" for i in range(companies)]
+    start = date(2024, 1, 1)
+    conn.executemany("INSERT INTO companies (ticker, name, shares_outstanding) VALUES (?, ?, 1000000)",
+                     [(t, f"Company {t}") for t in tickers])
+    conn.executemany("INSERT INTO market_daily (ticker, date, close, volume) VALUES (?, ?, ?, ?)",
+                     [(t, (start + timedelta(days=d)).isoformat(), 1000.0 + d, 10000)
+                      for t in tickers for d in range(days)])
+    conn.executemany("INSERT INTO financials (ticker, year, quarter, revenue, net_income) VALUES (?, ?, 0, ?, ?)",
+                     [(t, y, 10 ** 9, 10 ** 8) for t in tickers for y in range(2021, 2025)])
+    conn.commit()
+    conn.close()
+    return tickers
+
+def writer(path, mode, tickers, batch_rows, stop, batches):
+    """Collector stand-in: long executemany upsert transactions, back to back."""
+    sys.stdout = open(os.devnull, "w")  # publish_snapshot reports every swap
+    conn = sqlite3.connect(path, timeout=30)
+    sql = """
+        INSERT INTO market_daily (ticker, date, close, volume) VALUES (?, ?, ?, ?)
+        ON CONFLICT(ticker, date) DO UPDATE SET close = excluded.close, volume = excluded.volume
+    """
+    start = date(2024, 1, 1)
+    while not stop.is_set():
+        rows = [(random.choice(tickers), (start + timedelta(days=random.randrange(400))).isoformat(),
+                 random.random() * 1000, random.randrange(10 ** 6)) for _ in range(batch_rows)]
+        conn.executemany(sql, rows)
+        conn.commit()
+        if mode == "snapshot":
+            publish_snapshot(path, snapshot_path(path), vacuum=False)
+        batches.value += 1
+    conn.close()
+
+def snapshot_path(path):
+    return os.path.join(os.path.dirname(path), "data_read.db")
+
+def reader(path, mode, tickers, stop, results):
+    """Web stand-in: page loads with a 5s busy timeout (better-sqlite3's default)."""
+    target = snapshot_path(path) if mode == "snapshot" else path
+    conn, opened = None, None
+    latencies, errors = [], 0
+    while not stop.is_set():
+        if mode == "snapshot":
+            stat = os.stat(target)
+            if (stat.st_ino, stat.st_mtime_ns) != opened:
+                if conn:
+                    conn.close()
+                conn = sqlite3.connect(f"file:{target}?mode=ro", uri=True, timeout=5)
+                opened = (stat.st_ino, stat.st_mtime_ns)
+        elif conn is None:
+            conn = sqlite3.connect(target, timeout=5)
+        ticker = random.choice(tickers)
+        started = time.perf_counter()
+        try:
+            for sql in PAGE_QUERIES:
+                conn.execute(sql, (ticker,)).fetchall()
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put((latencies, errors))
+
+def run_mode(mode, base, tickers, args):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+    path = os.path.join(workdir, "data.db")
+    shutil.copy(base, path)
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode={'DELETE' if mode == 'rollback' else 'WAL'}")
+    conn.close()
+    if mode == "snapshot":
+        publish_snapshot(path, snapshot_path(path), vacuum=False)
+
+    stop = mp.Event()
+    batches = mp.Value("i", 0)
+    results = mp.Queue()
+    procs = [mp.Process(target=writer, args=(path, mode, tickers, args.batch_rows, stop, batches))]
+    procs += [mp.Process(target=reader, args=(path, mode, tickers, stop, results)) for _ in range(args.readers)]
+    for p in procs:
+        p.start()
+    time.sleep(args.duration)
+    stop.set()
+    collected = [results.get() for _ in range(args.readers)]
+    for p in procs:
+        p.join()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(l for ls, _ in collected for l in ls)
+    errors = sum(e for _, e in collected)
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float("nan")
+    return {
+        "mode": mode, "pages": len(latencies), "errors": errors, "batches": batches.value,
+        "p50": pct(0.50), "p99": pct(0.99), "max": latencies[-1] * 1000 if latencies else float("nan"),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Page-load latency while collectors write: data.db vs. read snapshot")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per mode")
+    parser.add_argument("--readers", type=int, default=4, help="Concurrent reader processes")
+    parser.add_argument("--companies", type=int, default=300)
+    parser.add_argument("--days", type=int, default=250, help="Daily price rows per company")
+    parser.add_argument("--batch-rows", type=int, default=50000, help="Rows per writer transaction")
+    parser.add_argument("--modes", default="rollback,wal,snapshot", help="Comma-separated: rollback, wal, snapshot")
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix="bench_seed_")
+    base = os.path.join(base_dir, "data.db")
+    tickers = seed(base, args.companies, args.days)
+    print(f"Seeded {args.companies} companies x {args.days} days; {args.readers} readers, "
+          f"{args.batch_rows} rows per write transaction, {args.duration:.0f}s per mode\n")
+
+    print(f"{'mode':<10} {'pages':>7} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'write batches':>14}")
+    for mode in args.modes.split(","):
+        r = run_mode(mode, base, tickers, args)
+        print(f"{r['mode']:<10} {r['pages']:>7} {r['errors']:>7} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['max']:>8.1f} {r['batches']:>14}")
+    shutil.rmtree(base_dir, ignore_errors=True)
@@ -0,0 +1,65 @@
+import argparse
+import subprocess
+import sys
+import time
+
+# Modules a command must not pull in unless it runs the stage that needs them.
+HEAVY_MODULES = ["bs4", "FinanceDataReader", "pandas", "numpy", "OpenDartReader"]
+
+# (name, code run in a fresh interpreter, modules that must stay unloaded)
+SCENARIOS = [
+    ("import collector", "import collector", HEAVY_MODULES),
+    ("resolve 6-digit ticker",
+     "from stages import StageContext, resolve_ticker; resolve_ticker(StageContext(), '005930')",
+     HEAVY_MODULES),
+    ("markdown stage import",
+     "import stages; import processors.markdown_generator",
+     ["bs4", "FinanceDataReader"]),
+]
+
+def run_scenario(code, forbidden, repeats):
+    """Returns (best wall time in seconds, forbidden modules that got imported)."""
+    probe = f"{code}\nimport sys\nprint(','.join(m for m in {forbidden!r} if m in sys.modules))"
+    best = None
+    loaded = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        loaded = [m for m in out.stdout.strip().splitlines()[-1].split(",") if m] if out.stdout.strip() else []
+    return best, loaded
+
+def baseline(repeats):
+    """Bare interpreter start-up, subtracted so the budget only covers our imports."""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark for the collector CLI")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Max import time per scenario on top of bare interpreter start-up")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per scenario (best time is used)")
+    args = parser.parse_args()
+
+    base = baseline(args.repeats)
+    print(f"Interpreter start-up: {base * 1000:.0f} ms (budget {args.budget_ms:.0f} ms on top)")
+
+    failed = False
+    for name, code, forbidden in SCENARIOS:
+        best, loaded = run_scenario(code, forbidden, args.repeats)
+        cost_ms = (best - base) * 1000
+        problems = []
+        if cost_ms > args.budget_ms:
+            problems.append(f"over budget by {cost_ms - args.budget_ms:.0f} ms")
+        if loaded:
+            problems.append(f"imported {', '.join(loaded)}")
+        status = "FAIL" if problems else "ok"
+        failed = failed or bool(problems)
+        print(f"[{status}] {name}: {cost_ms:.0f} ms" + (f" ({'; '.join(problems)})" if problems else ""))
+
+    sys.exit(1 if failed else 0)
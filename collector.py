@@ -1,75 +1,50 @@
 import argparse
-from collectors.companies import CompanyCollector
-from collectors.financials import FinancialsCollector
-from collectors.disclosures import DisclosuresCollector
-from collectors.market import MarketCollector
-from processors.markdown_generator import MarkdownGenerator
-from processors.ratios import RatioCalculator
-from datetime import datetime
-
-def collect_all(ticker):
+from stages import STAGES, StageContext, StageExecutor, resolve_ticker
+from processors.snapshot import publish_snapshot
+
+def collect_all(ticker, collectors=None, stages=None, force=False):
+    """
+    Runs the collection stages for a ticker. Independent stages run concurrently;
+    a stage waits only for the stages that write the tables it reads.
+    collectors: optional dict of long-lived collector instances. A persistent
+    worker passes the same dict for every job so API clients and caches stay warm.
+    stages: optional list of stage names to run (default: all).
+    force: run derived stages even when their inputs are unchanged.
+    """
+    ctx = collectors if isinstance(collectors, StageContext) else StageContext(collectors)
+    selected = [s for s in STAGES.values() if stages is None or s.name in stages]
     print(f"Starting data collection for {ticker}...")
-    
-    # 1. Company Info & Shareholders
-    print("\n[1/6] Collecting Company Info & Shareholders...")
-    try:
-        company_collector = CompanyCollector()
-        company_collector.collect_and_save(ticker)
-        company_collector.fetch_shareholders(ticker)
-    except Exception as e:
-        print(f"Error collecting company info: {e}")
-
-    # 2. Financials (Last 3 years)
-    print("\n[2/6] Collecting Financials...")
-    try:
-        financials_collector = FinancialsCollector()
-        current_year = datetime.now().year
-        for year in range(current_year - 3, current_year + 1):
-            financials_collector.fetch_financials(ticker, year, 0) # Yearly
-            # financials_collector.fetch_financials(ticker, year, 1) # Q1 (Optional for MVP)
-    except Exception as e:
-        print(f"Error collecting financials: {e}")
-
-    # 3. Disclosures (Last 1 year)
-    print("\n[3/4] Collecting Disclosures...")
-    try:
-        disclosures_collector = DisclosuresCollector()
-        disclosures_collector.fetch_disclosures(ticker, days=1095)
-    except Exception as e:
-        print(f"Error collecting disclosures: {e}")
-
-    # 4. Market Data (Last 1 year)
-    print("\n[4/6] Collecting Market Data...")
-    try:
-        market_collector = MarketCollector()
-        market_collector.fetch_daily_data(ticker, days=365)
-    except Exception as e:
-        print(f"Error collecting market data: {e}")
 
-    # 5. Calculate Ratios
-    print("\n[5/6] Calculating Financial Ratios...")
-    ratio_calculator = RatioCalculator()
-    ratio_calculator.calculate_ratios(ticker)
-
-    # 6. Generate Markdown Reports
-    print("\n[6/6] Generating Markdown Reports...")
-    generator = MarkdownGenerator(ticker)
-    generator.save_files()
+    results = StageExecutor(ctx, ticker).run(selected, force=force)
 
     print(f"\nData collection for {ticker} completed.")
+    return results
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Smart Data Feeder Collector")
     parser.add_argument("ticker", type=str, help="Stock ticker (e.g., 005930) or Name (e.g., 삼성전자)")
+    parser.add_argument("--stages", type=lambda s: s.split(","), help=f"Comma-separated subset of: {', '.join(STAGES)}")
+    parser.add_argument("--force", action="store_true", help="Re-run stages even if their inputs are unchanged")
+    parser.add_argument("--backfill-years", type=int, metavar="N", help="Backfill every annual and quarterly statement of the last N years, then recompute ratios and reports")
     args = parser.parse_args()
-    
-    # Resolve ticker if name is provided
-    company_collector = CompanyCollector()
-    resolved_ticker = company_collector.resolve_ticker(args.ticker)
-    
+
+    if args.stages:
+        unknown = [s for s in args.stages if s not in STAGES]
+        if unknown:
+            parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    # One context for resolution and collection, so the company collector is built once.
+    ctx = StageContext()
+    resolved_ticker = resolve_ticker(ctx, args.ticker)
+
     if resolved_ticker:
         if resolved_ticker != args.ticker:
             print(f"Resolved '{args.ticker}' to ticker: {resolved_ticker}")
-        collect_all(resolved_ticker)
+        if args.backfill_years:
+            ctx.collector("financials").backfill(resolved_ticker, years=args.backfill_years)
+            collect_all(resolved_ticker, ctx, stages=["ratios", "markdown"], force=args.force)
+        else:
+            collect_all(resolved_ticker, ctx, stages=args.stages, force=args.force)
+        publish_snapshot()
     else:
         print(f"Error: Could not resolve ticker for '{args.ticker}'. Please check the name or use the 6-digit ticker directly.")
@@ -0,0 +1,86 @@
+import re
+
+# Field -> (statements to look in, IFRS/DART account_ids, display names).
+# account_id is stable across filings; names are the fallback for rows filed
+# with "-표준계정코드 미사용-" and for the single-account API, which has no ids.
+ACCOUNT_MAP = {
+    "revenue": (("IS", "CIS"), ["ifrs-full_Revenue", "ifrs_Revenue"], ["매출액", "수익(매출액)", "영업수익", "매출"]),
+    "op_profit": (("IS", "CIS"), ["dart_OperatingIncomeLoss"], ["영업이익", "영업이익(손실)", "영업손익"]),
+    "net_income": (("IS", "CIS"), ["ifrs-full_ProfitLoss", "ifrs_ProfitLoss"], ["당기순이익", "당기순이익(손실)", "당기순손익", "분기순이익", "반기순이익"]),
+    "assets": (("BS",), ["ifrs-full_Assets", "ifrs_Assets"], ["자산총계"]),
+    "liabilities": (("BS",), ["ifrs-full_Liabilities", "ifrs_Liabilities"], ["부채총계"]),
+    "equity": (("BS",), ["ifrs-full_Equity", "ifrs_Equity"], ["자본총계"]),
+    "current_assets": (("BS",), ["ifrs-full_CurrentAssets", "ifrs_CurrentAssets"], ["유동자산"]),
+    "current_liabilities": (("BS",), ["ifrs-full_CurrentLiabilities", "ifrs_CurrentLiabilities"], ["유동부채"]),
+    "ocf": (("CF",), ["ifrs-full_CashFlowsFromUsedInOperatingActivities", "ifrs_CashFlowsFromUsedInOperatingActivities"],
+            ["영업활동현금흐름", "영업활동으로인한현금흐름", "영업활동순현금흐름"]),
+}
+
+AMOUNT_COLUMNS = ["thstrm_amount", "thstrm_add_amount"]
+
+# Leading enumerators ("Ⅰ.", "1.", "가.", "(1)") and all whitespace.
+_ENUMERATOR = re.compile(r"^\s*(?:[ⅠⅡⅢⅣⅤⅥⅦⅧⅨⅩ]+|\d+|[가-하]|\(\d+\))\s*[.)]\s*")
+_SPACES = re.compile(r"\s+")
+_QUALIFIER = re.compile(r"\([^)]*\)")
+
+def normalize_account_name(name):
+    """'Ⅰ. 영업이익 (손실)' -> '영업이익(손실)'."""
+    return _SPACES.sub("", _ENUMERATOR.sub("", str(name)))
+
+def parse_amount(value):
+    """Parses a DART amount string ('1,234', '-1,234', '', '-') to int, or None."""
+    if value is None:
+        return None
+    text = str(value).replace(",", "").strip()
+    if text in ("", "-", "nan", "None"):
+        return None
+    try:
+        return int(float(text))
+    except ValueError:
+        return None
+
+class AccountIndex:
+    """
+    Indexes a finstate / finstate_all DataFrame in one pass by
+    (statement, account_id) and (statement, normalized name), so every mapped
+    field is a handful of dict lookups regardless of statement size.
+    The first row wins for a key, matching the statement's own order.
+    """
+    def __init__(self, df):
+        self.by_id = {}
+        self.by_name = {}
+        n = len(df)
+        statements = df["sj_div"].tolist() if "sj_div" in df.columns else [None] * n
+        ids = df["account_id"].tolist() if "account_id" in df.columns else [None] * n
+        names = df["account_nm"].tolist() if "account_nm" in df.columns else [None] * n
+        amounts = list(zip(*[df[c].tolist() if c in df.columns else [None] * n for c in AMOUNT_COLUMNS]))
+
+        for sj_div, account_id, name, values in zip(statements, ids, names, amounts):
+            if account_id:
+                self.by_id.setdefault((sj_div, account_id), values)
+            if name:
+                normalized = normalize_account_name(name)
+                self.by_name.setdefault((sj_div, normalized), values)
+                self.by_name.setdefault((sj_div, _QUALIFIER.sub("", normalized)), values)
+
+    def lookup(self, field):
+        """Returns the amount tuple (thstrm_amount, thstrm_add_amount) for a mapped field, or None."""
+        statements, account_ids, names = ACCOUNT_MAP[field]
+        for sj_div in statements + (None,): # None: frames without sj_div
+            for account_id in account_ids:
+                values = self.by_id.get((sj_div, account_id))
+                if values is not None:
+                    return values
+            for name in names:
+                values = self.by_name.get((sj_div, normalize_account_name(name)))
+                if values is not None:
+                    return values
+        return None
+
+    def get(self, field, column="thstrm_amount"):
+        values = self.lookup(field)
+        return parse_amount(values[AMOUNT_COLUMNS.index(column)]) if values is not None else None
+
+    def extract(self, fields=None, column="thstrm_amount"):
+        """Returns {field: amount or None} for the given (default: all mapped) fields."""
+        return {field: self.get(field, column) for field in (fields or ACCOUNT_MAP)}
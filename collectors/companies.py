@@ -1,20 +1,34 @@
 import os
-import OpenDartReader
-import FinanceDataReader as fdr
+import time
 from datetime import datetime
-from utils import upsert_data
-from dotenv import load_dotenv
+from utils import upsert_data, get_db_connection, bump_data_version, forget_fingerprints, init_db, load_env, get_dart_reader
 
-load_dotenv()
+KRX_LISTING_TTL = 6 * 60 * 60 # seconds
 
 class CompanyCollector:
     def __init__(self):
+        init_db()
+        self._krx_listing = None
+        self._krx_listing_at = 0
+        load_env()
         self.api_key = os.getenv("DART_API_KEY")
-        if self.api_key:
-            self.dart = OpenDartReader(self.api_key)
-        else:
+        if not self.api_key:
             print("Warning: DART_API_KEY not found in .env")
-            self.dart = None
+
+    @property
+    def dart(self):
+        return get_dart_reader(self.api_key) if self.api_key else None
+
+    def krx_listing(self):
+        """
+        KRX stock listing, cached on the instance. A long-lived collector (see worker.py)
+        downloads it once per TTL instead of once per company.
+        """
+        if self._krx_listing is None or time.time() - self._krx_listing_at > KRX_LISTING_TTL:
+            import FinanceDataReader as fdr # Imported on demand; resolving a ticker code never needs it
+            self._krx_listing = fdr.StockListing('KRX')
+            self._krx_listing_at = time.time()
+        return self._krx_listing
 
     def collect_and_save(self, ticker):
         print(f"Collecting company info for {ticker}...")
@@ -53,7 +67,7 @@ class CompanyCollector:
             final_name = corp_name if corp_name else ticker
             
             try:
-                df_krx = fdr.StockListing('KRX')
+                df_krx = self.krx_listing()
                 company_row = df_krx[df_krx['Code'] == ticker]
                 
                 if not company_row.empty:
@@ -136,7 +150,7 @@ class CompanyCollector:
         try:
             print("Attempting fallback resolution using FinanceDataReader...")
             # Download stock listing
-            df = fdr.StockListing('KRX')
+            df = self.krx_listing()
             
             # Search by name
             # Exact match first
@@ -158,70 +172,100 @@ class CompanyCollector:
         print(f"Could not resolve ticker for '{name_or_ticker}'")
         return None
 
+    @staticmethod
+    def _number(value, cast):
+        """Parses '1,234' / '-1.5' / '-' from DART to cast(value), or None."""
+        text = str(value).replace(',', '').strip() if value is not None else ''
+        try:
+            return cast(float(text))
+        except ValueError:
+            return None
+
     def fetch_shareholders(self, ticker):
         """
-        Fetches major shareholders using OpenDART.
+        Ingests new major-shareholder filings (OpenDART majorstock) incrementally.
+        Each filing is stored once in shareholder_filings, keyed by rcept_no, which
+        keeps the stake history per holder; the shareholders table holds each
+        holder's latest filing and is only touched for holders in new filings.
+        Returns the number of new filing rows.
         """
         if not self.dart:
-            return
+            return 0
 
         print(f"Fetching shareholders for {ticker}...")
+        conn = get_db_connection()
         try:
-            # OpenDartReader's major_shareholders
-            # Note: OpenDartReader might not have a direct wrapper for 'major_shareholders' in all versions.
-            # If it does, it's usually .major_shareholders(corp_code)
-            # Let's check if we can use it. If not, we might need to use .list() with specific code?
-            # Actually, OpenDartReader has `major_shareholders`.
-            
             corp_code = self.dart.find_corp_code(ticker)
             if not corp_code:
-                return
+                return 0
 
+            # DART returns the full list; only filings we have not seen are processed.
+            # Columns: ['rcept_no', 'rcept_dt', 'corp_code', 'corp_name', 'report_tp', 'repror', 'stkqy',
+            #           'stkqy_irds', 'stkrt', 'stkrt_irds', 'ctr_stkqy', 'ctr_stkrt', 'report_resn']
             df = self.dart.major_shareholders(corp_code)
             if df is None or df.empty:
                 print(f"No shareholder data found for {ticker}")
-                return
+                return 0
 
-            shareholders_data = []
+            known = {row[0] for row in conn.execute(
+                "SELECT DISTINCT rcept_no FROM shareholder_filings WHERE ticker = ?", (ticker,)
+            )}
+            new = df[~df['rcept_no'].astype(str).isin(known)]
+            if new.empty:
+                print(f"No new shareholder filings for {ticker}")
+                return 0
 
-            for _, row in df.iterrows():
-                # Columns based on debug output: 
-                # ['rcept_no', 'rcept_dt', 'corp_code', 'corp_name', 'report_tp', 'repror', 'stkqy', 'stkqy_irds', 'stkrt', 'stkrt_irds', 'ctr_stkqy', 'ctr_stkrt', 'report_resn']
-                
-                name = row.get('repror', '')
-                # Rel type is not explicitly provided in this API response, defaulting to 'Major Shareholder'
-                rel_type = '주요주주' 
-                
-                count_str = str(row.get('stkqy', '0'))
-                ratio_str = str(row.get('stkrt', '0'))
-                
-                # Clean numbers
-                try:
-                    count = int(count_str.replace(',', ''))
-                    ratio = float(ratio_str.replace(',', ''))
-                except:
-                    count = 0
-                    ratio = 0.0
-                
-                if name:
-                    shareholders_data.append({
-                        "ticker": ticker,
-                        "holder_name": name,
-                        "rel_type": rel_type,
-                        "share_count": count,
-                        "share_ratio": ratio
-                    })
-
-            if shareholders_data:
-                upsert_data(
-                    table="shareholders",
-                    data=shareholders_data,
-                    conflict_columns=["ticker", "holder_name"]
-                )
-                print(f"Saved {len(shareholders_data)} shareholders for {ticker}")
+            filings = []
+            for rcept_no, rcept_dt, report_tp, name, count, count_change, ratio, ratio_change, reason in zip(
+                new['rcept_no'], new['rcept_dt'], new.get('report_tp', [None] * len(new)), new['repror'],
+                new['stkqy'], new.get('stkqy_irds', [None] * len(new)), new['stkrt'],
+                new.get('stkrt_irds', [None] * len(new)), new.get('report_resn', [None] * len(new))
+            ):
+                if not name:
+                    continue
+                filings.append((
+                    str(rcept_no), name, ticker, str(rcept_dt)[:10], report_tp,
+                    self._number(count, int), self._number(count_change, int),
+                    self._number(ratio, float), self._number(ratio_change, float), reason
+                ))
+
+            # Latest new filing per holder; older filings never overwrite a newer current row.
+            latest = {}
+            for filing in sorted(filings, key=lambda f: f[0]):
+                latest[filing[1]] = filing
+            # Rel type is not explicitly provided in this API response, defaulting to 'Major Shareholder'
+            current = [(ticker, name, '주요주주', f[5] or 0, f[7] or 0.0, f[0], f[3]) for name, f in latest.items()]
+
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR IGNORE INTO shareholder_filings
+                (rcept_no, holder_name, ticker, rcept_dt, report_tp, share_count, share_count_change,
+                 share_ratio, share_ratio_change, report_resn)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, filings)
+            cursor.executemany("""
+                INSERT INTO shareholders (ticker, holder_name, rel_type, share_count, share_ratio, rcept_no, as_of)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ticker, holder_name) DO UPDATE SET
+                share_count = excluded.share_count,
+                share_ratio = excluded.share_ratio,
+                rcept_no = excluded.rcept_no,
+                as_of = excluded.as_of
+                WHERE shareholders.rcept_no IS NULL OR excluded.rcept_no > shareholders.rcept_no
+            """, current)
+            updated = cursor.rowcount
+            bump_data_version(cursor, "shareholders", [ticker])
+            forget_fingerprints(cursor, "shareholders", [ticker])
+            conn.commit()
+            print(f"Saved {len(filings)} new shareholder filing(s) for {ticker} ({updated} holder(s) updated)")
+            return len(filings)
 
         except Exception as e:
+            conn.rollback()
             print(f"Error fetching shareholders: {e}")
+            return 0
+        finally:
+            conn.close()
 
 if __name__ == "__main__":
     collector = CompanyCollector()
@@ -0,0 +1,190 @@
+import os
+import sys
+import asyncio
+import argparse
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+# Allow running as a script (python collectors/disclosure_poller.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection, init_db, load_env, get_dart_reader, upsert_data
+from collectors.http_client import DartClient
+
+STATE_KEY = "disclosures.complete_through" # last day whose market-wide list has been fully ingested
+DEFAULT_DAYS = 7 # first run: how far back to poll
+MAX_ATTEMPTS = 3
+
+class DisclosurePoller:
+    """
+    Keeps every tracked company's filings current with market-wide list calls.
+    For each day, DART's list endpoint is asked for all filings in the market
+    (a few pages of 100), the filings are matched to tracked tickers through the
+    local corp-code registry, and only those whose documents we extract
+    (annual/half-year/quarterly reports) are queued for a document fetch.
+    drain() then fetches and extracts the queued documents.
+    """
+    def __init__(self):
+        load_env()
+        init_db()
+        self.api_key = os.getenv("DART_API_KEY")
+        if not self.api_key:
+            print("Warning: DART_API_KEY not found")
+        self.conn = get_db_connection()
+
+    def sync_corp_codes(self):
+        """Refreshes the corp-code registry from DART's table (downloaded once a day by OpenDartReader)."""
+        dart = get_dart_reader(self.api_key)
+        corp_codes = dart.corp_codes
+        rows = [
+            (r['corp_code'], (r['stock_code'] or "").strip() or None, r['corp_name'], r.get('modify_date'))
+            for r in corp_codes.to_dict('records')
+        ]
+        self.conn.executemany("""
+            INSERT INTO corp_codes (corp_code, ticker, corp_name, modify_date) VALUES (?, ?, ?, ?)
+            ON CONFLICT(corp_code) DO UPDATE SET
+            ticker = excluded.ticker, corp_name = excluded.corp_name, modify_date = excluded.modify_date,
+            updated_at = CURRENT_TIMESTAMP
+            WHERE corp_codes.modify_date IS NOT excluded.modify_date OR corp_codes.ticker IS NOT excluded.ticker
+        """, rows)
+        self.conn.commit()
+        print(f"Corp-code registry holds {len(rows)} companies.")
+        return len(rows)
+
+    def tracked(self):
+        """{corp_code: ticker} for the companies in the database."""
+        if not self.conn.execute("SELECT 1 FROM corp_codes LIMIT 1").fetchone():
+            self.sync_corp_codes()
+        return {row['corp_code']: row['ticker'] for row in self.conn.execute(
+            "SELECT cc.corp_code, cc.ticker FROM corp_codes cc JOIN companies c ON c.ticker = cc.ticker"
+        )}
+
+    def complete_through(self):
+        row = self.conn.execute("SELECT value FROM poller_state WHERE name = ?", (STATE_KEY,)).fetchone()
+        return date.fromisoformat(row['value']) if row else None
+
+    def set_complete_through(self, day):
+        self.conn.execute("""
+            INSERT INTO poller_state (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+        """, (STATE_KEY, day.isoformat()))
+        self.conn.commit()
+
+    async def list_days(self, days):
+        """Market-wide filings per day; all days and their pages are fetched concurrently."""
+        async with DartClient(self.api_key) as client:
+            results = await asyncio.gather(*[
+                client.list(start=day.strftime("%Y%m%d"), end=day.strftime("%Y%m%d")) for day in days
+            ])
+        return dict(zip(days, results))
+
+    def poll(self, since=None, until=None):
+        """
+        Lists every day from `since` (default: the day after the last complete
+        one) through `until` (default: today) and queues tracked filings.
+        Today is listed again on the next run, as filings keep arriving.
+        Returns (filings listed, filings queued).
+        """
+        from collectors.disclosures import DisclosuresCollector
+        today = date.today()
+        until = until or today
+        if since is None:
+            done = self.complete_through()
+            since = done + timedelta(days=1) if done else today - timedelta(days=DEFAULT_DAYS)
+        days = [since + timedelta(days=i) for i in range((until - since).days + 1)]
+        if not days:
+            return 0, 0
+
+        started = time.perf_counter()
+        tracked = self.tracked()
+        by_day = asyncio.run(self.list_days(days))
+
+        listed = queued = 0
+        disclosures = []
+        queue = []
+        for day, filings in by_day.items():
+            listed += len(filings)
+            for f in filings:
+                ticker = tracked.get(f.corp_code)
+                if not ticker or not f.report_nm:
+                    continue
+                rcept_dt = datetime.strptime(f.rcept_dt, "%Y%m%d").date()
+                if not DisclosuresCollector.is_extracted(f.report_nm, rcept_dt, today):
+                    continue
+                queue.append((f.rcept_no, ticker, f.report_nm.strip(), f.rcept_dt, f.flr_nm))
+                disclosures.append({
+                    "rcept_no": f.rcept_no, "ticker": ticker, "report_nm": f.report_nm.strip(), "rcept_dt": rcept_dt,
+                    "flr_nm": f.flr_nm, "url": f"https://dart.fss.or.kr/dsaf001/main.do?rcpNo={f.rcept_no}",
+                })
+
+        if queue:
+            cursor = self.conn.executemany("""
+                INSERT INTO document_queue (rcept_no, ticker, report_nm, rcept_dt, flr_nm) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(rcept_no) DO NOTHING
+            """, queue)
+            queued = cursor.rowcount
+            self.conn.commit()
+            # Listed right away (without a summary), so reports show new filings before their documents are fetched.
+            upsert_data(table="disclosures", data=disclosures, conflict_columns=["rcept_no"],
+                        update_columns=["report_nm", "flr_nm", "url"])
+
+        complete = max((d for d in days if d < today), default=None)
+        if complete:
+            self.set_complete_through(complete)
+        print(f"Listed {listed} filings over {len(days)} day(s) in {time.perf_counter() - started:.1f}s; "
+              f"queued {queued} document(s) for {len(tracked)} tracked companies.")
+        return listed, queued
+
+    def drain(self, limit=None):
+        """Fetches and extracts queued documents, oldest filing first. Returns the number processed."""
+        from collectors.disclosures import DisclosuresCollector
+        collector = DisclosuresCollector()
+        jobs = self.conn.execute(f"""
+            SELECT * FROM document_queue WHERE status = 'queued' ORDER BY rcept_dt, rcept_no
+            {'LIMIT ?' if limit else ''}
+        """, (limit,) if limit else ()).fetchall()
+
+        by_ticker = defaultdict(list)
+        for job in jobs:
+            by_ticker[job['ticker']].append(job)
+        for ticker, reports in by_ticker.items():
+            for job in reports:
+                error = None
+                try:
+                    # save_reports skips documents it could not fetch instead of raising
+                    if job['rcept_no'] not in collector.save_reports(ticker, [dict(job)]):
+                        error = "document could not be fetched"
+                except Exception as e:
+                    error = str(e)
+                if error is None:
+                    self.conn.execute(
+                        "UPDATE document_queue SET status = 'done', attempts = attempts + 1, fetched_at = CURRENT_TIMESTAMP WHERE rcept_no = ?",
+                        (job['rcept_no'],)
+                    )
+                else:
+                    print(f"Document {job['rcept_no']} failed: {error}")
+                    self.conn.execute("""
+                        UPDATE document_queue
+                        SET attempts = attempts + 1, error = ?,
+                            status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'queued' END
+                        WHERE rcept_no = ?
+                    """, (error, MAX_ATTEMPTS, job['rcept_no']))
+                self.conn.commit()
+        return len(jobs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll DART's market-wide filing list and queue tracked companies' reports")
+    parser.add_argument("--since", type=date.fromisoformat, help="First day to list (YYYY-MM-DD); default: after the last complete day")
+    parser.add_argument("--until", type=date.fromisoformat, help="Last day to list (default: today)")
+    parser.add_argument("--drain", action="store_true", help="Fetch and extract queued documents afterwards")
+    parser.add_argument("--limit", type=int, help="Max documents to fetch with --drain")
+    parser.add_argument("--sync-corp-codes", action="store_true", help="Refresh the corp-code registry first")
+    args = parser.parse_args()
+
+    poller = DisclosurePoller()
+    if args.sync_corp_codes:
+        poller.sync_corp_codes()
+    poller.poll(args.since, args.until)
+    if args.drain:
+        print(f"Processed {poller.drain(args.limit)} queued document(s).")
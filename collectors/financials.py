@@ -1,29 +1,61 @@
 import os
-import requests
-import json
+import pandas as pd
 from datetime import datetime
-from utils import upsert_data
-from dotenv import load_dotenv
-import OpenDartReader
-
-load_dotenv()
+from utils import upsert_data, get_db_connection, load_env, get_dart_reader
+from collectors.accounts import AccountIndex
 
 class FinancialsCollector:
     def __init__(self):
+        load_env()
         self.api_key = os.getenv("DART_API_KEY")
-        if self.api_key:
-            self.dart = OpenDartReader(self.api_key)
-        else:
+        if not self.api_key:
             print("Warning: DART_API_KEY not found")
-            self.dart = None
 
-    def fetch_financials(self, ticker, year, quarter=0):
+    @property
+    def dart(self):
+        return get_dart_reader(self.api_key) if self.api_key else None
+
+    # Flow items are summed over a period; Q4 is derived from them. Stock items
+    # (balance sheet) are point-in-time, so Q4 simply takes the annual figure.
+    FLOW_COLUMNS = ["revenue", "op_profit", "net_income", "ocf"]
+    STOCK_COLUMNS = ["assets", "liabilities", "equity", "current_assets", "current_liabilities"]
+    TTM_COLUMNS = {"revenue": "revenue_ttm", "op_profit": "op_profit_ttm", "net_income": "net_income_ttm"}
+
+    def _statement(self, corp_code, year, reprt_code):
+        """
+        Full statements (BS, IS/CIS, CF) from finstate_all, consolidated first and
+        separate as fallback; the single-account API covers filings the full one lacks.
+        """
+        for fs_div in ("CFS", "OFS"):
+            try:
+                fs = self.dart.finstate_all(corp_code, year, reprt_code=reprt_code, fs_div=fs_div)
+            except Exception as e:
+                print(f"finstate_all failed ({fs_div}): {e}")
+                fs = None
+            if fs is not None and not fs.empty:
+                return fs
+
+        fs = self.dart.finstate(corp_code, year, reprt_code=reprt_code)
+        if fs is None or fs.empty:
+            return None
+        # Filter for Consolidated (CFS), fallback to Separate (OFS)
+        fs_cfs = fs[fs['fs_div'] == 'CFS']
+        if fs_cfs.empty:
+            fs_cfs = fs[fs['fs_div'] == 'OFS']
+        return None if fs_cfs.empty else fs_cfs
+
+    def fetch_financials(self, ticker, year, quarter=0, save=True, strict=False):
         """
         Fetches financial data using OpenDartReader.
-        quarter: 0 for Yearly, 1-4 for Quarterly.
+        quarter: 0 for Yearly, 1-3 for the 1Q, half-year and 3Q reports (Q4 is
+        derived from the annual report, see derive_q4).
+        strict: raise request errors instead of returning None (for resumable backfills).
+        Quarterly rows hold the standalone three-month figures (thstrm_amount);
+        the year-to-date figure (thstrm_add_amount) is returned under "ytd".
+        Returns the parsed record, or None.
         """
         if not self.dart:
-            return
+            return None
 
         # Mapping quarter to report code
         report_codes = {
@@ -42,90 +74,155 @@ class FinancialsCollector:
             corp_code = self.dart.find_corp_code(ticker)
             if not corp_code:
                 print(f"Corp code not found for {ticker}")
-                return
+                return None
 
-            # Fetch Financial Statement
-            # fs_div: CFS(Consolidated), OFS(Separate)
-            fs = self.dart.finstate(corp_code, year, reprt_code=reprt_code)
-            
-            if fs is None or fs.empty:
+            statement = self._statement(corp_code, year, reprt_code)
+            if statement is None:
                 print(f"No financial data found for {ticker} ({year} Q{quarter})")
-                return
-
-            # Initialize fields
-            revenue = 0
-            op_profit = 0
-            net_income = 0
-            assets = 0
-            liabilities = 0
-            equity = 0
-            
-            # Filter for Consolidated (CFS)
-            # If CFS is not available, fallback to OFS? 
-            # Usually we want Consolidated.
-            fs_cfs = fs[fs['fs_div'] == 'CFS']
-            if fs_cfs.empty:
-                # Fallback to Separate if Consolidated is missing (e.g. some holding companies or smaller ones)
-                # But for Samsung, CFS should exist.
-                # Let's try OFS if CFS is empty.
-                fs_cfs = fs[fs['fs_div'] == 'OFS']
-            
-            if fs_cfs.empty:
-                 print(f"No Consolidated/Separate data found for {ticker}")
-                 return
-
-            # Extract Data
-            # Account names can vary slightly, but OpenDart standardizes them mostly.
-            # Revenue: 매출액, 수익(매출액)
-            # Op Profit: 영업이익, 영업이익(손실)
-            # Net Income: 당기순이익, 당기순이익(손실)
-            # Assets: 자산총계
-            # Liabilities: 부채총계
-            # Equity: 자본총계
-            
-            def get_amount(df, account_names):
-                for name in account_names:
-                    row = df[df['account_nm'] == name]
-                    if not row.empty:
-                        amt_str = row.iloc[0]['thstrm_amount']
-                        return int(amt_str.replace(',', '')) if amt_str else 0
-                return 0
-
-            revenue = get_amount(fs_cfs, ['매출액', '수익(매출액)'])
-            op_profit = get_amount(fs_cfs, ['영업이익', '영업이익(손실)'])
-            net_income = get_amount(fs_cfs, ['당기순이익', '당기순이익(손실)'])
-            assets = get_amount(fs_cfs, ['자산총계'])
-            liabilities = get_amount(fs_cfs, ['부채총계'])
-            equity = get_amount(fs_cfs, ['자본총계'])
-
-            current_assets = get_amount(fs_cfs, ['유동자산'])
-            current_liabilities = get_amount(fs_cfs, ['유동부채'])
-
-            financial_data = {
-                "ticker": ticker,
-                "year": year,
-                "quarter": quarter,
-                "revenue": revenue,
-                "op_profit": op_profit,
-                "net_income": net_income,
-                "assets": assets,
-                "liabilities": liabilities,
-                "equity": equity,
-                "current_assets": current_assets,
-                "current_liabilities": current_liabilities,
-                "ocf": 0, 
-                "is_estimated": False
-            }
-            
-            upsert_data(
-                table="financials",
-                data=[financial_data],
-                conflict_columns=["ticker", "year", "quarter"]
-            )
-            print(f"Saved financials for {ticker} ({year} Q{quarter})")
+                return None
+
+            index = AccountIndex(statement)
+            amounts = index.extract()
+            financial_data = {"ticker": ticker, "year": year, "quarter": quarter}
+            # Missing accounts stay None, so derive_q4/update_ttm can tell them from zero.
+            for column in self.FLOW_COLUMNS + self.STOCK_COLUMNS:
+                financial_data[column] = amounts[column]
+            # Cash flow statements are cumulative in quarterly reports, so only the
+            # 1Q figure is standalone; backfill() differences the later quarters.
+            financial_data["ocf"] = amounts["ocf"] if quarter in (0, 1) else None
+            financial_data.update({"is_estimated": False, "is_derived": False})
+
+            if save:
+                upsert_data(
+                    table="financials",
+                    data=[financial_data],
+                    conflict_columns=["ticker", "year", "quarter"]
+                )
+                print(f"Saved financials for {ticker} ({year} Q{quarter})")
+
+            if quarter:
+                # Year-to-date figures of the flow items (equal to thstrm_amount for 1Q).
+                ytd = index.extract(self.FLOW_COLUMNS, column="thstrm_add_amount")
+                ytd["ocf"] = amounts["ocf"]
+                financial_data = dict(financial_data, ytd=ytd)
+            return financial_data
             
         except Exception as e:
             print(f"Error fetching financials: {e}")
+            if strict:
+                raise
+            return None
+
+    def backfill(self, ticker, years=4, quarterly_years=None, done_years=(), on_year=None, strict=False):
+        """
+        Pulls the annual, 1Q, half-year and 3Q statements for the last `years`
+        years (quarterlies only for the last `quarterly_years`), derives the
+        standalone Q4, stores each year in one write and refreshes the TTM columns.
+        Years are independent (cash-flow differencing and Q4 stay within a year), so
+        a resumable backfill passes the years already stored as done_years and
+        records progress through on_year(year) after each write.
+        """
+        quarterly_years = years if quarterly_years is None else quarterly_years
+        current_year = datetime.now().year
+        written = 0
+        for year in range(current_year - years + 1, current_year + 1):
+            if year in done_years:
+                continue
+            quarters = [1, 2, 3, 0] if year > current_year - quarterly_years else [0]
+            records = []
+            for quarter in quarters:
+                record = self.fetch_financials(ticker, year, quarter, save=False, strict=strict)
+                if record:
+                    records.append(record)
+
+            # Quarterly cash flow is year-to-date; difference it to standalone quarters.
+            by_period = {(r["year"], r["quarter"]): r for r in records}
+            for (_, quarter), record in by_period.items():
+                previous = by_period.get((year, quarter - 1)) if quarter > 1 else None
+                if previous and record["ytd"]["ocf"] is not None and previous["ytd"]["ocf"] is not None:
+                    record["ocf"] = record["ytd"]["ocf"] - previous["ytd"]["ocf"]
+
+            rows = [{k: v for k, v in r.items() if k != "ytd"} for r in records]
+            rows += self.derive_q4(records)
+            if rows:
+                upsert_data(table="financials", data=rows, conflict_columns=["ticker", "year", "quarter"])
+                written += len(rows)
+            if on_year:
+                on_year(year)
+        self.update_ttm(ticker)
+        return written
+
+    def derive_q4(self, records):
+        """
+        Standalone Q4 = annual - nine-month cumulative (the 3Q report's
+        year-to-date figure, or Q1+Q2+Q3 when it is missing).
+        """
+        by_period = {(r["year"], r["quarter"]): r for r in records}
+        derived = []
+        for (year, quarter), annual in by_period.items():
+            q3 = by_period.get((year, 3))
+            if quarter != 0 or not q3:
+                continue
+            q4 = {"ticker": annual["ticker"], "year": year, "quarter": 4}
+            for column in self.FLOW_COLUMNS:
+                nine_months = q3["ytd"].get(column)
+                if nine_months is None:
+                    quarters = [by_period.get((year, q)) for q in (1, 2, 3)]
+                    if all(q and q[column] is not None for q in quarters):
+                        nine_months = sum(q[column] for q in quarters)
+                q4[column] = None if nine_months is None or annual[column] is None else annual[column] - nine_months
+            if q4["revenue"] is None:
+                continue
+            for column in self.STOCK_COLUMNS:
+                q4[column] = annual[column]
+            q4.update({"is_estimated": False, "is_derived": True})
+            derived.append(q4)
+        return derived
+
+    def update_ttm(self, ticker):
+        """
+        Stores trailing-twelve-month revenue/op_profit/net_income: a rolling
+        four-quarter sum over consecutive standalone quarters (gaps give no TTM),
+        and the annual figures themselves on annual rows.
+        """
+        conn = get_db_connection()
+        try:
+            df = pd.read_sql_query(
+                "SELECT year, quarter, revenue, op_profit, net_income FROM financials WHERE ticker = ?",
+                conn, params=(ticker,)
+            )
+        finally:
+            conn.close()
+        if df.empty:
+            return 0
+
+        quarterly = df[df['quarter'] > 0].copy()
+        quarterly['period'] = quarterly['year'] * 4 + quarterly['quarter'] - 1
+        quarterly = quarterly.set_index('period').sort_index()
+        if not quarterly.empty:
+            # Reindex over every period so a missing quarter breaks the window.
+            full = quarterly.reindex(range(quarterly.index.min(), quarterly.index.max() + 1))
+            ttm = full[list(self.TTM_COLUMNS)].rolling(4, min_periods=4).sum().loc[quarterly.index]
+            quarterly[list(self.TTM_COLUMNS.values())] = ttm.values
+
+        annual = df[df['quarter'] == 0].copy()
+        for column, ttm_column in self.TTM_COLUMNS.items():
+            annual[ttm_column] = annual[column]
+
+        frames = [f[['year', 'quarter'] + list(self.TTM_COLUMNS.values())] for f in (quarterly, annual) if not f.empty]
+        combined = pd.concat(frames, ignore_index=True)
+        combined = combined.astype(object).where(combined.notna(), None)
+        rows = [
+            {"ticker": ticker, "year": int(r['year']), "quarter": int(r['quarter']),
+             **{c: (int(r[c]) if r[c] is not None else None) for c in self.TTM_COLUMNS.values()}}
+            for r in combined.to_dict('records')
+        ]
+        return upsert_data(
+            table="financials",
+            data=rows,
+            conflict_columns=["ticker", "year", "quarter"],
+            update_columns=list(self.TTM_COLUMNS.values())
+        )
 
 if __name__ == "__main__":
     collector = FinancialsCollector()
@@ -0,0 +1,435 @@
+import asyncio
+import json
+import os
+import re
+import ssl
+import zlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields
+from typing import Optional
+from urllib.parse import urlencode, urlsplit
+from utils import load_env
+
+DART_BASE_URL = "https://opendart.fss.or.kr/api"
+NAVER_CHART_URL = "https://fchart.stock.naver.com"
+
+CHUNK_SIZE = 64 * 1024
+
+class HttpError(Exception):
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+class DartError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"DART error {status}: {message}")
+        self.status = status
+        self.message = message
+
+# --- Typed results -----------------------------------------------------------
+# Field names follow the DART / Naver payloads; missing fields are None.
+
+@dataclass
+class Disclosure:
+    rcept_no: Optional[str] = None
+    corp_code: Optional[str] = None
+    corp_name: Optional[str] = None
+    stock_code: Optional[str] = None
+    corp_cls: Optional[str] = None
+    report_nm: Optional[str] = None
+    flr_nm: Optional[str] = None
+    rcept_dt: Optional[str] = None
+    rm: Optional[str] = None
+
+@dataclass
+class CompanyInfo:
+    corp_code: Optional[str] = None
+    corp_name: Optional[str] = None
+    stock_code: Optional[str] = None
+    ceo_nm: Optional[str] = None
+    corp_cls: Optional[str] = None
+    induty_code: Optional[str] = None
+    est_dt: Optional[str] = None
+    acc_mt: Optional[str] = None
+    hm_url: Optional[str] = None
+
+@dataclass
+class StatementRow:
+    rcept_no: Optional[str] = None
+    bsns_year: Optional[str] = None
+    fs_div: Optional[str] = None
+    sj_div: Optional[str] = None
+    account_id: Optional[str] = None # Only in full statements (fnlttSinglAcntAll)
+    account_nm: Optional[str] = None
+    thstrm_amount: Optional[str] = None
+    thstrm_add_amount: Optional[str] = None
+    frmtrm_amount: Optional[str] = None
+
+@dataclass
+class ShareholderFiling:
+    rcept_no: Optional[str] = None
+    rcept_dt: Optional[str] = None
+    report_tp: Optional[str] = None
+    repror: Optional[str] = None
+    stkqy: Optional[str] = None
+    stkqy_irds: Optional[str] = None
+    stkrt: Optional[str] = None
+    stkrt_irds: Optional[str] = None
+    report_resn: Optional[str] = None
+
+@dataclass
+class DailyPrice:
+    date: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+
+def _typed(cls, row):
+    return cls(**{f.name: row.get(f.name) for f in fields(cls)})
+
+# --- Transport ---------------------------------------------------------------
+
+class Response:
+    """A response whose body is streamed from a pooled keep-alive connection."""
+    def __init__(self, status, headers, reader, url):
+        self.status = status
+        self.headers = headers
+        self.url = url
+        self._reader = reader
+        self.complete = False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HttpError(self.status, self.url)
+
+    async def _raw_chunks(self):
+        reader = self._reader
+        if self.status in (204, 304):
+            pass # No body
+        elif "chunked" in self.headers.get("transfer-encoding", ""):
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b""): # trailers
+                        pass
+                    break
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            while remaining:
+                chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while chunk := await reader.read(CHUNK_SIZE):
+                yield chunk
+            return # Body ends with the connection; it cannot be reused
+        self.complete = True
+
+    async def iter_chunks(self):
+        """Yields the decoded body in chunks without buffering it whole."""
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) if self.headers.get("content-encoding") == "gzip" else None
+        async for chunk in self._raw_chunks():
+            chunk = decoder.decompress(chunk) if decoder else chunk
+            if chunk:
+                yield chunk
+        if decoder and (tail := decoder.flush()):
+            yield tail
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+    async def text(self, encoding="utf-8"):
+        return (await self.read()).decode(encoding, errors="replace")
+
+    async def json(self):
+        return json.loads(await self.read())
+
+class _HttpxResponse:
+    """Adapts an httpx streaming response to the Response interface."""
+    def __init__(self, response):
+        self._response = response
+        self.status = response.status_code
+        self.headers = {k.lower(): v for k, v in response.headers.items()}
+        self.url = str(response.url)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise HttpError(self.status, self.url)
+
+    async def iter_chunks(self):
+        async for chunk in self._response.aiter_bytes(CHUNK_SIZE):
+            yield chunk
+
+    async def read(self):
+        return await self._response.aread()
+
+    async def text(self, encoding="utf-8"):
+        return (await self.read()).decode(encoding, errors="replace")
+
+    async def json(self):
+        return json.loads(await self.read())
+
+class AsyncHttpClient:
+    """
+    asyncio HTTP client with per-host keep-alive connection pools.
+    Uses httpx (with HTTP/2 when the h2 package is installed) if available,
+    otherwise a built-in HTTP/1.1 pool on asyncio streams. At most
+    max_connections requests per host are in flight; the rest wait for a
+    connection instead of opening new ones.
+    """
+    def __init__(self, max_connections=10, timeout=30.0, http2=None):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = {} # (scheme, host, port) -> [(reader, writer)]
+        self._slots = {} # (scheme, host, port) -> Semaphore
+        self._ssl = None
+        self._httpx = None
+        self._http2 = False
+        try:
+            import httpx
+            if http2 is None:
+                try:
+                    import h2 # noqa: F401
+                    http2 = True
+                except ImportError:
+                    http2 = False
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            self._httpx = httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+            self._http2 = http2
+        except ImportError:
+            pass # Built-in HTTP/1.1 pool
+
+    @property
+    def backend(self):
+        if self._httpx is None:
+            return "asyncio-http/1.1"
+        return "httpx-http/2" if self._http2 else "httpx-http/1.1"
+
+    async def _connect(self, scheme, host, port):
+        if scheme == "https" and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        return await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self._ssl if scheme == "https" else None),
+            self.timeout
+        )
+
+    async def _acquire(self, key):
+        """Returns (reader, writer, reused) from the idle pool or a new connection."""
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        return (*await self._connect(*key), False)
+
+    async def _send(self, reader, writer, method, parts, headers):
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}",
+                 "Connection: keep-alive", "Accept-Encoding: gzip", "User-Agent: smart-data-feeder"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), self.timeout)
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return status, response_headers
+
+    @asynccontextmanager
+    async def stream(self, method, url, headers=None):
+        """async with client.stream("GET", url) as response: async for chunk in response.iter_chunks(): ..."""
+        if self._httpx is not None:
+            async with self._httpx.stream(method, url, headers=headers) as response:
+                yield _HttpxResponse(response)
+            return
+
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.max_connections))
+        async with slots:
+            for attempt in range(2):
+                reader, writer, reused = await self._acquire(key)
+                try:
+                    status, response_headers = await self._send(reader, writer, method, parts, headers)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                    writer.close()
+                    # A pooled connection the server already closed; retry once on a fresh one.
+                    if not reused or attempt:
+                        raise
+
+            response = Response(status, response_headers, reader, url)
+            try:
+                yield response
+            finally:
+                keep_alive = response.complete and response_headers.get("connection", "").lower() != "close"
+                if keep_alive:
+                    self._idle[key].append((reader, writer))
+                else:
+                    writer.close()
+
+    async def get(self, url, params=None, headers=None):
+        """GET and read the whole body; returns the Response with .body set."""
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+        async with self.stream("GET", url, headers) as response:
+            response.raise_for_status()
+            response.body = await response.read()
+            return response
+
+    async def close(self):
+        if self._httpx is not None:
+            await self._httpx.aclose()
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+# --- Endpoint clients --------------------------------------------------------
+
+class DartClient:
+    """
+    Async OpenDART client for the endpoints the collectors use. base_url can
+    point at a local stub server for tests.
+    """
+    NO_DATA = "013" # DART status for an empty result
+
+    def __init__(self, api_key=None, http=None, base_url=DART_BASE_URL):
+        load_env()
+        self.api_key = api_key or os.getenv("DART_API_KEY")
+        self.base_url = base_url.rstrip("/")
+        self._own_http = http is None
+        self.http = http or AsyncHttpClient()
+
+    async def _json(self, endpoint, **params):
+        params = {"crtfc_key": self.api_key, **{k: v for k, v in params.items() if v is not None}}
+        response = await self.http.get(f"{self.base_url}/{endpoint}", params)
+        data = json.loads(response.body)
+        status = data.get("status")
+        if status == self.NO_DATA:
+            return {}
+        if status != "000":
+            raise DartError(status, data.get("message"))
+        return data
+
+    async def list(self, corp_code=None, start=None, end=None, kind=None, page_count=100):
+        """
+        Filings in [start, end] (YYYYMMDD); all pages, fetched concurrently after the first.
+        Without corp_code DART returns the whole market (date range of at most 3 months).
+        """
+        params = dict(corp_code=corp_code, bgn_de=start, end_de=end, pblntf_ty=kind, page_count=page_count)
+        first = await self._json("list.json", page_no=1, **params)
+        pages = [first] + await asyncio.gather(*[
+            self._json("list.json", page_no=page, **params)
+            for page in range(2, int(first.get("total_page", 1) or 1) + 1)
+        ])
+        return [_typed(Disclosure, row) for page in pages for row in page.get("list", [])]
+
+    async def document(self, rcept_no, dest=None):
+        """
+        Original filing (a ZIP of XML documents), streamed. With dest, the body is
+        written to that path chunk by chunk and the path is returned; otherwise the bytes.
+        """
+        url = f"{self.base_url}/document.xml?" + urlencode({"crtfc_key": self.api_key, "rcept_no": rcept_no})
+        async with self.http.stream("GET", url) as response:
+            response.raise_for_status()
+            if dest is None:
+                return await response.read()
+            with open(dest, "wb") as f:
+                async for chunk in response.iter_chunks():
+                    f.write(chunk)
+            return dest
+
+    async def company(self, corp_code):
+        data = await self._json("company.json", corp_code=corp_code)
+        return _typed(CompanyInfo, data) if data else None
+
+    async def finstate(self, corp_code, year, reprt_code="11011", fs_div=None):
+        """Key accounts (fnlttSinglAcnt), or the full statements (fnlttSinglAcntAll) when fs_div is given."""
+        endpoint = "fnlttSinglAcntAll.json" if fs_div else "fnlttSinglAcnt.json"
+        data = await self._json(endpoint, corp_code=corp_code, bsns_year=year, reprt_code=reprt_code, fs_div=fs_div)
+        return [_typed(StatementRow, row) for row in data.get("list", [])]
+
+    async def major_shareholders(self, corp_code):
+        data = await self._json("majorstock.json", corp_code=corp_code)
+        return [_typed(ShareholderFiling, row) for row in data.get("list", [])]
+
+    async def close(self):
+        if self._own_http:
+            await self.http.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+class PriceClient:
+    """Daily KRX prices from Naver's chart endpoint (the source FinanceDataReader uses)."""
+    _ITEM = re.compile(r'<item data="(\d{8})\|([\d.]+)\|([\d.]+)\|([\d.]+)\|([\d.]+)\|(\d+)"')
+
+    def __init__(self, http=None, base_url=NAVER_CHART_URL):
+        self.base_url = base_url.rstrip("/")
+        self._own_http = http is None
+        self.http = http or AsyncHttpClient()
+
+    async def daily_prices(self, ticker, count=365):
+        params = {"symbol": ticker, "timeframe": "day", "count": count, "requestType": 0}
+        response = await self.http.get(f"{self.base_url}/sise.nhn", params)
+        text = response.body.decode("euc-kr", errors="replace")
+        return [
+            DailyPrice(f"{d[:4]}-{d[4:6]}-{d[6:]}", float(o), float(h), float(l), float(c), int(v))
+            for d, o, h, l, c, v in self._ITEM.findall(text)
+        ]
+
+    async def close(self):
+        if self._own_http:
+            await self.http.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Fetch daily prices for many tickers concurrently")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--count", type=int, default=30)
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--base-url", default=NAVER_CHART_URL)
+    args = parser.parse_args()
+
+    async def main():
+        async with AsyncHttpClient(max_connections=args.connections) as http:
+            prices = PriceClient(http, args.base_url)
+            started = time.perf_counter()
+            results = await asyncio.gather(*[prices.daily_prices(t, args.count) for t in args.tickers])
+            print(f"{len(args.tickers)} tickers in {time.perf_counter() - started:.2f}s via {http.backend}")
+            for ticker, rows in zip(args.tickers, results):
+                print(f"{ticker}: {len(rows)} rows, last {rows[-1] if rows else None}")
+
+    asyncio.run(main())
@@ -1,6 +1,8 @@
 import FinanceDataReader as fdr
 from datetime import datetime, timedelta
 from utils import upsert_data
+from processors.screener import refresh_latest_fundamentals
+from processors.rollups import refresh_rollups
 import pandas as pd
 import numpy as np
 
@@ -52,12 +54,17 @@ class MarketCollector:
                     "ma60": float(ma60) if ma60 else None
                 })
             
-            upsert_data(
+            written = upsert_data(
                 table="market_daily",
                 data=market_data,
                 conflict_columns=["ticker", "date"]
             )
             print(f"Saved {len(market_data)} market records for {ticker}")
+            if written:
+                # Rebuild the weekly/monthly candles from the fetched window on.
+                refresh_rollups(ticker, since=market_data[0]["date"])
+            # Screener valuation (PER/PBR/market cap) follows the latest close.
+            refresh_latest_fundamentals(ticker)
             
         except Exception as e:
             print(f"Error fetching market data: {e}")
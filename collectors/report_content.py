@@ -1,23 +1,22 @@
 import os
 import re
-import OpenDartReader
 import pandas as pd
 from datetime import datetime
-from utils import upsert_data, get_db_connection
-from dotenv import load_dotenv
-
-load_dotenv()
+from utils import upsert_data, get_db_connection, bump_data_version, forget_fingerprints, init_db, load_env, get_dart_reader
 
 class ReportContentCollector:
     def __init__(self):
+        load_env()
         self.api_key = os.getenv("DART_API_KEY")
-        if self.api_key:
-            self.dart = OpenDartReader(self.api_key)
-        else:
+        if not self.api_key:
             print("Warning: DART_API_KEY not found")
-            self.dart = None
+        init_db()
         self.conn = get_db_connection()
 
+    @property
+    def dart(self):
+        return get_dart_reader(self.api_key) if self.api_key else None
+
     def fetch_latest_report(self, ticker):
         """Finds the latest Quarterly/Half-year/Annual report."""
         if not self.dart:
@@ -151,8 +150,13 @@ class ReportContentCollector:
             except Exception as e:
                 print(f"Error saving narrative: {e}")
         
+        bump_data_version(cursor, "company_narratives", [ticker])
+        forget_fingerprints(cursor, "company_narratives", [ticker])
         self.conn.commit()
         print(f"Saved {len(narratives)} narratives for {ticker} ({period})")
+        if narratives:
+            from processors.narrative_diff import update_whats_new
+            update_whats_new(ticker, [period])
 
 if __name__ == "__main__":
     collector = ReportContentCollector()
@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from collections import defaultdict
+
+COORDINATOR_FILE = "coordinator.db"
+LEASE_SECONDS = 120 # a unit goes back to the pool when its worker stops heartbeating this long
+MAX_ATTEMPTS = 3
+
+# The coordinator owns its own file so it can live on a different host than the
+# collectors' databases; the schema is therefore created here, not in schema.sql.
+LEASE_SCHEMA = """
+create table if not exists work_leases (
+  unit_id integer primary key autoincrement,
+  ticker varchar(10) not null,
+  stage varchar(50) not null,
+  status varchar(20) not null default 'pending', -- 'pending', 'leased', 'done', 'failed'
+  worker_id varchar(100),
+  lease_expires real, -- Unix time; an expired lease can be claimed by another worker
+  heartbeat_at real,
+  attempts int not null default 0,
+  result text, -- JSON reported by the worker: status and the rows it collected
+  error text,
+  created_at datetime default current_timestamp,
+  finished_at datetime,
+  merged_at real -- Unix time merge_results applied the unit's rows to the shared database
+);
+create unique index if not exists idx_work_leases_open on work_leases(ticker, stage) where status in ('pending', 'leased');
+create index if not exists idx_work_leases_status on work_leases(status, unit_id);
+"""
+
+# Tables worker nodes ship back with their results, with the columns merge_results
+# matches rows on (the conflict columns the collectors upsert with).
+MERGE_KEYS = {
+    "companies": ["ticker"],
+    "shareholders": ["ticker", "holder_name"],
+    "financials": ["ticker", "year", "quarter"],
+    "disclosures": ["rcept_no"],
+    "company_segments": ["ticker", "period", "division"],
+    "company_narratives": ["ticker", "period", "section_type"],
+    "market_daily": ["ticker", "date"],
+}
+
+class LeaseCoordinator:
+    """
+    Shared work list for collectors on several hosts. Workers claim (ticker, stage)
+    units under an expiring lease, extend it with heartbeats and report each
+    unit's result; a unit whose lease runs out is handed to the next claimer.
+    This implementation is backed by a SQLite file, which stands in for a
+    networked coordinator: every operation is a single statement, so claims
+    from concurrent processes never hand out the same unit twice.
+    """
+    def __init__(self, path=COORDINATOR_FILE):
+        self.path = path
+        self.local = threading.local() # heartbeats run on their own thread
+        conn = self.conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(LEASE_SCHEMA)
+        if "merged_at" not in {info[1] for info in conn.execute("PRAGMA table_info(work_leases)")}:
+            conn.execute("ALTER TABLE work_leases ADD COLUMN merged_at real")
+        conn.commit()
+
+    @property
+    def conn(self):
+        if getattr(self.local, "conn", None) is None:
+            self.local.conn = sqlite3.connect(self.path, timeout=30)
+            self.local.conn.row_factory = sqlite3.Row
+        return self.local.conn
+
+    def submit(self, units):
+        """Adds (ticker, stage) units; a unit that is already pending or leased is not duplicated. Returns the number added."""
+        conn = self.conn
+        added = 0
+        for ticker, stage in units:
+            cursor = conn.execute("""
+                INSERT INTO work_leases (ticker, stage) VALUES (?, ?)
+                ON CONFLICT(ticker, stage) WHERE status IN ('pending', 'leased') DO NOTHING
+            """, (ticker, stage))
+            added += cursor.rowcount
+        conn.commit()
+        return added
+
+    def claim(self, worker_id, limit=1, lease_seconds=LEASE_SECONDS):
+        """
+        Leases up to `limit` units to worker_id: pending ones first, then units
+        whose lease expired. Returns the claimed rows.
+        """
+        now = time.time()
+        rows = self.conn.execute("""
+            UPDATE work_leases
+            SET status = 'leased', worker_id = ?, lease_expires = ?, heartbeat_at = ?, attempts = attempts + 1
+            WHERE unit_id IN (
+                SELECT unit_id FROM work_leases
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ? AND attempts < ?)
+                ORDER BY status DESC, unit_id LIMIT ?
+            )
+            RETURNING *
+        """, (worker_id, now + lease_seconds, now, now, MAX_ATTEMPTS, limit)).fetchall()
+        self.conn.commit()
+        return sorted(rows, key=lambda r: r['unit_id'])
+
+    def heartbeat(self, worker_id, unit_ids, lease_seconds=LEASE_SECONDS):
+        """Extends worker_id's leases on unit_ids. Returns the ids it still holds; any other lease was lost."""
+        if not unit_ids:
+            return []
+        now = time.time()
+        placeholders = ', '.join(['?'] * len(unit_ids))
+        rows = self.conn.execute(f"""
+            UPDATE work_leases SET lease_expires = ?, heartbeat_at = ?
+            WHERE worker_id = ? AND status = 'leased' AND unit_id IN ({placeholders})
+            RETURNING unit_id
+        """, (now + lease_seconds, now, worker_id, *unit_ids)).fetchall()
+        self.conn.commit()
+        return [r['unit_id'] for r in rows]
+
+    def complete(self, worker_id, unit_id, result=None):
+        """Marks a unit done. Returns False when worker_id no longer holds its lease (the result is dropped)."""
+        cursor = self.conn.execute("""
+            UPDATE work_leases SET status = 'done', result = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE unit_id = ? AND worker_id = ? AND status = 'leased'
+        """, (json.dumps(result) if result is not None else None, unit_id, worker_id))
+        self.conn.commit()
+        return cursor.rowcount == 1
+
+    def fail(self, worker_id, unit_id, error):
+        """Returns a unit to the pool, or marks it failed after MAX_ATTEMPTS. Returns False when the lease was lost."""
+        cursor = self.conn.execute("""
+            UPDATE work_leases
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                worker_id = NULL, lease_expires = NULL, error = ?,
+                finished_at = CASE WHEN attempts >= ? THEN CURRENT_TIMESTAMP END
+            WHERE unit_id = ? AND worker_id = ? AND status = 'leased'
+        """, (MAX_ATTEMPTS, str(error), MAX_ATTEMPTS, unit_id, worker_id))
+        self.conn.commit()
+        return cursor.rowcount == 1
+
+    def reclaim(self):
+        """
+        Returns expired leases to the pool (claim() also takes them directly) and
+        fails those out of attempts. Returns (requeued, failed).
+        """
+        now = time.time()
+        failed = self.conn.execute("""
+            UPDATE work_leases SET status = 'failed', error = 'lease expired', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+        """, (now, MAX_ATTEMPTS)).rowcount
+        requeued = self.conn.execute("""
+            UPDATE work_leases SET status = 'pending', worker_id = NULL, lease_expires = NULL
+            WHERE status = 'leased' AND lease_expires < ?
+        """, (now,)).rowcount
+        self.conn.commit()
+        return requeued, failed
+
+    def stats(self):
+        """Unit counts by status, plus live workers (leases not yet expired)."""
+        counts = {r['status']: r['n'] for r in self.conn.execute(
+            "SELECT status, COUNT(*) AS n FROM work_leases GROUP BY status"
+        )}
+        counts['workers'] = self.conn.execute(
+            "SELECT COUNT(DISTINCT worker_id) FROM work_leases WHERE status = 'leased' AND lease_expires >= ?",
+            (time.time(),)
+        ).fetchone()[0]
+        return counts
+
+def run_stages(ctx, ticker, stage_names):
+    """
+    Default unit executor: runs the claimed stages through the DAG executor.
+    The derived stages need the whole universe (sector aggregates), so they run
+    in merge_results on the shared database, not on the node. Returns {stage: status}.
+    """
+    from stages import STAGES, StageExecutor
+    results = StageExecutor(ctx, ticker).run([STAGES[name] for name in stage_names])
+    return {name: status for name, (status, *_rest) in results.items()}
+
+def export_rows(ticker, stage_names):
+    """
+    Reads what the given stages wrote for `ticker` from this node's database, to be
+    shipped with complete(): {stage: {table: [row dicts]}}. Autoincrement ids are
+    node-local and left out; merge_results matches rows on MERGE_KEYS instead.
+    """
+    from stages import STAGES
+    from utils import get_db_connection
+    conn = get_db_connection()
+    try:
+        shipped = {}
+        for name in stage_names:
+            shipped[name] = {}
+            for table in STAGES[name].outputs:
+                if table not in MERGE_KEYS:
+                    continue
+                rows = conn.execute(f"SELECT * FROM {table} WHERE ticker = ?", (ticker,)).fetchall()
+                shipped[name][table] = [{k: row[k] for k in row.keys() if k != "id"} for row in rows]
+        return shipped
+    finally:
+        conn.close()
+
+def merge_results(coordinator):
+    """
+    Merge step, run on the host that owns the shared database (utils.DB_FILE, the
+    one the web app's snapshot is published from). Upserts the rows shipped with
+    every completed, unmerged unit, re-runs the derived stages for the merged
+    tickers and publishes a snapshot. A unit is marked merged once its rows are
+    written, so an interrupted merge is simply run again. Returns the number of
+    units merged.
+    """
+    from utils import upsert_data
+    from stages import STAGES, StageContext, StageExecutor
+    from scheduler import DERIVED_STAGES
+    from processors.snapshot import publish_snapshot
+
+    conn = coordinator.conn
+    units = conn.execute(
+        "SELECT unit_id, ticker FROM work_leases WHERE status = 'done' AND merged_at IS NULL ORDER BY unit_id"
+    ).fetchall()
+    touched = []
+    for unit in units:
+        # One unit's rows at a time; a ticker's full price history can be large.
+        row = conn.execute("SELECT result FROM work_leases WHERE unit_id = ?", (unit['unit_id'],)).fetchone()
+        result = json.loads(row['result']) if row['result'] else {}
+        for table, rows in result.get("rows", {}).items():
+            upsert_data(table=table, data=rows, conflict_columns=MERGE_KEYS[table])
+        conn.execute("UPDATE work_leases SET merged_at = ? WHERE unit_id = ?", (time.time(), unit['unit_id']))
+        conn.commit()
+        if unit['ticker'] not in touched:
+            touched.append(unit['ticker'])
+
+    if touched:
+        ctx = StageContext()
+        for ticker in touched:
+            StageExecutor(ctx, ticker).run([STAGES[name] for name in DERIVED_STAGES])
+        publish_snapshot()
+    return len(units)
+
+class LeaseWorker:
+    """
+    Collector node. Claims a batch of units, runs each ticker's stages in-process
+    and reports them, while a background thread heartbeats the leases it holds.
+    Each node uses its own DART API key, so quota scales with the number of nodes.
+    Stages write to the node's own database; the rows they produced are shipped
+    with complete() and reach the shared database through merge_results.
+    execute(ticker, stages) -> {stage: status} can be swapped out (bench_leases.py),
+    as can export(ticker, stages) -> {stage: {table: rows}}.
+    """
+    def __init__(self, coordinator, worker_id=None, api_key=None, batch=4, lease_seconds=LEASE_SECONDS, execute=None,
+                 export=None):
+        self.coordinator = coordinator
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch = batch
+        self.lease_seconds = lease_seconds
+        if api_key:
+            # Collectors read the key when they are built; .env does not override it.
+            os.environ["DART_API_KEY"] = api_key
+        self.execute = execute
+        self.export = export
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def heartbeat_loop(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            with self.lock:
+                held = list(self.held)
+            kept = set(self.coordinator.heartbeat(self.worker_id, held, self.lease_seconds))
+            lost = [unit_id for unit_id in held if unit_id not in kept]
+            if lost:
+                print(f"[{self.worker_id}] Lost lease on unit(s) {lost}; their results will be dropped.")
+
+    def run_units(self, units):
+        """Runs claimed units grouped by ticker and reports each one. Returns the number completed."""
+        by_ticker = defaultdict(list)
+        for unit in units:
+            by_ticker[unit['ticker']].append(unit)
+
+        completed = 0
+        for ticker, ticker_units in by_ticker.items():
+            stage_names = [u['stage'] for u in ticker_units]
+            try:
+                statuses = self.execute(ticker, stage_names)
+            except Exception as e:
+                traceback.print_exc()
+                statuses = {name: f"error: {e}" for name in stage_names}
+            shipped = {}
+            if self.export:
+                succeeded = [name for name in stage_names if statuses.get(name) in ("ok", "skipped")]
+                try:
+                    shipped = self.export(ticker, succeeded) if succeeded else {}
+                except Exception as e:
+                    traceback.print_exc()
+                    statuses = {name: f"error: export failed: {e}" for name in stage_names}
+            for unit in ticker_units:
+                status = statuses.get(unit['stage'], "error: not run")
+                if status in ("ok", "skipped"):
+                    result = {"status": status}
+                    if self.export:
+                        result["rows"] = shipped.get(unit['stage'], {})
+                    completed += self.coordinator.complete(self.worker_id, unit['unit_id'], result)
+                else:
+                    self.coordinator.fail(self.worker_id, unit['unit_id'], status)
+                with self.lock:
+                    self.held.discard(unit['unit_id'])
+        return completed
+
+    def run(self, once=False, poll_interval=1.0):
+        """Claims and runs units until stopped; with once, exits when no unit is left to claim."""
+        if self.execute is None:
+            from stages import StageContext
+            ctx = StageContext()
+            ctx.warm_up()
+            self.execute = lambda ticker, stage_names: run_stages(ctx, ticker, stage_names)
+            self.export = self.export or export_rows
+
+        heartbeat = threading.Thread(target=self.heartbeat_loop, daemon=True)
+        heartbeat.start()
+        completed = 0
+        try:
+            while True:
+                units = self.coordinator.claim(self.worker_id, self.batch, self.lease_seconds)
+                if not units:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                with self.lock:
+                    self.held.update(u['unit_id'] for u in units)
+                completed += self.run_units(units)
+        finally:
+            self.stopped.set()
+            heartbeat.join()
+        return completed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lease-based work distribution across collector nodes")
+    parser.add_argument("--coordinator", default=COORDINATOR_FILE, help="Coordinator database file")
+    parser.add_argument("--submit", nargs="+", metavar="TICKER", help="Queue tickers for the given --stages")
+    parser.add_argument("--stages", type=lambda s: s.split(","), default=["company", "financials", "disclosures", "market"],
+                        help="Comma-separated collection stages (ratios and markdown follow at --merge)")
+    parser.add_argument("--plan", action="store_true", help="Queue the refresh scheduler's plan (uses --time-budget/--dart-quota)")
+    parser.add_argument("--time-budget", type=float, default=3600)
+    parser.add_argument("--dart-quota", type=int, default=10000)
+    parser.add_argument("--work", action="store_true", help="Run as a worker node")
+    parser.add_argument("--id", help="Worker id (default: <hostname>-<pid>)")
+    parser.add_argument("--api-key", help="DART API key for this node (default: DART_API_KEY)")
+    parser.add_argument("--batch", type=int, default=4, help="Units claimed at a time")
+    parser.add_argument("--once", action="store_true", help="Exit when no unit is left")
+    parser.add_argument("--reclaim", action="store_true", help="Requeue expired leases")
+    parser.add_argument("--merge", action="store_true",
+                        help="Apply completed units' rows to this host's data.db, re-run ratios/markdown and publish a snapshot")
+    args = parser.parse_args()
+
+    coordinator = LeaseCoordinator(args.coordinator)
+    if args.submit:
+        units = [(ticker, stage) for ticker in args.submit for stage in args.stages]
+        print(f"Queued {coordinator.submit(units)} unit(s).")
+    if args.plan:
+        from scheduler import RefreshScheduler
+        tasks = RefreshScheduler().plan(args.time_budget, args.dart_quota)
+        units = sorted((t.ticker, t.stage) for t in tasks) # a ticker's units end up in the same claims
+        print(f"Queued {coordinator.submit(units)} unit(s) from {len(tasks)} planned task(s).")
+    if args.reclaim:
+        requeued, failed = coordinator.reclaim()
+        print(f"Requeued {requeued} expired lease(s), {failed} out of attempts.")
+    if args.work:
+        done = LeaseWorker(coordinator, args.id, args.api_key, args.batch).run(once=args.once)
+        print(f"Completed {done} unit(s).")
+    if args.merge:
+        print(f"Merged {merge_results(coordinator)} unit(s).")
+    print(coordinator.stats())
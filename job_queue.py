@@ -0,0 +1,91 @@
+from utils import get_db_connection, init_db
+
+class JobQueue:
+    """
+    Durable collection queue backed by the collection_jobs table.
+    Requests for a query that is already queued are merged into that job.
+    """
+    def __init__(self):
+        init_db()
+        self.conn = get_db_connection()
+
+    def enqueue(self, query):
+        """Queues a collection for `query` (ticker or name) and returns the job id."""
+        query = query.strip()
+        row = self.conn.execute("""
+            INSERT INTO collection_jobs (query) VALUES (?)
+            ON CONFLICT(query) WHERE status = 'queued' DO UPDATE SET requests = requests + 1
+            RETURNING id
+        """, (query,)).fetchone()
+        self.conn.commit()
+        return row['id']
+
+    def claim(self, worker_id):
+        """Atomically moves the oldest queued job to 'running' and returns it, or None."""
+        row = self.conn.execute("""
+            UPDATE collection_jobs
+            SET status = 'running', worker_id = ?, started_at = CURRENT_TIMESTAMP
+            WHERE id = (SELECT id FROM collection_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+            RETURNING *
+        """, (worker_id,)).fetchone()
+        self.conn.commit()
+        return row
+
+    def set_ticker(self, job_id, ticker):
+        self.conn.execute("UPDATE collection_jobs SET ticker = ? WHERE id = ?", (ticker, job_id))
+        self.conn.commit()
+
+    def finish(self, job_id):
+        self.conn.execute(
+            "UPDATE collection_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,)
+        )
+        self.conn.commit()
+
+    def fail(self, job_id, error):
+        self.conn.execute(
+            "UPDATE collection_jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (str(error), job_id)
+        )
+        self.conn.commit()
+
+    def status(self, job_id):
+        """Returns the job as a dict, following merges to the job that absorbed it."""
+        row = self.conn.execute("SELECT * FROM collection_jobs WHERE id = ?", (job_id,)).fetchone()
+        while row and row['merged_into']:
+            row = self.conn.execute("SELECT * FROM collection_jobs WHERE id = ?", (row['merged_into'],)).fetchone()
+        return dict(row) if row else None
+
+    def pending(self):
+        return self.conn.execute("SELECT COUNT(*) FROM collection_jobs WHERE status = 'queued'").fetchone()[0]
+
+    def running_workers(self):
+        """Ids of the workers that have jobs marked 'running'."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT worker_id FROM collection_jobs WHERE status = 'running' AND worker_id IS NOT NULL"
+        )]
+
+    def recover(self, worker_id):
+        """
+        Requeues jobs this worker left 'running' (e.g. after a crash). A job whose
+        query was queued again in the meantime is merged into that job instead.
+        """
+        stale = self.conn.execute(
+            "SELECT id, query, requests FROM collection_jobs WHERE status = 'running' AND worker_id = ?", (worker_id,)
+        ).fetchall()
+        for job in stale:
+            target = self.conn.execute(
+                "UPDATE collection_jobs SET requests = requests + ? WHERE query = ? AND status = 'queued' RETURNING id",
+                (job['requests'], job['query'])
+            ).fetchone()
+            if target:
+                self.conn.execute(
+                    "UPDATE collection_jobs SET status = 'merged', merged_into = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (target['id'], job['id'])
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE collection_jobs SET status = 'queued', worker_id = NULL, started_at = NULL WHERE id = ?",
+                    (job['id'],)
+                )
+        self.conn.commit()
+        return len(stale)
@@ -1,5 +1,5 @@
 import sqlite3
-from utils import get_db_connection
+from utils import get_db_connection, ensure_columns, ADDED_COLUMNS
 
 def migrate():
     print("Migrating database...")
@@ -7,19 +7,19 @@ def migrate():
     cursor = conn.cursor()
     
     try:
-        # Check if columns exist
-        cursor.execute("PRAGMA table_info(financials)")
-        columns = [info[1] for info in cursor.fetchall()]
-        
-        if 'per' not in columns:
-            print("Adding 'per' column to financials table...")
-            cursor.execute("ALTER TABLE financials ADD COLUMN per REAL")
-            
-        if 'pbr' not in columns:
-            print("Adding 'pbr' column to financials table...")
-            cursor.execute("ALTER TABLE financials ADD COLUMN pbr REAL")
-            
+        for table, columns in ADDED_COLUMNS.items():
+            for name in ensure_columns(cursor, table, columns):
+                print(f"Added '{name}' column to {table} table.")
         conn.commit()
+
+        # Segment figures in KRW: exact units from the stored report tables where
+        # the filing's tables are available, parsed from the text otherwise.
+        from processors.report_tables import run_extractors, fill_segment_amounts
+        run_extractors(["segments"], conn=conn)
+        filled = fill_segment_amounts(conn)
+        if filled:
+            print(f"Parsed KRW figures for {filled} segment row(s).")
+
         print("Migration completed successfully.")
         
     except Exception as e:
@@ -0,0 +1,118 @@
+import os
+import hashlib
+from collections import namedtuple
+from utils import get_db_connection, get_data_version, init_db
+
+Artifact = namedtuple("Artifact", ["content", "etag", "data_version", "regenerated"])
+
+class ArtifactCache:
+    """
+    Rendered Overview/Narratives/Chart artifacts, keyed by the ticker's data version.
+    An entry is served as-is until an upsert into one of the ticker's tables
+    bumps the version; only then is the artifact rendered again.
+    """
+    def __init__(self, conn=None):
+        init_db()
+        self.conn = conn or get_db_connection()
+
+    @staticmethod
+    def make_etag(data_version, content):
+        return f'"{data_version}-{hashlib.sha1(content).hexdigest()[:16]}"'
+
+    def get(self, ticker, artifact, render):
+        """
+        Returns the cached artifact, calling render() only if the data is dirty.
+        render returns str/bytes, or None when there is nothing to cache.
+        """
+        data_version = get_data_version(self.conn, ticker)
+        row = self.conn.execute(
+            "SELECT data_version, etag, content FROM artifact_cache WHERE ticker = ? AND artifact = ?",
+            (ticker, artifact)
+        ).fetchone()
+        if row and row['data_version'] == data_version:
+            return Artifact(bytes(row['content']), row['etag'], data_version, False)
+
+        content = render()
+        if content is None:
+            return None
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        etag = self.make_etag(data_version, content)
+        # Stored under the version read *before* rendering, so a write that lands
+        # mid-render leaves the entry stale and it is rebuilt on the next read.
+        self.conn.execute("""
+            INSERT INTO artifact_cache (ticker, artifact, data_version, etag, content)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(ticker, artifact) DO UPDATE SET
+            data_version=excluded.data_version,
+            etag=excluded.etag,
+            content=excluded.content,
+            created_at=CURRENT_TIMESTAMP
+        """, (ticker, artifact, data_version, etag, content))
+        self.conn.commit()
+        return Artifact(content, etag, data_version, True)
+
+    def get_file(self, ticker, artifact, path, export):
+        """
+        get() for artifacts too large to render in memory. export(path) streams the
+        artifact to a file and returns how many rows it wrote (0: nothing to cache).
+        The file is the content; the entry stores its path, so it is reused only while
+        the data version matches and the file is still there. Returns an Artifact
+        whose content is the path, or None.
+        """
+        data_version = get_data_version(self.conn, ticker)
+        row = self.conn.execute(
+            "SELECT data_version, etag, content FROM artifact_cache WHERE ticker = ? AND artifact = ?",
+            (ticker, artifact)
+        ).fetchone()
+        if (row and row['data_version'] == data_version and bytes(row['content']) == path.encode("utf-8")
+                and os.path.exists(path)):
+            return Artifact(path, row['etag'], data_version, False)
+
+        partial = f"{path}.tmp{os.getpid()}"
+        if not export(partial):
+            os.remove(partial)
+            return None
+        os.replace(partial, path)
+
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        etag = f'"{data_version}-{digest.hexdigest()[:16]}"'
+        self.conn.execute("""
+            INSERT INTO artifact_cache (ticker, artifact, data_version, etag, content)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(ticker, artifact) DO UPDATE SET
+            data_version=excluded.data_version,
+            etag=excluded.etag,
+            content=excluded.content,
+            created_at=CURRENT_TIMESTAMP
+        """, (ticker, artifact, data_version, etag, path.encode("utf-8")))
+        self.conn.commit()
+        return Artifact(path, etag, data_version, True)
+
+    def read(self, ticker, artifact, render, if_none_match=None):
+        """
+        Like get(), but honours an If-None-Match header value.
+        Returns (artifact, not_modified).
+        """
+        cached = self.get(ticker, artifact, render)
+        if cached is None:
+            return None, False
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            if "*" in tags or cached.etag in tags:
+                return cached, True
+        return cached, False
+
+    def invalidate(self, ticker, artifact=None):
+        if artifact:
+            self.conn.execute("DELETE FROM artifact_cache WHERE ticker = ? AND artifact = ?", (ticker, artifact))
+        else:
+            self.conn.execute("DELETE FROM artifact_cache WHERE ticker = ?", (ticker,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
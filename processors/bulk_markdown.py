@@ -0,0 +1,158 @@
+import sys
+import os
+import argparse
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection, init_db
+from processors.artifact_cache import ArtifactCache
+from processors.markdown_generator import FINANCIAL_COLUMNS, render_overview, render_narratives
+from processors.sector_stats import fetch_sector_comparison
+
+class BulkMarkdownGenerator:
+    """
+    Generates Overview/Narratives for many tickers at once.
+    Each table is read once for the whole selection and grouped in memory,
+    instead of MarkdownGenerator's five queries per ticker.
+    """
+    def __init__(self, tickers=None, workers=8):
+        init_db()
+        self.tickers = list(tickers) if tickers else None
+        self.workers = workers
+        self.conn = get_db_connection()
+
+    def _scope(self):
+        """Restricts queries to the requested tickers through a temp table join."""
+        if self.tickers is None:
+            return ""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_tickers (ticker TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM bulk_tickers")
+        self.conn.executemany("INSERT OR IGNORE INTO bulk_tickers (ticker) VALUES (?)", [(t,) for t in self.tickers])
+        return "JOIN bulk_tickers USING (ticker)"
+
+    def _grouped(self, query):
+        groups = defaultdict(list)
+        for row in self.conn.execute(query):
+            groups[row['ticker']].append(row)
+        return groups
+
+    def _dirty_tickers(self):
+        """Tickers whose cached artifacts are missing or older than their data version."""
+        join = self._scope()
+        rows = self.conn.execute(f"""
+            SELECT c.ticker
+            FROM companies c {join}
+            LEFT JOIN (SELECT ticker, SUM(version) AS v FROM data_versions GROUP BY ticker) dv ON dv.ticker = c.ticker
+            LEFT JOIN artifact_cache o ON o.ticker = c.ticker AND o.artifact = 'Overview.md'
+            LEFT JOIN artifact_cache n ON n.ticker = c.ticker AND n.artifact = 'Narratives.md'
+            WHERE o.data_version IS NOT COALESCE(dv.v, 0) OR n.data_version IS NOT COALESCE(dv.v, 0)
+        """).fetchall()
+        return [row['ticker'] for row in rows]
+
+    def load(self):
+        """Fetches every table once for the selection and groups rows per ticker."""
+        join = self._scope()
+        companies = {row['ticker']: row for row in self.conn.execute(f"SELECT * FROM companies {join}")}
+        financials = self._grouped(f"""
+            SELECT ticker, {', '.join(FINANCIAL_COLUMNS)} FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY year DESC, quarter DESC) AS rn
+                FROM financials {join}
+            ) WHERE rn <= 4
+            ORDER BY ticker, year DESC, quarter DESC
+        """)
+        segments = self._grouped(f"""
+            SELECT * FROM company_segments {join}
+            ORDER BY ticker, period DESC, division ASC
+        """)
+        disclosures = self._grouped(f"""
+            SELECT ticker, rcept_dt, report_nm, flr_nm, url FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY rcept_dt DESC) AS rn
+                FROM disclosures {join}
+            ) WHERE rn <= 10
+            ORDER BY ticker, rcept_dt DESC
+        """)
+        narratives = self._grouped(f"""
+            SELECT * FROM (
+                SELECT *, MAX(period) OVER (PARTITION BY ticker) AS latest_period
+                FROM company_narratives {join}
+            ) WHERE period = latest_period
+            ORDER BY ticker, section_type, id
+        """)
+        sector = fetch_sector_comparison(self.conn, join=join)
+        return companies, financials, segments, disclosures, narratives, sector
+
+    def _versions(self):
+        return {row['ticker']: row['v'] for row in self.conn.execute(
+            "SELECT ticker, SUM(version) AS v FROM data_versions GROUP BY ticker"
+        )}
+
+    def generate(self, output_dir="output", only_dirty=False):
+        """
+        Renders and writes [Ticker]_Overview.md / [Ticker]_Narratives.md for the selection.
+        With only_dirty, tickers whose cached artifacts are current are skipped entirely.
+        Returns the number of tickers written.
+        """
+        started = time.perf_counter()
+        if only_dirty:
+            self.tickers = self._dirty_tickers()
+            if not self.tickers:
+                print("All Markdown artifacts are up to date.")
+                return 0
+
+        versions = self._versions()
+        companies, financials, segments, disclosures, narratives, sector = self.load()
+        loaded = time.perf_counter()
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        def render_and_write(ticker):
+            info = companies[ticker]
+            latest = narratives.get(ticker, [])
+            overview = render_overview(ticker, info, financials.get(ticker, []), segments.get(ticker, []), disclosures.get(ticker, []),
+                                       sector.get(ticker, [])).encode("utf-8")
+            narrative = render_narratives(ticker, latest, [] if latest else disclosures.get(ticker, [])).encode("utf-8")
+            with open(f"{output_dir}/{ticker}_Overview.md", "wb") as f:
+                f.write(overview)
+            with open(f"{output_dir}/{ticker}_Narratives.md", "wb") as f:
+                f.write(narrative)
+            version = versions.get(ticker, 0)
+            return [
+                (ticker, "Overview.md", version, ArtifactCache.make_etag(version, overview), overview),
+                (ticker, "Narratives.md", version, ArtifactCache.make_etag(version, narrative), narrative),
+            ]
+
+        cache_rows = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for rows in pool.map(render_and_write, list(companies)):
+                cache_rows.extend(rows)
+
+        # Refresh the artifact cache in one transaction so later single-ticker reads hit it.
+        self.conn.executemany("""
+            INSERT INTO artifact_cache (ticker, artifact, data_version, etag, content)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(ticker, artifact) DO UPDATE SET
+            data_version=excluded.data_version,
+            etag=excluded.etag,
+            content=excluded.content,
+            created_at=CURRENT_TIMESTAMP
+        """, cache_rows)
+        self.conn.commit()
+
+        elapsed = time.perf_counter() - started
+        print(f"Generated Markdown files for {len(companies)} companies in {output_dir}/ "
+              f"({elapsed:.2f}s, queries {loaded - started:.2f}s)")
+        return len(companies)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Overview/Narratives Markdown for many companies")
+    parser.add_argument("tickers", nargs="*", help="Tickers to generate (default: every company in the database)")
+    parser.add_argument("--output", default="output", help="Output directory")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel render/write workers")
+    parser.add_argument("--only-dirty", action="store_true", help="Skip tickers whose cached artifacts are current")
+    args = parser.parse_args()
+
+    BulkMarkdownGenerator(args.tickers or None, workers=args.workers).generate(args.output, only_dirty=args.only_dirty)
@@ -0,0 +1,244 @@
+import sys
+import os
+import re
+import math
+import argparse
+import hashlib
+import time
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors.bulk_markdown import BulkMarkdownGenerator
+from processors.markdown_generator import (
+    FINANCIAL_COLUMNS, NARRATIVE_HEADERS, _pipe_table, _thousands, _plain, _date_str, _sector_position,
+)
+from processors.sector_stats import METRIC_LABELS
+
+# Section kinds in priority order: with a tight budget every company gets its
+# header and financials before any company gets narrative text.
+SECTIONS = ["header", "financials", "sector", "Key Takeaways", "What's New", "segments", "Business Overview", "MD&A", "News", "disclosures"]
+NARRATIVE_SECTIONS = ["Key Takeaways", "What's New", "Business Overview", "MD&A", "News"]
+MIN_TRUNCATED_TOKENS = 64 # below this, a narrative that does not fit is dropped rather than cut
+TRUNCATION_MARK = " …(truncated)"
+
+WORD = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+def heuristic_tokens(text):
+    """
+    Token estimate close to cl100k_base for mixed Korean/English filings:
+    ~4 letters per English token, up to 3 digits per number token and one
+    token per Hangul syllable or punctuation mark. Errs on the high side.
+    """
+    tokens = 0
+    for piece in WORD.findall(text):
+        if piece.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif piece.isalpha() and piece.isascii():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+class TokenCounter:
+    """
+    Token counts keyed by the sha1 of the text, cached in section_tokens.
+    Uses tiktoken when it is installed (and its encoding is available),
+    otherwise heuristic_tokens. Counts of different tokenizers are kept apart.
+    """
+    def __init__(self, conn, encoding="cl100k_base"):
+        self.conn = conn
+        self.encode = None
+        self.tokenizer = "heuristic"
+        try:
+            import tiktoken
+            self.encode = tiktoken.get_encoding(encoding).encode
+            self.tokenizer = f"tiktoken:{encoding}"
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"Warning: tiktoken encoding {encoding} unavailable ({e}); using the heuristic counter")
+        self.memo = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def tokenize(self, text):
+        """Uncached count."""
+        return len(self.encode(text)) if self.encode else heuristic_tokens(text)
+
+    def counts(self, texts):
+        """Token counts for texts; only text never seen before is tokenized."""
+        hashes = [self.content_hash(text) for text in texts]
+        unknown = list({h for h in hashes if h not in self.memo})
+        for i in range(0, len(unknown), 500):
+            chunk = unknown[i:i + 500]
+            for row in self.conn.execute(f"""
+                SELECT content_hash, tokens FROM section_tokens
+                WHERE tokenizer = ? AND content_hash IN ({', '.join(['?'] * len(chunk))})
+            """, (self.tokenizer, *chunk)):
+                self.memo[row['content_hash']] = row['tokens']
+                self.hits += 1
+
+        computed = []
+        for h, text in zip(hashes, texts):
+            if h not in self.memo:
+                self.memo[h] = self.tokenize(text)
+                computed.append((h, self.tokenizer, self.memo[h]))
+        if computed:
+            self.misses += len(computed)
+            self.conn.executemany("""
+                INSERT INTO section_tokens (content_hash, tokenizer, tokens) VALUES (?, ?, ?)
+                ON CONFLICT(content_hash, tokenizer) DO NOTHING
+            """, computed)
+            self.conn.commit()
+        return [self.memo[h] for h in hashes]
+
+    def count(self, text):
+        return self.counts([text])[0]
+
+class ContextPackBuilder:
+    """
+    Assembles an LLM context pack (Markdown) for one or many tickers under a token budget.
+    Every company's data is split into sections (header, financials, sector
+    valuation, segments, each narrative row, disclosures); sections are admitted
+    in SECTIONS priority order across all companies, so breadth comes before
+    depth. A narrative that does not fit is cut at a sentence boundary if at
+    least MIN_TRUNCATED_TOKENS remain. The pack is then laid out per company.
+    """
+    def __init__(self, tickers=None, budget=8000, sections=None, encoding="cl100k_base"):
+        self.loader = BulkMarkdownGenerator(tickers)
+        self.tickers = self.loader.tickers
+        self.budget = budget
+        self.sections = sections or SECTIONS
+        self.counter = TokenCounter(self.loader.conn, encoding)
+
+    def _sections(self, ticker, info, financials, segments, disclosures, narratives, sector):
+        """[(kind, text)] for one company, in display order."""
+        out = []
+        header = f"# {info['name']} ({ticker})\n**Sector:** {info['sector']} | **Market:** {info['market_type']}\n"
+        if info['desc_summary']:
+            header += f"**Summary:** {info['desc_summary']}\n"
+        out.append(("header", header))
+
+        if financials:
+            rows = [[
+                row['year'], row['quarter'],
+                _thousands(row['revenue']), _thousands(row['op_profit']), _thousands(row['net_income']),
+                _plain(row['assets']), _plain(row['liabilities']), _plain(row['equity']), _thousands(row['rnd_expenses'])
+            ] for row in financials]
+            out.append(("financials", "## Financial Highlights\n" + _pipe_table(FINANCIAL_COLUMNS[:-1] + ["R&D Expenses"], rows)))
+
+        if sector:
+            rows = [[
+                METRIC_LABELS[row['metric']], f"{row['value']:.2f}", f"{row['median']:.2f}", row['n'], _sector_position(row)
+            ] for row in sector]
+            out.append(("sector", f"## Valuation vs. {info['sector']}\n" + _pipe_table(["Metric", "Company", "Sector Median", "Peers", "Position"], rows)))
+
+        if segments:
+            rows = [[
+                row['period'], row['division'],
+                _thousands(row['revenue_krw'], row['revenue'] or "-"), _thousands(row['op_profit_krw'], row['op_profit'] or "-")
+            ] for row in segments]
+            out.append(("segments", "## Segments\n" + _pipe_table(["Period", "Division", "Revenue (KRW)", "Op. Profit (KRW)"], rows)))
+
+        for section in NARRATIVE_SECTIONS:
+            for row in narratives:
+                if row['section_type'] != section:
+                    continue
+                heading = "Key Takeaways" if section == "Key Takeaways" else NARRATIVE_HEADERS.get(section, section)
+                title = f"### {row['title']}\n" if row['title'] else ""
+                out.append((section, f"## {heading} ({row['period']})\n{title}{row['content']}\n"))
+
+        if disclosures:
+            lines = [f"- {_date_str(row['rcept_dt'])} {row['report_nm']}" for row in disclosures]
+            out.append(("disclosures", "## Recent Disclosures\n" + "\n".join(lines) + "\n"))
+        return out
+
+    def _truncate(self, text, tokens, max_tokens):
+        """
+        (prefix, tokens) for the longest prefix of text ending at a sentence (or
+        word) boundary that fits max_tokens, or None. The candidates depend on
+        the remaining budget, so they are tokenized directly instead of cached.
+        """
+        limit = len(text) * max_tokens // max(tokens, 1)
+        while limit > 0:
+            cut = text[:limit]
+            boundary = max(cut.rfind(". "), cut.rfind("\n"))
+            if boundary < len(cut) // 2:
+                boundary = cut.rfind(" ")
+            cut = cut[:boundary + 1].rstrip() if boundary > 0 else cut
+            candidate = cut + TRUNCATION_MARK + "\n"
+            n = self.counter.tokenize(candidate)
+            if n <= max_tokens:
+                return candidate, n
+            limit = int(limit * 0.9)
+        return None
+
+    def build(self):
+        """Returns (markdown, stats)."""
+        started = time.perf_counter()
+        companies, financials, segments, disclosures, narratives, sector = self.loader.load()
+        order = [t for t in (self.tickers or companies) if t in companies]
+
+        candidates = [] # (priority, company index, display index, ticker, kind, text)
+        for c, ticker in enumerate(order):
+            parts = self._sections(
+                ticker, companies[ticker], financials.get(ticker, []), segments.get(ticker, []),
+                disclosures.get(ticker, []), narratives.get(ticker, []), sector.get(ticker, [])
+            )
+            for d, (kind, text) in enumerate(parts):
+                if kind in self.sections:
+                    candidates.append((self.sections.index(kind), c, d, ticker, kind, text))
+        candidates.sort(key=lambda x: x[:3])
+        tokens = self.counter.counts([c[5] for c in candidates])
+
+        kept, used, dropped, truncated = [], 0, 0, 0
+        for (priority, c, d, ticker, kind, text), n in zip(candidates, tokens):
+            if used + n > self.budget:
+                remaining = self.budget - used
+                cut = self._truncate(text, n, remaining) if kind in NARRATIVE_SECTIONS and remaining >= MIN_TRUNCATED_TOKENS else None
+                if cut is None:
+                    dropped += 1
+                    continue
+                text, n = cut
+                truncated += 1
+            kept.append((c, d, text))
+            used += n
+
+        kept.sort()
+        pack = "\n".join(text for _, _, text in kept)
+        stats = {
+            "companies": len(order), "sections": len(kept), "dropped": dropped, "truncated": truncated,
+            "tokens": used, "budget": self.budget, "tokenizer": self.counter.tokenizer,
+            "cache_hits": self.counter.hits, "tokenized": self.counter.misses,
+            "elapsed": time.perf_counter() - started,
+        }
+        return pack, stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a token-budgeted LLM context pack for one or more companies")
+    parser.add_argument("tickers", nargs="*", help="Tickers to include, in order (default: every company in the database)")
+    parser.add_argument("--budget", type=int, default=8000, help="Token budget for the whole pack")
+    parser.add_argument("--sections", help=f"Comma-separated sections in priority order (default: {','.join(SECTIONS)})")
+    parser.add_argument("--encoding", default="cl100k_base", help="tiktoken encoding, when tiktoken is installed")
+    parser.add_argument("--output", default="output/context_pack.md", help="Output file")
+    args = parser.parse_args()
+
+    sections = args.sections.split(",") if args.sections else None
+    unknown = [s for s in sections or [] if s not in SECTIONS]
+    if unknown:
+        print(f"Unknown section(s): {', '.join(unknown)}; expected {', '.join(SECTIONS)}")
+        sys.exit(1)
+
+    pack, stats = ContextPackBuilder(args.tickers or None, args.budget, sections, args.encoding).build()
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(pack)
+    print(f"Wrote {args.output}: {stats['sections']} section(s) for {stats['companies']} companies, "
+          f"{stats['tokens']}/{stats['budget']} tokens ({stats['tokenizer']}), "
+          f"{stats['truncated']} truncated, {stats['dropped']} dropped")
+    print(f"Token counts: {stats['cache_hits']} cached, {stats['tokenized']} tokenized; {stats['elapsed']:.2f}s")
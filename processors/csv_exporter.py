@@ -0,0 +1,118 @@
+import sys
+import os
+import csv
+import gzip
+import argparse
+from io import StringIO
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection
+
+CHART_COLUMNS = ["date", "open", "high", "low", "close", "volume", "ma5", "ma20", "ma60"]
+
+class StreamingCsvExporter:
+    """
+    Writes market_daily rows as CSV straight from the SQLite cursor, chunk by chunk.
+    Memory use is bounded by chunk_size regardless of history length or how many
+    tickers a bundle covers.
+    """
+    def __init__(self, conn=None, chunk_size=5000):
+        self.conn = conn or get_db_connection()
+        self.chunk_size = chunk_size
+
+    def _query(self, tickers=None, sector=None, start=None, end=None):
+        """
+        Builds the export query. Exports covering more than one ticker (a list or a
+        sector) are bundles and carry a leading ticker column.
+        """
+        tickers = list(tickers or [])
+        bundle = sector is not None or len(tickers) != 1
+        columns = (["ticker"] if bundle else []) + CHART_COLUMNS
+        select = ", ".join(f"m.{c}" for c in columns)
+
+        joins, where, params = [], [], []
+        if len(tickers) == 1:
+            where.append("m.ticker = ?")
+            params.append(tickers[0])
+        elif tickers:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS export_tickers (ticker TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM export_tickers")
+            self.conn.executemany("INSERT OR IGNORE INTO export_tickers (ticker) VALUES (?)", [(t,) for t in tickers])
+            joins.append("JOIN export_tickers e ON e.ticker = m.ticker")
+        if sector is not None:
+            joins.append("JOIN companies c ON c.ticker = m.ticker")
+            where.append("c.sector = ?")
+            params.append(sector)
+        if start:
+            where.append("m.date >= ?")
+            params.append(start)
+        if end:
+            where.append("m.date <= ?")
+            params.append(end)
+
+        sql = f"SELECT {select} FROM market_daily m {' '.join(joins)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # Matches the UNIQUE(ticker, date) index, so rows come back without a sort step.
+        sql += " ORDER BY m.ticker, m.date"
+        return sql, params, columns
+
+    def iter_chunks(self, tickers=None, sector=None, start=None, end=None):
+        """Yields the CSV as text chunks: the header, then one chunk per cursor batch."""
+        sql, params, columns = self._query(tickers, sector, start, end)
+        buffer = StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+        cursor = self.conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+
+    def export(self, path, tickers=None, sector=None, start=None, end=None, compress=None):
+        """
+        Streams the selection to `path`. Gzip is used when compress is True or the
+        path ends with .gz. Returns the number of data rows written.
+        """
+        if compress is None:
+            compress = path.endswith(".gz")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        written = -1 # header
+        if compress:
+            f = gzip.open(path, "wt", compresslevel=6, encoding="utf-8", newline="")
+        else:
+            f = open(path, "w", encoding="utf-8", newline="")
+        with f:
+            for chunk in self.iter_chunks(tickers, sector, start, end):
+                f.write(chunk)
+                written += chunk.count("\n")
+        return max(written, 0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export market data as CSV (streamed)")
+    parser.add_argument("tickers", nargs="*", help="Tickers to export; more than one produces a bundle")
+    parser.add_argument("--sector", help="Export every company in this sector")
+    parser.add_argument("--start", help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--gzip", action="store_true", help="Compress the output")
+    parser.add_argument("--output", help="Output path (default: output/<ticker|bundle>_Chart.csv[.gz])")
+    args = parser.parse_args()
+
+    if not args.tickers and not args.sector:
+        parser.error("give at least one ticker or --sector")
+
+    name = args.tickers[0] if len(args.tickers) == 1 and not args.sector else "bundle"
+    path = args.output or f"output/{name}_Chart.csv" + (".gz" if args.gzip else "")
+    rows = StreamingCsvExporter().export(path, args.tickers, args.sector, args.start, args.end, compress=args.gzip or None)
+    print(f"Exported {rows} rows to {path}")
@@ -1,30 +1,36 @@
 import os
-import pandas as pd
 from utils import get_db_connection
+from processors.artifact_cache import ArtifactCache
+from processors.csv_exporter import StreamingCsvExporter
 
 class CsvGenerator:
     def __init__(self, ticker):
         self.ticker = ticker
         self.conn = get_db_connection()
 
-    def generate_chart_csv(self, output_dir="output"):
-        """Generates [Ticker]_Chart.csv"""
-        query = """
-            SELECT date, open, high, low, close, volume, ma5, ma20, ma60
-            FROM market_daily 
-            WHERE ticker = %s 
-            ORDER BY date ASC
+    def generate_chart_csv(self, output_dir="output", start=None, end=None, compress=False):
+        """
+        Generates [Ticker]_Chart.csv.
+        Every export is streamed from the cursor, so memory stays flat. The full
+        history is cached as the output file itself and rewritten only when the
+        ticker's data version changes.
         """
-        df = pd.read_sql(query, self.conn, params=(self.ticker,))
-        
-        if df.empty:
-            print(f"No market data found for {self.ticker}")
-            return
-
         os.makedirs(output_dir, exist_ok=True)
         output_path = f"{output_dir}/{self.ticker}_Chart.csv"
-        df.to_csv(output_path, index=False)
-        print(f"Generated CSV for {self.ticker} at {output_path}")
+
+        if start or end or compress:
+            output_path += ".gz" if compress else ""
+            rows = StreamingCsvExporter(self.conn).export(output_path, [self.ticker], start=start, end=end, compress=compress)
+            print(f"Generated CSV for {self.ticker} at {output_path} ({rows} rows)")
+            return
+
+        exporter = StreamingCsvExporter(self.conn)
+        cached = ArtifactCache(self.conn).get_file(self.ticker, "Chart.csv", output_path,
+                                                   lambda path: exporter.export(path, [self.ticker]))
+        if cached is None:
+            print(f"No market data found for {self.ticker}")
+            return
+        print(f"Generated CSV for {self.ticker} at {output_path}{'' if cached.regenerated else ' (cached)'}")
 
 if __name__ == "__main__":
     generator = CsvGenerator("005930")
@@ -1,12 +1,176 @@
 import sys
 import os
+from io import StringIO
 
 # Add project root to sys.path to allow importing utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import pandas as pd
 from utils import get_db_connection
-from datetime import datetime
+from processors.artifact_cache import ArtifactCache
+from processors.sector_stats import METRIC_LABELS, fetch_sector_comparison
+
+FINANCIAL_COLUMNS = ["year", "quarter", "revenue", "op_profit", "net_income", "assets", "liabilities", "equity", "rnd_expenses"]
+NARRATIVE_SECTION_ORDER = ["Key Takeaways", "What's New", "Business Overview", "MD&A", "News"]
+NARRATIVE_HEADERS = {
+    "What's New": "What's New Since the Previous Report",
+    "Business Overview": "1. Business Overview (사업의 내용)",
+    "MD&A": "2. MD&A (이사의 경영진단 및 분석의견)",
+    "News": "3. News & Conference Call Summary",
+}
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+def _pipe_table(headers, rows):
+    """
+    Renders a GitHub pipe table laid out the way `DataFrame.to_markdown` does
+    (numeric columns right-aligned), without going through pandas/tabulate.
+    """
+    cells = [["" if value is None else str(value) for value in row] for row in rows]
+    numeric = [all(_is_number(row[i]) for row in cells if row[i]) for i in range(len(headers))]
+    widths = [max([len(header) + 2] + [len(row[i]) for row in cells]) for i, header in enumerate(headers)]
+
+    def line(values):
+        padded = [value.rjust(w) if num else value.ljust(w) for value, w, num in zip(values, widths, numeric)]
+        return "| " + " | ".join(padded) + " |\n"
+
+    out = StringIO()
+    out.write(line(headers))
+    out.write("|" + "|".join("-" * (w + 1) + ":" if num else ":" + "-" * (w + 1) for w, num in zip(widths, numeric)) + "|\n")
+    for row in cells:
+        out.write(line(row))
+    return out.getvalue()
+
+def _thousands(value, missing="-"):
+    return f"{value:,}" if value is not None else missing
+
+def _plain(value, missing="-"):
+    return value if value is not None else missing
+
+def _date_str(rcept_dt):
+    return rcept_dt if isinstance(rcept_dt, str) else rcept_dt.strftime('%Y-%m-%d')
+
+def _sector_position(row):
+    if row['n'] < 4:
+        return "-"
+    if row['value'] < row['p25']:
+        return "Bottom quartile"
+    if row['value'] < row['median']:
+        return "Below median"
+    if row['value'] <= row['p75']:
+        return "Above median"
+    return "Top quartile"
+
+def render_overview(ticker, info, financials, segments, disclosures, sector=None):
+    """
+    Renders [Ticker]_Overview.md from plain rows (dicts or sqlite3.Row).
+    financials: latest periods first; segments: period DESC, division ASC; disclosures: latest first;
+    sector: fetch_sector_comparison rows for the ticker.
+    """
+    out = StringIO()
+    out.write(f"# {info['name']} ({ticker}) - Corporate Overview\n\n")
+    out.write(f"**Sector:** {info['sector']} | **Market:** {info['market_type']}\n")
+    if info['est_dt']:
+        out.write(f"**Established:** {info['est_dt']} | ")
+    if info['listing_dt']:
+        out.write(f"**Listed:** {info['listing_dt']}\n")
+    else:
+        out.write("\n")
+
+    out.write(f"**Summary:** {info['desc_summary']}\n\n")
+
+    out.write("## 1. Financial Highlights (Recent)\n")
+    if financials:
+        headers = FINANCIAL_COLUMNS[:-1] + ["R&D Expenses"]
+        rows = [[
+            row['year'], row['quarter'],
+            _thousands(row['revenue']), _thousands(row['op_profit']), _thousands(row['net_income']),
+            _plain(row['assets']), _plain(row['liabilities']), _plain(row['equity']),
+            _thousands(row['rnd_expenses'])
+        ] for row in financials]
+        out.write(_pipe_table(headers, rows).rstrip("\n"))
+    else:
+        out.write("No financial data available.\n")
+
+    out.write("\n\n## 2. Segment Performance (Recent)\n")
+    if segments:
+        out.write("| Period | Division | Revenue (KRW) | Op. Profit (KRW) |\n")
+        out.write("| :--- | :--- | :--- | :--- |\n")
+        for row in segments:
+            rev = _thousands(row['revenue_krw'], row['revenue'] or "-")
+            op = _thousands(row['op_profit_krw'], row['op_profit'] or "-")
+            out.write(f"| {row['period']} | {row['division']} | {rev} | {op} |\n")
+    else:
+        out.write("No segment data available.\n")
+
+    out.write("\n\n## 3. Recent Disclosures\n")
+    if disclosures:
+        for row in disclosures:
+            out.write(f"- **{_date_str(row['rcept_dt'])}** [{row['report_nm']}]({row['url']})\n")
+    else:
+        out.write("No disclosures found.\n")
+
+    out.write("\n\n## 4. Valuation vs. Sector\n")
+    if sector:
+        first = sector[0]
+        period = f"{first['year']} Q{first['quarter']}" if first['quarter'] else f"{first['year']} Annual"
+        out.write(f"Latest period ({period}) against {info['sector']} peers (latest period of each company).\n\n")
+        rows = [[
+            METRIC_LABELS[row['metric']], f"{row['value']:.2f}",
+            f"{row['median']:.2f}", f"{row['p25']:.2f}", f"{row['p75']:.2f}", row['n'], _sector_position(row)
+        ] for row in sector]
+        out.write(_pipe_table(["Metric", "Company", "Sector Median", "Q1", "Q3", "Peers", "Position"], rows))
+    else:
+        out.write("No sector data available.\n")
+
+    return out.getvalue()
+
+def render_narratives(ticker, narratives, disclosures):
+    """
+    Renders [Ticker]_Narratives.md.
+    narratives: rows of the latest period only, ordered by section_type.
+    """
+    out = StringIO()
+    out.write(f"# {ticker} - Deep Dive Narratives\n\n")
+
+    if narratives:
+        latest_period = narratives[0]['period']
+        out.write(f"## 분기보고서 ({latest_period}) Key Takeaways\n")
+
+        by_section = {}
+        for row in narratives:
+            by_section.setdefault(row['section_type'], []).append(row)
+
+        # Order: Key Takeaways -> What's New -> Business Overview -> MD&A -> News
+        for section in NARRATIVE_SECTION_ORDER:
+            section_data = by_section.get(section)
+            if not section_data:
+                continue
+            if section != "Key Takeaways": # Key Takeaways rows carry their own titles
+                out.write(f"## {NARRATIVE_HEADERS.get(section, section)}\n")
+
+            for row in section_data:
+                if row['title']:
+                    out.write(f"### {row['title']}\n")
+                out.write(f"{row['content']}\n\n")
+
+        return out.getvalue()
+
+    out.write("> [!NOTE]\n")
+    out.write("> Detailed text analysis will be available in the next update. Below are the direct links to recent reports.\n\n")
+
+    for row in disclosures:
+        out.write(f"## {row['report_nm']} ({_date_str(row['rcept_dt'])})\n")
+        out.write(f"**Link:** [View on DART]({row['url']})\n\n")
+        # Placeholder for parsed text
+        out.write("*Content extraction pending...*\n\n")
+        out.write("---\n\n")
+
+    return out.getvalue()
 
 class MarkdownGenerator:
     def __init__(self, ticker):
@@ -15,181 +179,78 @@ class MarkdownGenerator:
 
     def _fetch_company_info(self):
         query = "SELECT * FROM companies WHERE ticker = ?"
-        return pd.read_sql(query, self.conn, params=(self.ticker,))
+        return self.conn.execute(query, (self.ticker,)).fetchone()
 
     def _fetch_financials(self):
-        query = """
-            SELECT year, quarter, revenue, op_profit, net_income, assets, liabilities, equity, rnd_expenses
-            FROM financials 
-            WHERE ticker = ? 
+        query = f"""
+            SELECT {', '.join(FINANCIAL_COLUMNS)}
+            FROM financials
+            WHERE ticker = ?
             ORDER BY year DESC, quarter DESC
             LIMIT 4
         """
-        return pd.read_sql(query, self.conn, params=(self.ticker,))
+        return self.conn.execute(query, (self.ticker,)).fetchall()
+
+    def _fetch_segments(self):
+        query = "SELECT * FROM company_segments WHERE ticker = ? ORDER BY period DESC, division ASC"
+        return self.conn.execute(query, (self.ticker,)).fetchall()
 
     def _fetch_disclosures(self):
         query = """
             SELECT rcept_dt, report_nm, flr_nm, url
-            FROM disclosures 
-            WHERE ticker = ? 
+            FROM disclosures
+            WHERE ticker = ?
             ORDER BY rcept_dt DESC
             LIMIT 10
         """
-        return pd.read_sql(query, self.conn, params=(self.ticker,))
+        return self.conn.execute(query, (self.ticker,)).fetchall()
+
+    def _fetch_latest_narratives(self):
+        query = """
+            SELECT * FROM company_narratives
+            WHERE ticker = ? AND period = (SELECT MAX(period) FROM company_narratives WHERE ticker = ?)
+            ORDER BY section_type, id
+        """
+        return self.conn.execute(query, (self.ticker, self.ticker)).fetchall()
 
     def generate_overview(self):
         """Generates [Ticker]_Overview.md"""
-        company_df = self._fetch_company_info()
-        financials_df = self._fetch_financials()
-        disclosures_df = self._fetch_disclosures()
-
-        if company_df.empty:
+        info = self._fetch_company_info()
+        if info is None:
             return f"No data found for {self.ticker}"
 
-        info = company_df.iloc[0]
-        
-        md = f"# {info['name']} ({self.ticker}) - Corporate Overview\n\n"
-        md += f"**Sector:** {info['sector']} | **Market:** {info['market_type']}\n"
-        if info.get('est_dt'):
-            md += f"**Established:** {info['est_dt']} | "
-        if info.get('listing_dt'):
-            md += f"**Listed:** {info['listing_dt']}\n"
-        else:
-            md += "\n"
-            
-        md += f"**Summary:** {info['desc_summary']}\n\n"
-        
-        md += "## 1. Financial Highlights (Recent)\n"
-        if not financials_df.empty:
-            # Format numbers
-            financials_df['revenue'] = financials_df['revenue'].apply(lambda x: f"{x:,}")
-            financials_df['op_profit'] = financials_df['op_profit'].apply(lambda x: f"{x:,}")
-            financials_df['net_income'] = financials_df['net_income'].apply(lambda x: f"{x:,}")
-            if 'rnd_expenses' in financials_df.columns:
-                financials_df['rnd_expenses'] = financials_df['rnd_expenses'].apply(lambda x: f"{x:,}" if pd.notnull(x) else "-")
-                financials_df = financials_df.rename(columns={'rnd_expenses': 'R&D Expenses'})
-            
-            md += financials_df.to_markdown(index=False)
-        else:
-            md += "No financial data available.\n"
-        
-        # Dynamic Segment Performance
-        query = "SELECT * FROM company_segments WHERE ticker = ? ORDER BY period DESC, division ASC"
-        segments_df = pd.read_sql(query, self.conn, params=(self.ticker,))
-        
-        md += "\n\n## 2. Segment Performance (Recent)\n"
-        if not segments_df.empty:
-            md += "| Period | Division | Revenue (KRW) | Op. Profit (KRW) |\n"
-            md += "| :--- | :--- | :--- | :--- |\n"
-            for _, row in segments_df.iterrows():
-                # Format numbers
-                rev = row['revenue']
-                op = row['op_profit']
-                try:
-                    rev = f"{int(rev):,}"
-                except: pass
-                try:
-                    op = f"{int(op):,}"
-                except: pass
-                
-                md += f"| {row['period']} | {row['division']} | {rev} | {op} |\n"
-        else:
-            md += "No segment data available.\n"
-        
-        md += "\n\n## 3. Recent Disclosures\n"
-        if not disclosures_df.empty:
-            for _, row in disclosures_df.iterrows():
-                rcept_dt = row['rcept_dt']
-                if isinstance(rcept_dt, str):
-                    date_str = rcept_dt
-                else:
-                    date_str = rcept_dt.strftime('%Y-%m-%d')
-                md += f"- **{date_str}** [{row['report_nm']}]({row['url']})\n"
-        else:
-            md += "No disclosures found.\n"
-            
-        return md
+        return render_overview(
+            self.ticker, info,
+            self._fetch_financials(), self._fetch_segments(), self._fetch_disclosures(),
+            fetch_sector_comparison(self.conn, [self.ticker]).get(self.ticker, [])
+        )
 
     def generate_narratives(self):
         """Generates [Ticker]_Narratives.md"""
-        # For MVP, this might just be a placeholder or list of links if we haven't parsed text yet.
-        # The user plan says "Deep Dive Narratives... extracted text".
-        # Since we haven't implemented text parsing in collector yet, we'll provide a structure.
-        
-        md = f"# {self.ticker} - Deep Dive Narratives\n\n"
-        
-        # Dynamic Narratives
-        query = "SELECT * FROM company_narratives WHERE ticker = ? ORDER BY period DESC, section_type"
-        narratives_df = pd.read_sql(query, self.conn, params=(self.ticker,))
-        
-        if not narratives_df.empty:
-            # Group by period (taking the latest one for now)
-            latest_period = narratives_df.iloc[0]['period']
-            md += f"## 분기보고서 ({latest_period}) Key Takeaways\n"
-            
-            # Filter for latest period
-            current_narratives = narratives_df[narratives_df['period'] == latest_period]
-            
-            # Group by Section Type
-            # Order: Key Takeaways -> Business Overview -> MD&A -> News
-            section_order = ["Key Takeaways", "Business Overview", "MD&A", "News"]
-            
-            for section in section_order:
-                section_data = current_narratives[current_narratives['section_type'] == section]
-                if not section_data.empty:
-                    # Map section type to display header
-                    display_header = section
-                    if section == "Business Overview":
-                        display_header = "1. Business Overview (사업의 내용)"
-                    elif section == "MD&A":
-                        display_header = "2. MD&A (이사의 경영진단 및 분석의견)"
-                    elif section == "News":
-                        display_header = "3. News & Conference Call Summary"
-                    elif section == "Key Takeaways":
-                        display_header = "Key Takeaways" # Already in title if we want, or subsection
-                        
-                    if section != "Key Takeaways": # Key Takeaways handled differently or just as a section
-                        md += f"## {display_header}\n"
-                    
-                    for _, row in section_data.iterrows():
-                        if row['title']:
-                            md += f"### {row['title']}\n"
-                        md += f"{row['content']}\n\n"
-            
-            return md
-
-        md += "> [!NOTE]\n"
-        md += "> Detailed text analysis will be available in the next update. Below are the direct links to recent reports.\n\n"
-        
-        disclosures_df = self._fetch_disclosures()
-        if not disclosures_df.empty:
-            for _, row in disclosures_df.iterrows():
-                rcept_dt = row['rcept_dt']
-                if isinstance(rcept_dt, str):
-                    date_str = rcept_dt
-                else:
-                    date_str = rcept_dt.strftime('%Y-%m-%d')
-                md += f"## {row['report_nm']} ({date_str})\n"
-                md += f"**Link:** [View on DART]({row['url']})\n\n"
-                # Placeholder for parsed text
-                md += "*Content extraction pending...*\n\n"
-                md += "---\n\n"
-                
-        return md
+        narratives = self._fetch_latest_narratives()
+        disclosures = [] if narratives else self._fetch_disclosures()
+        return render_narratives(self.ticker, narratives, disclosures)
 
     def save_files(self, output_dir="output"):
         os.makedirs(output_dir, exist_ok=True)
-        
-        overview_md = self.generate_overview()
-        with open(f"{output_dir}/{self.ticker}_Overview.md", "w", encoding="utf-8") as f:
-            f.write(overview_md)
-            
-        narratives_md = self.generate_narratives()
-        with open(f"{output_dir}/{self.ticker}_Narratives.md", "w", encoding="utf-8") as f:
-            f.write(narratives_md)
-            
-        print(f"Generated Markdown files for {self.ticker} in {output_dir}/")
+        cache = ArtifactCache(self.conn)
+
+        regenerated = False
+        for artifact, render in (("Overview.md", self.generate_overview), ("Narratives.md", self.generate_narratives)):
+            cached = cache.get(self.ticker, artifact, render)
+            path = f"{output_dir}/{self.ticker}_{artifact}"
+            # Unchanged data: the file on disk already holds the cached bytes.
+            if cached.regenerated or not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(cached.content)
+                regenerated = regenerated or cached.regenerated
+
+        if regenerated:
+            print(f"Generated Markdown files for {self.ticker} in {output_dir}/")
+        else:
+            print(f"Markdown files for {self.ticker} are up to date in {output_dir}/")
 
 if __name__ == "__main__":
-    generator = MarkdownGenerator("005930")
+    ticker = sys.argv[1] if len(sys.argv) > 1 else "005930"
+    generator = MarkdownGenerator(ticker)
     generator.save_files()
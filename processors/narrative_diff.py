@@ -0,0 +1,229 @@
+import sys
+import os
+import re
+import argparse
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection, init_db, upsert_data
+
+WHATS_NEW = "What's New" # section_type of the stored diffs
+DIFFED_SECTIONS = ["Business Overview", "MD&A"]
+MAX_BLOCKS = 30 # per section; the rest is summarized as a count
+MAX_BLOCK_CHARS = 400
+FALLBACK_CELLS = 250_000 # gaps without unique anchors up to this size (len(a) * len(b)) go to difflib
+
+# Paragraphs: blank lines, or (for whitespace-collapsed DART text) numbered
+# sub-headings such as "1. 사업의 개요" / "가. 주요 제품".
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n|\s(?=(?:\d{1,2}|[가-하])\.\s+[가-힣A-Za-z(])")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n")
+
+def split_paragraphs(text):
+    return [p.strip() for p in PARAGRAPH_BREAK.split(text or "") if p and p.strip()]
+
+def split_sentences(paragraph):
+    return [" ".join(s.split()) for s in SENTENCE_BREAK.split(paragraph) if s and s.strip()]
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """Items occurring exactly once in a[alo:ahi] and b[blo:bhi], as (i, j), longest increasing run by j."""
+    count_a, count_b = defaultdict(int), defaultdict(int)
+    pos_a, pos_b = {}, {}
+    for i in range(alo, ahi):
+        count_a[a[i]] += 1
+        pos_a[a[i]] = i
+    for j in range(blo, bhi):
+        count_b[b[j]] += 1
+        pos_b[b[j]] = j
+    pairs = sorted((pos_a[x], pos_b[x]) for x in pos_a if count_a[x] == 1 and count_b.get(x) == 1)
+    if not pairs:
+        return []
+
+    # Patience sorting: longest increasing subsequence of j, O(k log k)
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pile = bisect_left(tails, j)
+        if pile == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pile] = j
+            tail_index[pile] = k
+        previous[k] = tail_index[pile - 1] if pile else None
+    run, k = [], tail_index[-1]
+    while k is not None:
+        run.append(pairs[k])
+        k = previous[k]
+    return run[::-1]
+
+def align(a, b):
+    """
+    Patience diff of two sequences of hashable items. Returns the matched (i, j)
+    pairs in order. Common prefixes/suffixes are matched first, then items unique
+    to both sides serve as anchors and the gaps between them are aligned the
+    same way; a gap with no unique items falls back to difflib if it is small.
+    """
+    matches = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            matches.extend(anchors)
+            bounds = [(alo - 1, blo - 1)] + anchors + [(ahi, bhi)]
+            for (i0, j0), (i1, j1) in zip(bounds, bounds[1:]):
+                if i1 - i0 > 1 and j1 - j0 > 1:
+                    stack.append((i0 + 1, i1, j0 + 1, j1))
+        elif (ahi - alo) * (bhi - blo) <= FALLBACK_CELLS:
+            matcher = SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for block in matcher.get_matching_blocks():
+                matches.extend((alo + block.a + k, blo + block.b + k) for k in range(block.size))
+    return sorted(matches)
+
+def opcodes(a, b, matches):
+    """('added' | 'removed' | 'changed', a[i0:i1] range, b[j0:j1] range) for every gap between matches."""
+    out = []
+    i = j = 0
+    for mi, mj in matches + [(len(a), len(b))]:
+        if mi > i or mj > j:
+            kind = "changed" if mi > i and mj > j else ("removed" if mi > i else "added")
+            out.append((kind, i, mi, j, mj))
+        i, j = mi + 1, mj + 1
+    return out
+
+def diff_texts(old, new):
+    """
+    Blocks of sentences that differ between two narratives:
+    [(kind, old sentences, new sentences)]. Paragraphs are aligned first;
+    only the paragraphs that changed are split into sentences and aligned again.
+    Items are compared through integer ids, so each step is a hash lookup.
+    """
+    ids = {}
+    def intern(items):
+        return [ids.setdefault(item, len(ids)) for item in items]
+
+    old_paragraphs, new_paragraphs = split_paragraphs(old), split_paragraphs(new)
+    a, b = intern(old_paragraphs), intern(new_paragraphs)
+    blocks = []
+    for kind, i0, i1, j0, j1 in opcodes(a, b, align(a, b)):
+        old_sentences = [s for p in old_paragraphs[i0:i1] for s in split_sentences(p)]
+        new_sentences = [s for p in new_paragraphs[j0:j1] for s in split_sentences(p)]
+        if kind != "changed":
+            blocks.append((kind, old_sentences, new_sentences))
+            continue
+        sa, sb = intern(old_sentences), intern(new_sentences)
+        for kind, k0, k1, l0, l1 in opcodes(sa, sb, align(sa, sb)):
+            blocks.append((kind, old_sentences[k0:k1], new_sentences[l0:l1]))
+    return blocks
+
+def _clip(sentences):
+    text = " ".join(sentences)
+    return text if len(text) <= MAX_BLOCK_CHARS else text[:MAX_BLOCK_CHARS].rstrip() + "…"
+
+def render_diff(blocks):
+    """Markdown bullet list of diff blocks: [+] added, [-] removed, [~] changed (with the previous text)."""
+    lines = []
+    for kind, old, new in blocks[:MAX_BLOCKS]:
+        if kind == "added":
+            lines.append(f"- [+] {_clip(new)}")
+        elif kind == "removed":
+            lines.append(f"- [-] ~~{_clip(old)}~~")
+        else:
+            lines.append(f"- [~] {_clip(new)} (was: {_clip(old)})")
+    if len(blocks) > MAX_BLOCKS:
+        lines.append(f"- … and {len(blocks) - MAX_BLOCKS} more change(s)")
+    return "\n".join(lines) if lines else "No changes."
+
+def build_whats_new(ticker, conn, periods=None):
+    """
+    "What's New" narrative rows for a ticker: for each period, the diff of each
+    DIFFED_SECTIONS text against that section's previous period.
+    periods: only build these periods (default: all with a predecessor).
+    Returns (rows, sentences compared).
+    """
+    texts = defaultdict(list) # section -> [(period, content)] in period order
+    for row in conn.execute(f"""
+        SELECT period, section_type, content FROM company_narratives
+        WHERE ticker = ? AND section_type IN ({', '.join(['?'] * len(DIFFED_SECTIONS))})
+        ORDER BY period
+    """, (ticker, *DIFFED_SECTIONS)):
+        texts[row['section_type']].append((row['period'], row['content']))
+
+    parts = defaultdict(list) # period -> [markdown per section]
+    compared = 0
+    for section in DIFFED_SECTIONS:
+        history = texts.get(section, [])
+        for (previous, old), (period, new) in zip(history, history[1:]):
+            if periods and period not in periods:
+                continue
+            blocks = diff_texts(old, new)
+            compared += sum(len(split_sentences(p)) for p in split_paragraphs(new))
+            added = sum(1 for kind, _, _ in blocks if kind == "added")
+            removed = sum(1 for kind, _, _ in blocks if kind == "removed")
+            changed = len(blocks) - added - removed
+            parts[period].append(
+                f"**{section}** vs. {previous}: {added} added, {changed} changed, {removed} removed\n\n{render_diff(blocks)}"
+            )
+
+    rows = [{
+        "ticker": ticker,
+        "period": period,
+        "section_type": WHATS_NEW,
+        "title": f"Changes in {period}",
+        "content": "\n\n".join(sections),
+    } for period, sections in sorted(parts.items())]
+    return rows, compared
+
+def save_whats_new(rows):
+    """
+    Stores What's New rows through upsert_data, so sections whose content is
+    unchanged are skipped and the narrative version is bumped only on a write.
+    Returns the number of rows written.
+    """
+    return upsert_data(table="company_narratives", data=rows, conflict_columns=["ticker", "period", "section_type"])
+
+def update_whats_new(ticker, periods=None):
+    """
+    Recomputes and stores a ticker's "What's New" rows. Called after new
+    narratives are saved. Returns the number of rows written.
+    """
+    init_db()
+    conn = get_db_connection()
+    try:
+        rows, _ = build_whats_new(ticker, conn, periods)
+        return save_whats_new(rows)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff each company's narratives against the previous period and store What's New sections")
+    parser.add_argument("tickers", nargs="*", help="Tickers to diff (default: every company with narratives)")
+    parser.add_argument("--period", action="append", help="Only build this period (repeatable)")
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db_connection()
+    tickers = args.tickers or [row['ticker'] for row in conn.execute("SELECT DISTINCT ticker FROM company_narratives")]
+    started = time.perf_counter()
+    written = compared = 0
+    for ticker in tickers:
+        rows, sentences = build_whats_new(ticker, conn, args.period)
+        compared += sentences
+        written += save_whats_new(rows)
+    elapsed = time.perf_counter() - started
+    print(f"Diffed {len(tickers)} companies ({compared} sentences) in {elapsed:.2f}s; wrote {written} What's New section(s)")
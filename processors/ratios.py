@@ -1,9 +1,10 @@
 import sqlite3
-from utils import get_db_connection, upsert_data
+from utils import get_db_connection, upsert_data, init_db
+from processors.screener import refresh_latest_fundamentals
 
 class RatioCalculator:
     def __init__(self):
-        pass
+        init_db() # Adds the TTM columns to older databases
 
     def calculate_ratios(self, ticker):
         """
@@ -39,11 +40,19 @@ class RatioCalculator:
                 current_assets = row['current_assets'] or 0
                 current_liabilities = row['current_liabilities'] or 0
                 
+                # Trailing-twelve-month net income (precomputed by the financials
+                # collector; equals net_income on annual rows). Quarterly rows without
+                # four consecutive quarters get no TTM-based ratios.
+                net_income_ttm = row['net_income_ttm']
+                if net_income_ttm is None and row['quarter'] == 0:
+                    net_income_ttm = net_income
+
                 # 1. EPS (Earnings Per Share)
                 # Note: Using current shares outstanding. Ideally should use weighted average shares.
                 eps = 0
                 if shares > 0:
                     eps = net_income / shares
+                eps_ttm = net_income_ttm / shares if shares > 0 and net_income_ttm is not None else 0
 
                 # 2. BPS (Book Value Per Share)
                 bps = 0
@@ -52,14 +61,15 @@ class RatioCalculator:
 
                 # 3. ROE (Return on Equity)
                 # Net Income / Equity
+                # TTM Net Income / Equity, so quarterly rows are annualized
                 roe = 0
-                if equity > 0:
-                    roe = (net_income / equity) * 100
+                if equity > 0 and net_income_ttm is not None:
+                    roe = (net_income_ttm / equity) * 100
 
                 # 4. ROA (Return on Assets)
                 roa = 0
-                if assets > 0:
-                    roa = (net_income / assets) * 100
+                if assets > 0 and net_income_ttm is not None:
+                    roa = (net_income_ttm / assets) * 100
 
                 # 5. Debt Ratio (Liabilities / Equity)
                 debt_ratio = 0
@@ -94,9 +104,9 @@ class RatioCalculator:
                 if price_row:
                     price = price_row['close']
                     
-                    # Calculate PER (Price / EPS)
-                    if eps > 0:
-                        per = price / eps
+                    # Calculate PER (Price / TTM EPS)
+                    if eps_ttm > 0:
+                        per = price / eps_ttm
                         
                     # Calculate PBR (Price / BPS)
                     if bps > 0:
@@ -126,6 +136,7 @@ class RatioCalculator:
                     update_columns=["eps", "bps", "roe", "roa", "debt_ratio", "current_ratio", "per", "pbr"]
                 )
                 print(f"Updated ratios for {len(updates)} financial records.")
+            refresh_latest_fundamentals(ticker)
 
         except Exception as e:
             print(f"Error calculating ratios: {e}")
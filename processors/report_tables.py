@@ -0,0 +1,356 @@
+import sys
+import os
+import re
+import argparse
+import time
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection, init_db, upsert_data, bump_data_version, forget_fingerprints
+
+# Money units are normalized to KRW; other units (%, 주, 명, ...) are kept as-is.
+UNIT_MULTIPLIERS = {"원": 1, "천원": 1_000, "백만원": 1_000_000, "억원": 100_000_000, "십억원": 1_000_000_000, "조원": 1_000_000_000_000}
+UNIT = re.compile(r"단위\s*[:：]\s*([^\s,)]+)")
+NUMBER = re.compile(r"^(△|\(|-)?\s*(\d[\d,]*(?:\.\d+)?)\s*\)?\s*%?$")
+EMPTY_VALUES = ("-", "–", "—", "")
+YEAR = re.compile(r"^(19|20)\d{2}\s*(년|년도)?$") # column headers such as "2024" are not values
+CHAPTER = re.compile(r"^[IVX]+\.\s")
+CELL_TAGS = ["td", "th", "te", "tu"] # DART uses TE/TU for number/unit cells
+
+def parse_amount(text, multiplier=1):
+    """
+    '1,234' / '△1,234' / '(1,234)' / '-1,234' -> number scaled by multiplier;
+    percentages ('12.5%') are not scaled. None if not a number.
+    """
+    text = (text or "").strip()
+    match = NUMBER.match(text)
+    if not match:
+        return None
+    number = float(match.group(2).replace(",", "")) * (1 if text.endswith("%") else multiplier)
+    if match.group(1):
+        number = -number
+    return int(number) if number.is_integer() else number
+
+# Amount strings as stored in company_segments: '29.27T KRW', '3조 2,000억원', '△1,234', '(512)'.
+AMOUNT_TERMS = r"(\d+(?:\.\d+)?)\s*(조원|조|억원|억|백만원|백만|천원|천|원|T|B|M|K)?"
+SUFFIX_MULTIPLIERS = {
+    "조원": 10**12, "조": 10**12, "억원": 10**8, "억": 10**8, "백만원": 10**6, "백만": 10**6,
+    "천원": 10**3, "천": 10**3, "원": 1, "T": 10**12, "B": 10**9, "M": 10**6, "K": 10**3,
+}
+
+def parse_krw(values, multiplier=1):
+    """
+    Vectorized parse of amount strings to KRW (list of int, None where no amount).
+    Terms with a unit are summed ('3조 2,000억원'); bare numbers are scaled by
+    multiplier. △, parentheses or a leading minus make the amount negative;
+    percentages are not amounts.
+    """
+    import pandas as pd
+    text = pd.Series(list(values), dtype="object").astype("string").str.strip()
+    negative = text.str.match(r"^[△(\-]").fillna(False)
+    cleaned = text.str.replace(",", "", regex=False).str.replace("KRW", "", regex=False)
+    cleaned = cleaned.where(~cleaned.str.contains("%", regex=False).fillna(False))
+
+    terms = cleaned.str.extractall(AMOUNT_TERMS)
+    if terms.empty:
+        return [None] * len(text)
+    scale = terms[1].map(SUFFIX_MULTIPLIERS).astype("float64").fillna(multiplier)
+    amounts = (terms[0].astype("float64") * scale).groupby(level=0).sum()
+    amounts = amounts.reindex(range(len(text))).round()
+    amounts = amounts.where(~negative, -amounts)
+    return [None if pd.isna(v) else int(v) for v in amounts]
+
+def _is_value(text):
+    return text.strip() in EMPTY_VALUES or NUMBER.match(text.strip()) is not None
+
+def _is_data(text):
+    text = text.strip()
+    return NUMBER.match(text) is not None and not YEAR.match(text)
+
+def _span(cell, attr):
+    value = str(cell.get(attr, 1)).strip()
+    return int(value) if value.isdigit() and int(value) > 0 else 1
+
+def _grid(table):
+    """Cell texts laid out on a grid with rowspan/colspan expanded."""
+    grid, pending = [], {} # pending: col -> (text, rows left) from rowspans above
+    for tr in table.find_all("tr"):
+        row, col = [], 0
+        cells = tr.find_all(CELL_TAGS)
+        for cell in cells + [None]:
+            while col in pending:
+                text, left = pending.pop(col)
+                row.append(text)
+                if left > 1:
+                    pending[col] = (text, left - 1)
+                col += 1
+            if cell is None:
+                break
+            text = " ".join(cell.get_text(" ", strip=True).split())
+            rowspan, colspan = _span(cell, "rowspan"), _span(cell, "colspan")
+            for _ in range(colspan):
+                row.append(text)
+                if rowspan > 1:
+                    pending[col] = (text, rowspan - 1)
+                col += 1
+        if any(row):
+            grid.append(row)
+    return grid
+
+def _label(parts):
+    labels = []
+    for part in parts:
+        if part and part not in labels:
+            labels.append(part)
+    return " / ".join(labels) or None
+
+def parse_tables(xml_text):
+    """
+    Every table of a DART document as long-format cells.
+    Each table gets the heading path it sits under ("II. 사업의 내용 > 4. 매출 및 수주상황"),
+    a caption (the text just before it) and a unit ("백만원" from "(단위 : 백만원)").
+    Leading rows without numbers are column headers; in the other rows, the
+    cells before the first number are the row label. Returns a list of dicts.
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(xml_text, "html.parser")
+
+    cells = []
+    chapter = heading = None
+    context = [] # text seen since the previous table or heading
+    table_index = 0
+    for element in soup.find_all(["title", "p", "table"]):
+        if element.name == "title":
+            text = " ".join(element.get_text(" ", strip=True).split())
+            if CHAPTER.match(text):
+                chapter, heading = text, None
+            else:
+                heading = text
+            context = []
+            continue
+        if element.name == "p":
+            if element.find_parent("table") is None:
+                text = element.get_text(" ", strip=True)
+                if text:
+                    context.append(" ".join(text.split()))
+            continue
+        if element.find_parent("table") is not None:
+            continue # nested tables are part of their parent
+
+        grid = _grid(element)
+        if not grid:
+            continue
+        table_text = " ".join(" ".join(row) for row in grid[:2])
+        unit_match = UNIT.search(" ".join(context[-3:]) + " " + table_text)
+        unit = unit_match.group(1) if unit_match else None
+        # A one-row table holding only the unit line is the caption of the next table.
+        if len(grid) == 1 and unit_match and not any(_is_data(c) for c in grid[0]):
+            context.append(" ".join(grid[0]))
+            continue
+
+        multiplier = UNIT_MULTIPLIERS.get(unit, 1)
+        caption = next((c for c in reversed(context) if not UNIT.search(c)), None)
+        section = " > ".join(p for p in (chapter, heading) if p) or None
+
+        numeric = any(_is_data(c) for row in grid for c in row)
+        header_rows = 0
+        if numeric:
+            while header_rows < len(grid) - 1 and not any(_is_data(c) for c in grid[header_rows]):
+                header_rows += 1
+        else:
+            header_rows = 1 if len(grid) > 1 else 0
+
+        width = max(len(row) for row in grid)
+        col_labels = [_label([row[c] if c < len(row) else "" for row in grid[:header_rows]]) for c in range(width)]
+        for row_index, row in enumerate(grid[header_rows:]):
+            first = next((c for c, text in enumerate(row) if numeric and _is_value(text) and c > 0), 1 if len(row) > 1 else 0)
+            row_label = _label(row[:first])
+            for col_index in range(first, len(row)):
+                text = row[col_index]
+                if not text:
+                    continue
+                cells.append({
+                    "table_index": table_index,
+                    "section": section,
+                    "caption": caption[:200] if caption else None,
+                    "unit": unit,
+                    "row_index": row_index,
+                    "col_index": col_index,
+                    "row_label": row_label,
+                    "col_label": col_labels[col_index],
+                    "value_text": text,
+                    "value": parse_amount(text, multiplier),
+                })
+        table_index += 1
+        context = []
+    return cells
+
+def store_report_tables(rcept_no, ticker, xml_text, conn=None):
+    """Parses a filing's tables and replaces its stored cells. Returns (tables, cells)."""
+    cells = parse_tables(xml_text)
+    own = conn is None
+    conn = conn or get_db_connection()
+    try:
+        conn.execute("DELETE FROM report_tables WHERE rcept_no = ?", (rcept_no,))
+        conn.executemany("""
+            INSERT INTO report_tables (rcept_no, ticker, table_index, section, caption, unit, row_index, col_index,
+                                       row_label, col_label, value_text, value)
+            VALUES (:rcept_no, :ticker, :table_index, :section, :caption, :unit, :row_index, :col_index,
+                    :row_label, :col_label, :value_text, :value)
+        """, [{**cell, "rcept_no": rcept_no, "ticker": ticker} for cell in cells])
+        conn.commit()
+    finally:
+        if own:
+            conn.close()
+    return len({cell['table_index'] for cell in cells}), len(cells)
+
+# Extractors: SQL over report_tables (joined with disclosures for the filing's
+# name and date). {filters} restricts the filings (see run_extractors).
+
+# First table under "사업의 내용 > 매출 ..." with 매출 rows and a 비중 column;
+# per division (first label), the first value of its 매출 / 영업이익 rows, as filed
+# and in KRW (tables without a unit line are taken to be in 백만원, as for R&D).
+SEGMENTS_SQL = """
+    WITH tables AS (
+        SELECT rcept_no, MIN(table_index) AS table_index FROM (
+            SELECT rcept_no, table_index FROM report_tables t
+            WHERE section LIKE '%사업의 내용%' AND section LIKE '%매출%' {filters}
+            GROUP BY rcept_no, table_index
+            HAVING MAX(COALESCE(row_label, '') LIKE '%매출%') AND MAX(COALESCE(col_label, '') LIKE '%비중%')
+        ) GROUP BY rcept_no
+    ),
+    cells AS (
+        SELECT t.rcept_no, t.ticker, t.row_index, t.row_label, REPLACE(REPLACE(t.value_text, ',', ''), '△', '-') AS amount,
+               CASE WHEN t.unit IS NULL THEN t.value * 1000000 ELSE t.value END AS krw,
+               substr(t.row_label, 1, instr(t.row_label, ' / ') - 1) AS division,
+               CASE WHEN substr(t.row_label, instr(t.row_label, ' / ')) LIKE '%매출%' THEN 'revenue'
+                    WHEN substr(t.row_label, instr(t.row_label, ' / ')) LIKE '%영업이익%' THEN 'op_profit' END AS metric,
+               ROW_NUMBER() OVER (PARTITION BY t.rcept_no, t.table_index, t.row_index ORDER BY t.col_index) AS rn
+        FROM report_tables t JOIN tables USING (rcept_no, table_index)
+        WHERE instr(t.row_label, ' / ') > 0 AND t.value IS NOT NULL
+    )
+    SELECT c.ticker, strftime('%Y.%m', d.rcept_dt) AS period, c.division,
+           COALESCE(MAX(CASE WHEN metric = 'revenue' THEN amount END), '0') AS revenue,
+           COALESCE(MAX(CASE WHEN metric = 'op_profit' THEN amount END), '0') AS op_profit,
+           CAST(MAX(CASE WHEN metric = 'revenue' THEN krw END) AS INTEGER) AS revenue_krw,
+           CAST(MAX(CASE WHEN metric = 'op_profit' THEN krw END) AS INTEGER) AS op_profit_krw
+    FROM cells c JOIN disclosures d ON d.rcept_no = c.rcept_no
+    WHERE c.rn = 1 AND c.metric IS NOT NULL AND c.division != ''
+    GROUP BY c.rcept_no, c.division
+    HAVING revenue != '0' OR op_profit != '0'
+"""
+
+# First "연구개발비 ... 계" row of each filing, in KRW. Tables without a unit
+# line are taken to be in 백만원 unless the figure is already over a trillion.
+RND_SQL = """
+    SELECT ticker, report_nm, CASE WHEN unit IS NULL AND value > 0 AND value < 1000000000000 THEN value * 1000000 ELSE value END AS rnd_expenses
+    FROM (
+        SELECT t.ticker, d.report_nm, t.unit, t.value,
+               ROW_NUMBER() OVER (PARTITION BY t.rcept_no ORDER BY t.table_index, t.row_index, t.col_index) AS rn
+        FROM report_tables t JOIN disclosures d ON d.rcept_no = t.rcept_no
+        WHERE t.row_label LIKE '%연구개발비%계%' AND t.value IS NOT NULL {filters}
+    ) WHERE rn = 1
+"""
+
+def _report_period(report_nm):
+    """(year, quarter) of a periodic report from its name, e.g. '분기보고서 (2025.09)' -> (2025, 3); annual -> quarter 0."""
+    match = re.search(r'\((\d{4})\.(\d{2})\)', report_nm or "")
+    if not match:
+        return None
+    quarter = 0 if "사업보고서" in report_nm else (int(match.group(2)) - 1) // 3 + 1
+    return int(match.group(1)), quarter
+
+def extract_segments(conn, filters="", params=()):
+    rows = [dict(row, insight="") for row in conn.execute(SEGMENTS_SQL.format(filters=filters), params)]
+    return upsert_data(table="company_segments", data=rows, conflict_columns=["ticker", "period", "division"],
+                       update_columns=["revenue", "op_profit", "revenue_krw", "op_profit_krw"])
+
+def fill_segment_amounts(conn, multiplier=UNIT_MULTIPLIERS["백만원"]):
+    """
+    Parses revenue_krw / op_profit_krw for segment rows that only have the text
+    figures (seeded rows, rows stored before the columns existed). Bare numbers
+    are taken to be in 백만원, like segment tables without a unit line.
+    Returns the number of rows updated.
+    """
+    rows = conn.execute("""
+        SELECT id, ticker, revenue, op_profit FROM company_segments
+        WHERE revenue_krw IS NULL AND op_profit_krw IS NULL
+    """).fetchall()
+    if not rows:
+        return 0
+    revenue = parse_krw([row['revenue'] for row in rows], multiplier)
+    op_profit = parse_krw([row['op_profit'] for row in rows], multiplier)
+    updates = [(r, o, row['id']) for row, r, o in zip(rows, revenue, op_profit) if r is not None or o is not None]
+    cursor = conn.cursor()
+    cursor.executemany("UPDATE company_segments SET revenue_krw = ?, op_profit_krw = ? WHERE id = ?", updates)
+    if updates:
+        ids = {row_id for _, _, row_id in updates}
+        tickers = [row['ticker'] for row in rows if row['id'] in ids]
+        bump_data_version(cursor, "company_segments", tickers)
+        forget_fingerprints(cursor, "company_segments", tickers)
+    conn.commit()
+    return len(updates)
+
+def extract_rnd(conn, filters="", params=()):
+    rows = []
+    for row in conn.execute(RND_SQL.format(filters=filters), params):
+        period = _report_period(row['report_nm'])
+        if period:
+            rows.append({"ticker": row['ticker'], "year": period[0], "quarter": period[1], "rnd_expenses": row['rnd_expenses']})
+    return upsert_data(table="financials", data=rows, conflict_columns=["ticker", "year", "quarter"], update_columns=["rnd_expenses"])
+
+EXTRACTORS = {"segments": extract_segments, "rnd": extract_rnd}
+
+def run_extractors(names=None, rcept_nos=None, tickers=None, since=None, conn=None):
+    """
+    Runs extractors over stored tables: some filings (rcept_nos), some tickers,
+    filings received on/after `since` (YYYY-MM-DD), or everything.
+    Returns {extractor: rows written}.
+    """
+    init_db()
+    filters, params = "", []
+    if rcept_nos:
+        filters += f" AND t.rcept_no IN ({', '.join(['?'] * len(rcept_nos))})"
+        params.extend(rcept_nos)
+    if tickers:
+        filters += f" AND t.ticker IN ({', '.join(['?'] * len(tickers))})"
+        params.extend(tickers)
+    if since:
+        filters += " AND t.rcept_no IN (SELECT rcept_no FROM disclosures WHERE rcept_dt >= ?)"
+        params.append(str(since))
+    own = conn is None
+    conn = conn or get_db_connection()
+    try:
+        return {name: EXTRACTORS[name](conn, filters, params) for name in names or EXTRACTORS}
+    finally:
+        if own:
+            conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run table extractors over stored report tables (no document fetches)")
+    parser.add_argument("tickers", nargs="*", help="Tickers to extract (default: all)")
+    parser.add_argument("--extract", default=",".join(EXTRACTORS), help=f"Comma-separated extractors ({', '.join(EXTRACTORS)})")
+    parser.add_argument("--since", help="Only filings received on/after this date (YYYY-MM-DD)")
+    parser.add_argument("--stats", action="store_true", help="Print what the table store holds")
+    args = parser.parse_args()
+
+    names = args.extract.split(",")
+    unknown = [n for n in names if n not in EXTRACTORS]
+    if unknown:
+        print(f"Unknown extractor(s): {', '.join(unknown)}; expected {', '.join(EXTRACTORS)}")
+        sys.exit(1)
+
+    init_db()
+    if args.stats:
+        conn = get_db_connection()
+        row = conn.execute("""
+            SELECT COUNT(DISTINCT rcept_no) AS filings, COUNT(DISTINCT rcept_no || ':' || table_index) AS tables, COUNT(*) AS cells
+            FROM report_tables
+        """).fetchone()
+        print(f"{row['filings']} filings, {row['tables']} tables, {row['cells']} cells stored")
+        conn.close()
+
+    started = time.perf_counter()
+    written = run_extractors(names, tickers=args.tickers or None, since=args.since)
+    print(", ".join(f"{name}: {n} row(s)" for name, n in written.items()) + f" in {time.perf_counter() - started:.2f}s")
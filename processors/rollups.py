@@ -0,0 +1,72 @@
+import sys
+import os
+import argparse
+import time
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection, init_db
+
+# Rollup table -> SQL expression of the period a trading day falls into.
+GRAINS = {
+    "market_weekly": "date({col}, 'weekday 0', '-6 days')", # Monday of the week
+    "market_monthly": "strftime('%Y-%m-01', {col})",
+}
+
+ROLLUP_SQL = """
+    INSERT INTO {table} (ticker, period_start, open, high, low, close, volume, days, last_date)
+    SELECT ticker, period_start, MAX(first_open), MAX(high), MIN(low), MAX(last_close), SUM(volume), COUNT(*), MAX(date)
+    FROM (
+        SELECT ticker, date, high, low, volume, {period} AS period_start,
+               FIRST_VALUE(open) OVER w AS first_open,
+               LAST_VALUE(close) OVER w AS last_close
+        FROM market_daily
+        WHERE close IS NOT NULL {filters}
+        WINDOW w AS (PARTITION BY ticker, {period} ORDER BY date ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+    )
+    GROUP BY ticker, period_start
+    ON CONFLICT(ticker, period_start) DO UPDATE SET
+    open = excluded.open, high = excluded.high, low = excluded.low, close = excluded.close,
+    volume = excluded.volume, days = excluded.days, last_date = excluded.last_date
+"""
+
+def refresh_rollups(ticker=None, since=None):
+    """
+    Recomputes the weekly and monthly OHLCV rollups from market_daily.
+    ticker: one company (default: all); since: first changed trading day. Only
+    periods from the one containing `since` onwards are rebuilt, so a daily
+    ingest touches the last few weeks/months instead of the whole history.
+    Returns {table: rows written}.
+    """
+    init_db()
+    conn = get_db_connection()
+    written = {}
+    try:
+        for table, period in GRAINS.items():
+            filters, params = "", []
+            if ticker:
+                filters += " AND ticker = ?"
+                params.append(ticker)
+            if since:
+                # Start of the period containing `since`, so that period is rebuilt whole.
+                filters += f" AND date >= {period.format(col='?')}"
+                params.append(str(since))
+            sql = ROLLUP_SQL.format(table=table, period=period.format(col="date"), filters=filters)
+            written[table] = conn.execute(sql, params).rowcount
+        conn.commit()
+        return written
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild weekly/monthly OHLCV rollups of market_daily")
+    parser.add_argument("tickers", nargs="*", help="Tickers to rebuild (default: all)")
+    parser.add_argument("--since", help="Only rebuild periods from this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for ticker in args.tickers or [None]:
+        written = refresh_rollups(ticker, args.since)
+        print(f"{ticker or 'all'}: " + ", ".join(f"{n} {table}" for table, n in written.items()))
+    print(f"Done in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,242 @@
+import sys
+import os
+import re
+import argparse
+import time
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection, init_db
+
+NUMERIC_COLUMNS = [
+    "per", "pbr", "roe", "roa", "debt_ratio", "current_ratio", "eps", "bps",
+    "market_cap", "close", "revenue_ttm", "op_profit_ttm", "net_income_ttm", "year", "quarter",
+]
+TEXT_COLUMNS = ["ticker", "name", "sector", "market_type"]
+
+# Latest period per company (an annual row outranks the derived Q4 of the same
+# year) and latest close, folded into one latest_fundamentals row. Ratios that
+# ratios.py stores as 0 when undefined are NULL here, so they never pass a filter.
+REFRESH_SQL = """
+    INSERT INTO latest_fundamentals (
+        ticker, name, sector, market_type, year, quarter, revenue_ttm, op_profit_ttm, net_income_ttm,
+        eps, bps, roe, roa, debt_ratio, current_ratio, close, price_date, market_cap, per, pbr
+    )
+    SELECT c.ticker, c.name, c.sector, c.market_type, f.year, f.quarter,
+           f.revenue_ttm, f.op_profit_ttm, f.ni_ttm,
+           CASE WHEN c.shares_outstanding > 0 THEN 1.0 * f.ni_ttm / c.shares_outstanding END,
+           CASE WHEN c.shares_outstanding > 0 THEN 1.0 * f.equity / c.shares_outstanding END,
+           CASE WHEN f.equity > 0 THEN f.roe END,
+           CASE WHEN f.assets > 0 THEN f.roa END,
+           CASE WHEN f.equity > 0 THEN f.debt_ratio END,
+           CASE WHEN f.current_liabilities > 0 THEN f.current_ratio END,
+           p.close, p.date,
+           CAST(p.close * c.shares_outstanding AS INTEGER),
+           CASE WHEN f.ni_ttm > 0 AND c.shares_outstanding > 0 THEN p.close * c.shares_outstanding / f.ni_ttm END,
+           CASE WHEN f.equity > 0 AND c.shares_outstanding > 0 THEN p.close * c.shares_outstanding / f.equity END
+    FROM companies c
+    LEFT JOIN (
+        SELECT *,
+               COALESCE(net_income_ttm, CASE quarter WHEN 0 THEN net_income END) AS ni_ttm,
+               ROW_NUMBER() OVER (
+                   PARTITION BY ticker
+                   ORDER BY year DESC, CASE quarter WHEN 0 THEN 4 ELSE quarter END DESC, quarter ASC
+               ) AS rn
+        FROM financials WHERE revenue IS NOT NULL {ticker_filter}
+    ) f ON f.ticker = c.ticker AND f.rn = 1
+    LEFT JOIN (
+        SELECT ticker, date, close, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) AS rn
+        FROM market_daily WHERE close IS NOT NULL {ticker_filter}
+    ) p ON p.ticker = c.ticker AND p.rn = 1
+    WHERE 1 {company_filter}
+    ON CONFLICT(ticker) DO UPDATE SET
+    name = excluded.name, sector = excluded.sector, market_type = excluded.market_type,
+    year = excluded.year, quarter = excluded.quarter, revenue_ttm = excluded.revenue_ttm,
+    op_profit_ttm = excluded.op_profit_ttm, net_income_ttm = excluded.net_income_ttm,
+    eps = excluded.eps, bps = excluded.bps, roe = excluded.roe, roa = excluded.roa,
+    debt_ratio = excluded.debt_ratio, current_ratio = excluded.current_ratio,
+    close = excluded.close, price_date = excluded.price_date, market_cap = excluded.market_cap,
+    per = excluded.per, pbr = excluded.pbr, updated_at = CURRENT_TIMESTAMP
+"""
+
+def refresh_latest_fundamentals(ticker=None):
+    """
+    Rebuilds one ticker's latest_fundamentals row (all companies when ticker is
+    None). Called by RatioCalculator after new ratios and by MarketCollector
+    after new prices; each call touches one row through the (ticker, ...) indexes.
+    Returns the number of rows written.
+    """
+    init_db()
+    conn = get_db_connection()
+    try:
+        if ticker:
+            sql = REFRESH_SQL.format(ticker_filter="AND ticker = ?", company_filter="AND c.ticker = ?")
+            params = (ticker, ticker, ticker)
+        else:
+            sql = REFRESH_SQL.format(ticker_filter="", company_filter="")
+            params = ()
+        written = conn.execute(sql, params).rowcount
+        conn.commit()
+        return written
+    finally:
+        conn.close()
+
+TOKEN = re.compile(r"""\s*(?:
+    (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<string>'[^']*'|"[^"]*")
+  | (?P<op><=|>=|!=|<>|==|=|<|>)
+  | (?P<punct>[(),])
+  | (?P<word>[^\W\d]\w*)
+)""", re.VERBOSE)
+
+OPERATORS = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", "=": "=", "==": "=", "!=": "!=", "<>": "!="}
+
+def tokenize(expression):
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Unexpected input at: {expression[position:position + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "word":
+            value = value.lower() if value.lower() in ("and", "or", "not", "in", "is", "null") else value
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+class ScreenCompiler:
+    """
+    Compiles a filter expression into a parameterized WHERE clause, e.g.
+        per < 10 and roe > 15 and (debt_ratio < 100 or sector = '은행')
+    Supports and/or/not, parentheses, comparisons, `in (...)` and `is [not] null`.
+    Only latest_fundamentals columns are accepted and values are bound as parameters.
+    """
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.params = []
+
+    def compile(self):
+        if not self.tokens:
+            return "1", []
+        sql = self.or_expr()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self.position][1]!r}")
+        return sql, self.params
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            found = "end of expression" if token[0] is None else repr(token[1])
+            raise ValueError(f"Expected {value or {'word': 'column'}.get(kind, kind)}, got {found}")
+        self.position += 1
+        return token[1]
+
+    def or_expr(self):
+        parts = [self.and_expr()]
+        while self.peek() == ("word", "or"):
+            self.take()
+            parts.append(self.and_expr())
+        return parts[0] if len(parts) == 1 else "(" + " OR ".join(parts) + ")"
+
+    def and_expr(self):
+        parts = [self.not_expr()]
+        while self.peek() == ("word", "and"):
+            self.take()
+            parts.append(self.not_expr())
+        return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+    def not_expr(self):
+        if self.peek() == ("word", "not"):
+            self.take()
+            return f"NOT {self.not_expr()}"
+        if self.peek() == ("punct", "("):
+            self.take()
+            sql = self.or_expr()
+            self.take("punct", ")")
+            return sql
+        return self.comparison()
+
+    def value(self, column):
+        kind, value = self.peek()
+        if column in NUMERIC_COLUMNS:
+            self.take("number")
+            self.params.append(float(value))
+        else:
+            self.take("string")
+            self.params.append(value[1:-1])
+        return "?"
+
+    def comparison(self):
+        column = self.take("word")
+        if column not in NUMERIC_COLUMNS and column not in TEXT_COLUMNS:
+            raise ValueError(f"Unknown column {column!r}; expected one of {', '.join(NUMERIC_COLUMNS + TEXT_COLUMNS)}")
+        kind, token = self.peek()
+        if token == "is":
+            self.take()
+            negate = self.peek() == ("word", "not")
+            if negate:
+                self.take()
+            self.take("word", "null")
+            return f"{column} IS {'NOT ' if negate else ''}NULL"
+        if token == "in":
+            self.take()
+            self.take("punct", "(")
+            values = [self.value(column)]
+            while self.peek() == ("punct", ","):
+                self.take()
+                values.append(self.value(column))
+            self.take("punct", ")")
+            return f"{column} IN ({', '.join(values)})"
+        operator = OPERATORS.get(self.take("op"))
+        return f"{column} {operator} {self.value(column)}"
+
+class Screener:
+    """Screens the whole universe over latest_fundamentals with compiled, indexed SQL."""
+    def __init__(self, conn=None):
+        init_db()
+        self.conn = conn or get_db_connection()
+
+    def screen(self, expression, sort=None, descending=False, limit=50):
+        """Returns (rows, elapsed seconds) for companies matching the expression."""
+        where, params = ScreenCompiler(expression).compile()
+        order = ""
+        if sort:
+            if sort not in NUMERIC_COLUMNS and sort not in TEXT_COLUMNS:
+                raise ValueError(f"Unknown sort column {sort!r}")
+            order = f"ORDER BY {sort} IS NULL, {sort} {'DESC' if descending else 'ASC'}"
+        started = time.perf_counter()
+        rows = self.conn.execute(
+            f"SELECT * FROM latest_fundamentals WHERE {where} {order} LIMIT ?", (*params, limit)
+        ).fetchall()
+        return rows, time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen the universe on latest-period fundamentals")
+    parser.add_argument("expression", nargs="?", default="", help="e.g. \"per < 10 and roe > 15 and sector = '반도체'\"")
+    parser.add_argument("--sort", help="Column to sort by")
+    parser.add_argument("--desc", action="store_true", help="Sort descending")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild latest_fundamentals for every company first")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        started = time.perf_counter()
+        written = refresh_latest_fundamentals()
+        print(f"Rebuilt {written} latest_fundamentals row(s) in {time.perf_counter() - started:.2f}s")
+    try:
+        rows, elapsed = Screener().screen(args.expression, args.sort, args.desc, args.limit)
+    except ValueError as e:
+        print(f"Invalid screen: {e}")
+        sys.exit(1)
+    columns = ["ticker", "name", "sector", "per", "pbr", "roe", "debt_ratio", "market_cap"]
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join("-" if row[c] is None else (f"{row[c]:.2f}" if isinstance(row[c], float) else str(row[c])) for c in columns))
+    print(f"\n{len(rows)} match(es) in {elapsed * 1000:.2f} ms")
@@ -0,0 +1,182 @@
+import sys
+import os
+import argparse
+import time
+from collections import defaultdict
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_db_connection, init_db, bump_data_version
+
+# Metric -> condition for the value to be meaningful. ratios.py stores 0 when a
+# ratio is undefined (loss-making, negative equity), which would skew the peers.
+METRICS = {
+    "per": lambda row: row['per'] > 0,
+    "pbr": lambda row: row['pbr'] > 0,
+    "roe": lambda row: (row['equity'] or 0) > 0,
+    "debt_ratio": lambda row: (row['equity'] or 0) > 0,
+}
+METRIC_LABELS = {"per": "PER", "pbr": "PBR", "roe": "ROE (%)", "debt_ratio": "Debt Ratio (%)"}
+
+# Latest period per ticker; an annual row outranks the derived Q4 of the same year.
+LATEST_PERIOD = """
+    SELECT * FROM (
+        SELECT f.*, c.sector,
+               ROW_NUMBER() OVER (
+                   PARTITION BY f.ticker
+                   ORDER BY f.year DESC, CASE f.quarter WHEN 0 THEN 4 ELSE f.quarter END DESC, f.quarter ASC
+               ) AS rn
+        FROM financials f JOIN companies c ON c.ticker = f.ticker
+        WHERE f.revenue IS NOT NULL AND c.sector IS NOT NULL AND c.sector != '' {where}
+    ) WHERE rn = 1
+"""
+
+def quantile(values, q):
+    """Linear-interpolated quantile of sorted values (pandas' default method)."""
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def _member_values(row):
+    """{metric: value} for the metrics that are meaningful on a financials row."""
+    return {metric: row[metric] for metric, meaningful in METRICS.items() if row[metric] is not None and meaningful(row)}
+
+class SectorAggregates:
+    """
+    Sector distributions (count, quartiles, median, range) of PER/PBR/ROE/debt
+    ratio over each company's latest period.
+    Each company's values are kept in sector_members; when one ticker's ratios
+    change only its row is rewritten and only the sectors it belongs to (or
+    left) are recomputed, reading that sector's members off the
+    (sector, metric, value) index. Reads are primary-key lookups on sector_stats.
+    Every member of a recomputed sector gets its sector_stats version bumped,
+    so peers' cached Overviews (keyed on data_versions) are rendered again.
+    """
+    def __init__(self):
+        init_db()
+
+    @staticmethod
+    def _bump_members(conn, sectors):
+        """Bumps the sector_stats version of every ticker in the given sectors."""
+        if not sectors:
+            return
+        tickers = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT ticker FROM sector_members WHERE sector IN ({', '.join(['?'] * len(sectors))})",
+            sorted(sectors)
+        )]
+        bump_data_version(conn, "sector_stats", tickers)
+
+    def _refresh(self, conn, sector, metric):
+        values = [row[0] for row in conn.execute(
+            "SELECT value FROM sector_members WHERE sector = ? AND metric = ? ORDER BY value", (sector, metric)
+        )]
+        if not values:
+            conn.execute("DELETE FROM sector_stats WHERE sector = ? AND metric = ?", (sector, metric))
+            return
+        conn.execute("""
+            INSERT INTO sector_stats (sector, metric, n, p25, median, p75, min, max)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(sector, metric) DO UPDATE SET
+            n = excluded.n, p25 = excluded.p25, median = excluded.median, p75 = excluded.p75,
+            min = excluded.min, max = excluded.max, updated_at = CURRENT_TIMESTAMP
+        """, (sector, metric, len(values), quantile(values, 0.25), quantile(values, 0.5), quantile(values, 0.75),
+              values[0], values[-1]))
+
+    def update_ticker(self, ticker):
+        """
+        Refreshes one ticker's membership and the stats of the sectors it affects.
+        Returns the number of (sector, metric) aggregates recomputed.
+        """
+        conn = get_db_connection()
+        try:
+            row = conn.execute(LATEST_PERIOD.format(where="AND f.ticker = ?"), (ticker,)).fetchone()
+            new = {}
+            if row:
+                new = {metric: (row['sector'], value, row['year'], row['quarter'])
+                       for metric, value in _member_values(row).items()}
+            old = {r['metric']: (r['sector'], r['value'], r['year'], r['quarter']) for r in conn.execute(
+                "SELECT metric, sector, value, year, quarter FROM sector_members WHERE ticker = ?", (ticker,)
+            )}
+            if new == old:
+                return 0
+
+            affected = set()
+            for metric in set(old) | set(new):
+                if old.get(metric) == new.get(metric):
+                    continue
+                if metric in old:
+                    affected.add((old[metric][0], metric))
+                if metric in new:
+                    affected.add((new[metric][0], metric))
+
+            conn.execute("DELETE FROM sector_members WHERE ticker = ?", (ticker,))
+            conn.executemany(
+                "INSERT INTO sector_members (ticker, metric, sector, value, year, quarter) VALUES (?, ?, ?, ?, ?, ?)",
+                [(ticker, metric, *member) for metric, member in new.items()]
+            )
+            for sector, metric in sorted(affected):
+                self._refresh(conn, sector, metric)
+            bump_data_version(conn, "sector_members", [ticker])
+            self._bump_members(conn, {sector for sector, _ in affected})
+            conn.commit()
+            return len(affected)
+        finally:
+            conn.close()
+
+    def rebuild(self):
+        """Recomputes every sector from financials in one pass (initial load / repair)."""
+        started = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            members = []
+            for row in conn.execute(LATEST_PERIOD.format(where="")):
+                for metric, value in _member_values(row).items():
+                    members.append((row['ticker'], metric, row['sector'], value, row['year'], row['quarter']))
+
+            conn.execute("DELETE FROM sector_members")
+            conn.execute("DELETE FROM sector_stats")
+            conn.executemany(
+                "INSERT INTO sector_members (ticker, metric, sector, value, year, quarter) VALUES (?, ?, ?, ?, ?, ?)",
+                members
+            )
+            keys = sorted({(sector, metric) for _, metric, sector, *_rest in members})
+            for sector, metric in keys:
+                self._refresh(conn, sector, metric)
+            self._bump_members(conn, {sector for sector, _ in keys})
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"Rebuilt {len(keys)} sector aggregate(s) from {len(members)} member value(s) in {time.perf_counter() - started:.2f}s")
+        return len(keys)
+
+def fetch_sector_comparison(conn, tickers=None, join=""):
+    """
+    {ticker: [row, ...]} with each ticker's metric value next to its sector's
+    stats, in METRICS order. Index lookups only; no financials scan.
+    tickers: restrict to these; join: or a join clause on `ticker` (bulk_markdown's temp table).
+    """
+    where = f"WHERE m.ticker IN ({', '.join(['?'] * len(tickers))})" if tickers else ""
+    order = ' '.join(f"WHEN '{metric}' THEN {i}" for i, metric in enumerate(METRICS))
+    comparison = defaultdict(list)
+    for row in conn.execute(f"""
+        SELECT m.ticker, m.metric, m.value, m.year, m.quarter, s.sector, s.n, s.p25, s.median, s.p75, s.min, s.max
+        FROM sector_members m {join} JOIN sector_stats s ON s.sector = m.sector AND s.metric = m.metric
+        {where}
+        ORDER BY m.ticker, CASE m.metric {order} END
+    """, list(tickers or [])):
+        comparison[row['ticker']].append(row)
+    return comparison
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain sector aggregates of PER/PBR/ROE/debt ratio")
+    parser.add_argument("tickers", nargs="*", help="Refresh these tickers only")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every sector from scratch")
+    args = parser.parse_args()
+
+    aggregates = SectorAggregates()
+    if args.rebuild or not args.tickers:
+        aggregates.rebuild()
+    for ticker in args.tickers:
+        print(f"{ticker}: {aggregates.update_ticker(ticker)} sector aggregate(s) updated")
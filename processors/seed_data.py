@@ -1,13 +1,14 @@
-import sqlite3
+import sys
 import os
 
-def get_db_connection():
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bump_data_version, forget_fingerprints, init_db, get_db_connection
+from processors.report_tables import parse_krw
 
 def seed_samsung_data():
+    init_db()
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -23,16 +24,20 @@ def seed_samsung_data():
         ("2025.3Q", "Harman", "3.53T KRW", "0.36T KRW", "Automotive demand stable.")
     ]
     
-    for period, division, revenue, op_profit, insight in segments:
+    revenue_krw = parse_krw([s[2] for s in segments])
+    op_profit_krw = parse_krw([s[3] for s in segments])
+    for (period, division, revenue, op_profit, insight), rev_krw, op_krw in zip(segments, revenue_krw, op_profit_krw):
         try:
             cursor.execute("""
-                INSERT INTO company_segments (ticker, period, division, revenue, op_profit, insight)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO company_segments (ticker, period, division, revenue, op_profit, revenue_krw, op_profit_krw, insight)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(ticker, period, division) DO UPDATE SET
                 revenue=excluded.revenue,
                 op_profit=excluded.op_profit,
+                revenue_krw=excluded.revenue_krw,
+                op_profit_krw=excluded.op_profit_krw,
                 insight=excluded.insight
-            """, (ticker, period, division, revenue, op_profit, insight))
+            """, (ticker, period, division, revenue, op_profit, rev_krw, op_krw, insight))
         except Exception as e:
             print(f"Error inserting segment {division}: {e}")
 
@@ -82,6 +87,9 @@ def seed_samsung_data():
         except Exception as e:
             print(f"Error inserting narrative {section_type}/{title}: {e}")
 
+    for table in ("company_segments", "company_narratives"):
+        bump_data_version(cursor, table, [ticker])
+        forget_fingerprints(cursor, table, [ticker])
     conn.commit()
     conn.close()
     print("Seeding completed.")
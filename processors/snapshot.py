@@ -0,0 +1,71 @@
+import sys
+import os
+import argparse
+import sqlite3
+import time
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import DB_FILE, init_db
+
+SNAPSHOT_FILE = "data_read.db"
+
+# Indexes for the web tier's read queries that the write database does not need.
+READ_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_read_disclosures ON disclosures(ticker, rcept_dt)",
+    "CREATE INDEX IF NOT EXISTS idx_read_companies_sector ON companies(sector)",
+]
+
+# Write-side tables the web reads and writes on data.db directly, or never reads.
+WRITE_ONLY_TABLES = [
+    "collection_jobs", "ticker_requests", "feedbacks", "artifact_cache", "row_fingerprints", "stage_runs",
+    "corp_codes", "document_queue", "poller_state", "section_tokens", "report_tables",
+    "backfill_runs", "run_ledger",
+]
+
+def publish_snapshot(src=DB_FILE, dest=SNAPSHOT_FILE, vacuum=True):
+    """
+    Publishes a read-only copy of the database for the web tier.
+    The copy is taken with the SQLite backup API (a consistent point-in-time
+    image; collectors keep writing meanwhile), indexed for reads, ANALYZEd and
+    moved into place with os.replace, so readers see either the old or the new
+    snapshot and never a partial one. Returns the snapshot path.
+    """
+    started = time.perf_counter()
+    tmp = f"{dest}.tmp{os.getpid()}"
+    for path in (tmp, tmp + "-journal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    source = sqlite3.connect(src, timeout=30)
+    target = sqlite3.connect(tmp)
+    try:
+        source.backup(target)
+        for table in WRITE_ONLY_TABLES:
+            target.execute(f"DROP TABLE IF EXISTS {table}")
+        for sql in READ_INDEXES:
+            target.execute(sql)
+        # Readers open the file read-only, which a WAL database does not allow without its -shm file.
+        target.execute("PRAGMA journal_mode=DELETE")
+        target.execute("ANALYZE")
+        target.commit()
+        if vacuum:
+            target.execute("VACUUM")
+    finally:
+        target.close()
+        source.close()
+
+    os.replace(tmp, dest)
+    size = os.path.getsize(dest) / 1e6
+    print(f"Published read snapshot {dest} ({size:.1f} MB) in {time.perf_counter() - started:.2f}s")
+    return dest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish the read-only snapshot used by the web app")
+    parser.add_argument("--dest", default=SNAPSHOT_FILE, help="Snapshot path")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip compacting the snapshot")
+    args = parser.parse_args()
+
+    init_db()
+    publish_snapshot(dest=args.dest, vacuum=not args.no_vacuum)
@@ -0,0 +1,461 @@
+import sys
+import os
+import io
+import argparse
+import contextlib
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Add project root to sys.path to allow importing utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from utils import get_db_connection, init_db, bump_data_version, forget_fingerprints
+
+# Synthetic tickers are 6-digit codes from TICKER_BASE up, a range no listed
+# company uses, so a synthetic universe can share a database with real data.
+TICKER_BASE = 960000
+MAX_COMPANIES = 1_000_000 - TICKER_BASE
+
+# sector: (name suffixes, annual revenue growth, annual price volatility, operating margin, R&D / revenue, divisions)
+SECTORS = {
+    "반도체 제조업": (["반도체", "세미콘", "테크"], 0.08, 0.38, 0.14, 0.09, ["메모리", "시스템LSI", "파운드리"]),
+    "전자부품 제조업": (["전자", "일렉트릭", "디바이스"], 0.05, 0.34, 0.07, 0.05, ["전자부품", "모듈", "소재"]),
+    "자동차 신품 부품 제조업": (["모비스", "오토텍", "정공"], 0.04, 0.30, 0.05, 0.03, ["완성차", "부품", "A/S"]),
+    "기초 화학물질 제조업": (["화학", "케미칼", "유화"], 0.03, 0.32, 0.08, 0.02, ["석유화학", "첨단소재", "생명과학"]),
+    "의약품 제조업": (["제약", "바이오", "팜"], 0.06, 0.45, 0.10, 0.14, ["전문의약품", "일반의약품", "해외"]),
+    "소프트웨어 개발 및 공급업": (["소프트", "시스템즈", "랩스"], 0.07, 0.42, 0.12, 0.16, ["솔루션", "클라우드", "유지보수"]),
+    "건물 건설업": (["건설", "산업개발", "E&C"], 0.02, 0.33, 0.04, 0.01, ["건축", "토목", "플랜트"]),
+    "음·식료품 도매업": (["식품", "푸드", "유통"], 0.03, 0.22, 0.05, 0.01, ["가공식품", "음료", "해외"]),
+    "금융 지원 서비스업": (["홀딩스", "금융", "파트너스"], 0.04, 0.26, 0.20, 0.00, ["투자", "자산관리", "기타"]),
+}
+NAME_SYLLABLES = ["한", "대", "동", "신", "삼", "성", "영", "우", "진", "태", "광", "세", "일", "제", "화", "남", "국", "미", "현", "청"]
+HOLDER_SURNAMES = ["김", "이", "박", "최", "정", "강", "조", "윤", "장", "임"]
+HOLDER_GIVEN = ["민준", "서연", "도윤", "하은", "지호", "수아", "현우", "지민", "준서", "예린"]
+SEASONALITY = [0.23, 0.25, 0.25, 0.27] # share of annual revenue per quarter
+
+# Periodic reports: (quarter, report name, month of the period end, filing month, filing day)
+PERIODIC_REPORTS = [
+    (1, "분기보고서", 3, 5, 14),
+    (2, "반기보고서", 6, 8, 14),
+    (3, "분기보고서", 9, 11, 14),
+    (0, "사업보고서", 12, 3, 20), # filed the following year
+]
+
+def trading_days(start, end):
+    """Weekdays between two dates (no holiday calendar) as numpy datetime64[D]."""
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1, dtype="datetime64[D]")
+    return days[np.is_busday(days)]
+
+def filing_date(year, quarter):
+    """Date a periodic report for (year, quarter) is filed; quarter 0 is the annual report."""
+    _, _, _, month, day = next(r for r in PERIODIC_REPORTS if r[0] == quarter)
+    return date(year + 1 if quarter == 0 else year, month, day)
+
+def _moving_average(close, window):
+    sums = np.cumsum(np.insert(close, 0, 0.0))
+    ma = np.full(len(close), np.nan)
+    ma[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return ma
+
+def _nullable(values):
+    return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+class SyntheticCompany:
+    """
+    One company of the synthetic universe. Everything it generates comes from
+    its own random stream (seed, index), so a company's data does not depend
+    on the size of the universe it is generated in.
+    """
+    def __init__(self, index, seed):
+        self.index = index
+        self.seed = seed
+        self.rng = np.random.default_rng([seed, index])
+        self.ticker = f"{TICKER_BASE + index:06d}"
+        self.sector = list(SECTORS)[self.rng.integers(len(SECTORS))]
+        suffixes, self.growth, self.volatility, self.margin, self.rnd_ratio, divisions = SECTORS[self.sector]
+        self.name = "".join(self.rng.choice(NAME_SYLLABLES, 2)) + self.rng.choice(suffixes)
+        self.market_type = "KOSPI" if self.rng.random() < 0.4 else "KOSDAQ"
+        self.divisions = list(divisions[:self.rng.integers(2, len(divisions) + 1)])
+        self.division_mix = self.rng.dirichlet(np.full(len(self.divisions), 4.0))
+        self.division_margin = self.margin + self.rng.normal(0, 0.04, len(self.divisions))
+        self.shares = int(self.rng.lognormal(np.log(3e7), 1.0))
+        self.revenue = float(self.rng.lognormal(np.log(5e11), 1.4)) # annual KRW at the start of the history
+        self.founded = int(self.rng.integers(1950, 2005))
+        self.listed = max(self.founded + int(self.rng.integers(3, 30)), 1976)
+        self.major_holder = self.rng.choice(HOLDER_SURNAMES) + self.rng.choice(HOLDER_GIVEN)
+
+    def rcept_no(self, day, kind):
+        """DART-style 14-digit receipt number, unique per (company, day, kind 0-9)."""
+        return f"{day:%Y%m%d}{self.index:05d}{kind}"
+
+    def company_row(self, close):
+        est_dt = f"{self.founded}{self.rng.integers(1, 13):02d}{self.rng.integers(1, 29):02d}"
+        summary = (f"{self.name} is a {self.market_type} listed company in the {self.sector} sector. "
+                   f"Established on {est_dt}. (synthetic)")
+        return (self.ticker, self.name, self.sector, self.market_type, est_dt, f"{self.listed}0102",
+                int(close * self.shares), self.shares, summary, datetime.now())
+
+    def valuation(self, revenue):
+        """Market cap for an annual revenue: earnings at the sector margin times a random PER."""
+        return revenue * max(self.margin, 0.03) * 0.75 * self.rng.lognormal(np.log(11), 0.35)
+
+    def bars(self, days, start_cap, end_cap):
+        """
+        market_daily rows: a random walk with occasional jumps, bridged from
+        start_cap to end_cap so prices follow the fundamentals, plus moving averages.
+        """
+        n = len(days)
+        sigma = self.volatility / np.sqrt(252)
+        returns = self.rng.normal(0, sigma, n)
+        returns += self.rng.normal(0, 0.08, n) * (self.rng.random(n) < 0.004)
+        walk = np.cumsum(returns)
+        log_start, log_end = np.log(start_cap / self.shares), np.log(end_cap / self.shares)
+        walk += np.linspace(0, 1, n) * (log_end - log_start - walk[-1])
+        close = np.maximum(np.round(np.exp(log_start + walk)), 10.0)
+        gap = np.exp(self.rng.normal(0, sigma / 3, n))
+        open_ = np.round(np.concatenate(([close[0]], close[:-1])) * gap)
+        high = np.maximum(open_, close) * (1 + np.abs(self.rng.normal(0, sigma / 2, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(self.rng.normal(0, sigma / 2, n)))
+        volume = (self.rng.lognormal(np.log(2e9), 0.6, n) / close).astype(np.int64)
+        ma5, ma20, ma60 = (_nullable(_moving_average(close, w)) for w in (5, 20, 60))
+        rows = list(zip(
+            [self.ticker] * n, days.astype(str).tolist(), close.tolist(), open_.tolist(),
+            np.round(high).tolist(), np.round(low).tolist(), volume.tolist(), ma5, ma20, ma60
+        ))
+        return rows, float(close[-1])
+
+    def financials(self, years, today):
+        """
+        financials rows per year: standalone Q1-Q3, Q4 derived (annual minus
+        nine months, is_derived) and the annual row, with TTM columns. Only
+        periods whose report would have been filed by `today` are included.
+        """
+        rows, quarters = [], [] # quarters: standalone (revenue, op_profit, net_income) in period order
+        revenue = self.revenue
+        self.annual_revenue = [revenue]
+        for year in years:
+            revenue *= np.exp(self.rng.normal(self.growth, 0.12))
+            self.annual_revenue.append(revenue)
+            cycle = np.sin(year / 2.0 + self.index) * 0.03
+            assets = revenue * self.rng.uniform(0.9, 1.6)
+            liabilities = assets * self.rng.uniform(0.25, 0.65)
+            annual = {"revenue": 0, "op_profit": 0, "net_income": 0, "ocf": 0, "rnd_expenses": 0}
+            for quarter in (1, 2, 3, 4):
+                if filing_date(year, 0 if quarter == 4 else quarter) > today:
+                    break
+                q_revenue = int(revenue * SEASONALITY[quarter - 1] * self.rng.normal(1, 0.04))
+                q_op = int(q_revenue * (self.margin + cycle + self.rng.normal(0, 0.02)))
+                q_net = int(q_op * self.rng.uniform(0.6, 0.9))
+                q_ocf = int(q_net * self.rng.uniform(0.8, 1.6))
+                q_rnd = int(q_revenue * self.rnd_ratio * self.rng.uniform(0.9, 1.1))
+                q_assets = int(assets * (1 + 0.01 * quarter))
+                q_liabilities = int(liabilities * (1 + 0.01 * quarter))
+                for key, value in zip(annual, (q_revenue, q_op, q_net, q_ocf, q_rnd)):
+                    annual[key] += value
+                quarters.append((q_revenue, q_op, q_net))
+                ttm = [sum(q[k] for q in quarters[-4:]) if len(quarters) >= 4 else None for k in range(3)]
+                rows.append(self._financial_row(
+                    year, quarter, q_revenue, q_op, q_net, q_ocf, q_rnd, q_assets, q_liabilities, ttm, quarter == 4
+                ))
+                if quarter == 4:
+                    rows.append(self._financial_row(
+                        year, 0, annual["revenue"], annual["op_profit"], annual["net_income"], annual["ocf"],
+                        annual["rnd_expenses"], q_assets, q_liabilities,
+                        [annual["revenue"], annual["op_profit"], annual["net_income"]], False,
+                        dps=round(max(annual["net_income"], 0) * 0.25 / self.shares)
+                    ))
+        return rows
+
+    def _financial_row(self, year, quarter, revenue, op_profit, net_income, ocf, rnd, assets, liabilities, ttm, derived, dps=None):
+        equity = assets - liabilities
+        return {
+            "ticker": self.ticker, "year": year, "quarter": quarter,
+            "revenue": revenue, "op_profit": op_profit, "net_income": net_income,
+            "assets": assets, "liabilities": liabilities, "equity": equity,
+            "current_assets": int(assets * 0.42), "current_liabilities": int(liabilities * 0.55),
+            "ocf": ocf, "eps": round(net_income / self.shares, 1), "bps": round(equity / self.shares, 1), "dps": dps,
+            "rnd_expenses": rnd, "revenue_ttm": ttm[0], "op_profit_ttm": ttm[1], "net_income_ttm": ttm[2],
+            "is_estimated": False, "is_derived": derived,
+        }
+
+    def shareholders(self, today):
+        """(shareholder_filings rows, shareholders rows): a few filings per holder, the latest one current."""
+        holders = [(self.major_holder, "최대주주", self.rng.uniform(15, 40))]
+        for k in range(self.rng.integers(1, 4)):
+            holders.append((self.major_holder[0] + self.rng.choice(HOLDER_GIVEN), "특수관계인", self.rng.uniform(0.5, 6)))
+        if self.rng.random() < 0.6:
+            holders.append(("국민연금공단", "주요주주", self.rng.uniform(5, 11)))
+        filings, current = [], []
+        for h, (holder, rel_type, ratio) in enumerate(holders):
+            day = today - timedelta(days=int(self.rng.integers(400, 4000)))
+            previous = None
+            for _ in range(self.rng.integers(1, 4)):
+                change = 0.0 if previous is None else float(self.rng.normal(0, 0.8))
+                ratio = max(round(ratio + change, 2), 0.01)
+                count = int(self.shares * ratio / 100)
+                rcept_no = self.rcept_no(day, 1 + h)
+                filings.append((rcept_no, holder, self.ticker, day.isoformat(), "일반",
+                                count, None if previous is None else count - previous[0],
+                                ratio, None if previous is None else round(ratio - previous[1], 2), "장내매수(+)"))
+                previous = (count, ratio, rcept_no, day)
+                day += timedelta(days=int(self.rng.integers(60, 500)))
+                if day > today:
+                    break
+            count, ratio, rcept_no, day = previous
+            current.append((self.ticker, holder, rel_type, count, ratio, rcept_no, day.isoformat()))
+        return filings, current
+
+    def overview(self, year, quarter):
+        """Business overview paragraphs; most sentences persist across periods, some change every period."""
+        period_rng = np.random.default_rng([self.seed, self.index, year, quarter])
+        demand = period_rng.choice(["견조한", "회복세인", "둔화된", "정체된", "급증한"])
+        lines = [
+            f"1. 사업의 개요 당사는 {self.founded}년 설립된 {self.sector} 기업으로 {', '.join(self.divisions)} 부문을 영위하고 있습니다.",
+            f"당사의 주요 사업은 {self.divisions[0]} 부문이며, 전체 매출의 약 {self.division_mix[0] * 100:.0f}%를 차지합니다.",
+            f"가. 산업의 특성 {self.sector}은 경기 변동과 전방 산업의 투자 사이클에 영향을 받는 산업입니다.",
+            f"{year}년 {quarter or 4}분기 현재 주요 고객사의 수요는 {demand} 흐름을 보이고 있습니다.",
+            "나. 경쟁 요소 당사는 원가 경쟁력과 품질, 고객 대응력을 핵심 경쟁 요소로 보고 있습니다.",
+        ]
+        for d, division in enumerate(self.divisions):
+            lines.append(f"다. {division} 부문 {division} 부문은 {period_rng.choice(['신제품 출시', '생산능력 확대', '원가 절감', '해외 판로 개척'])}에 주력하고 있습니다.")
+            if period_rng.random() < 0.5:
+                lines.append(f"{division} 부문의 {year}년 투자 계획은 약 {period_rng.integers(50, 5000):,}억원 규모입니다.")
+        lines.append(f"라. 연구개발 당사는 매출액의 약 {self.rnd_ratio * 100:.1f}%를 연구개발에 투자하고 있습니다.")
+        if period_rng.random() < 0.3:
+            lines.append(f"마. 신규 사업 당사는 {period_rng.choice(['인공지능', '친환경', '헬스케어', '모빌리티'])} 분야 신규 사업을 검토 중입니다.")
+        return lines
+
+    def report_document(self, report_nm, year, quarter, financials):
+        """DART-like document body: company overview, business section with segment and R&D tables, financial summary."""
+        row = financials[(year, quarter)]
+        revenue_m, op_m, rnd_m = row["revenue"] / 1e6, row["op_profit"] / 1e6, row["rnd_expenses"] / 1e6
+        mix = self.division_mix * np.exp(self.rng.normal(0, 0.05, len(self.divisions)))
+        mix /= mix.sum()
+        seg_revenue = [int(revenue_m * m) for m in mix]
+        seg_op = [int(r * (mg + self.rng.normal(0, 0.01))) for r, mg in zip(seg_revenue, self.division_margin)]
+
+        def amount(value):
+            return f"{value:,}" if value >= 0 else f"△{-value:,}"
+
+        segment_rows = []
+        for division, rev, op in zip(self.divisions, seg_revenue, seg_op):
+            segment_rows.append(
+                f'<TR><TD ROWSPAN="2">{division}</TD><TD>매출</TD><TE>{amount(rev)}</TE><TE>{rev / max(sum(seg_revenue), 1) * 100:.1f}%</TE></TR>'
+                f'<TR><TD>영업이익</TD><TE>{amount(op)}</TE><TE>{op / max(abs(sum(seg_op)), 1) * 100:.1f}%</TE></TR>'
+            )
+        paragraphs = "".join(f"<P>{line}</P>" for line in self.overview(year, quarter))
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<DOCUMENT>
+<DOCUMENT-NAME ACODE="11011">{report_nm}</DOCUMENT-NAME>
+<COMPANY-NAME AREGCIK="{self.ticker}">{self.name}</COMPANY-NAME>
+<BODY>
+<SECTION-1><TITLE ATOC="Y">I. 회사의 개요</TITLE>
+<P>회사의 명칭은 주식회사 {self.name}이며, {self.listed}년 유가증권시장에 상장되었습니다.</P>
+</SECTION-1>
+<SECTION-1><TITLE ATOC="Y">II. 사업의 내용</TITLE>
+<SECTION-2><TITLE ATOC="Y">1. 사업의 개요</TITLE>
+{paragraphs}
+</SECTION-2>
+<SECTION-2><TITLE ATOC="Y">4. 매출 및 수주상황</TITLE>
+<P>가. 매출실적</P>
+<TABLE><TBODY><TR><TD>(단위 : 백만원)</TD></TR></TBODY></TABLE>
+<TABLE BORDER="1"><THEAD><TR><TH>부문</TH><TH>구분</TH><TH>제{year - self.founded + 1}기</TH><TH>비중</TH></TR></THEAD>
+<TBODY>{''.join(segment_rows)}
+<TR><TD COLSPAN="2">합계</TD><TE>{amount(sum(seg_revenue))}</TE><TE>100.0%</TE></TR></TBODY></TABLE>
+</SECTION-2>
+<SECTION-2><TITLE ATOC="Y">6. 주요계약 및 연구개발활동</TITLE>
+<P>나. 연구개발비용</P>
+<P>(단위 : 백만원)</P>
+<TABLE BORDER="1"><THEAD><TR><TH>과목</TH><TH>{year}년</TH></TR></THEAD>
+<TBODY><TR><TD>연구개발비용 계</TD><TE>{amount(int(rnd_m))}</TE></TR>
+<TR><TD>연구개발비 / 매출액 비율</TD><TE>{rnd_m / max(revenue_m, 1) * 100:.1f}%</TE></TR></TBODY></TABLE>
+</SECTION-2>
+</SECTION-1>
+<SECTION-1><TITLE ATOC="Y">III. 재무에 관한 사항</TITLE>
+<P>(단위 : 백만원)</P>
+<TABLE BORDER="1"><THEAD><TR><TH>구분</TH><TH>{year}년</TH></TR></THEAD>
+<TBODY><TR><TD>매출액</TD><TE>{amount(int(revenue_m))}</TE></TR>
+<TR><TD>영업이익</TD><TE>{amount(int(op_m))}</TE></TR>
+<TR><TD>자산총계</TD><TE>{amount(int(row['assets'] / 1e6))}</TE></TR></TBODY></TABLE>
+</SECTION-1>
+</BODY>
+</DOCUMENT>"""
+
+    def reports(self, report_years, financials, today):
+        """Periodic filings of the given years as (report dict, document) pairs, oldest first."""
+        out = []
+        for year in report_years:
+            for quarter, name, month, _, _ in PERIODIC_REPORTS:
+                filed = filing_date(year, quarter)
+                if filed > today or (year, quarter) not in financials:
+                    continue
+                report_nm = f"{name} ({year}.{month:02d})"
+                report = {"rcept_no": self.rcept_no(filed, 0), "report_nm": report_nm,
+                          "rcept_dt": filed.strftime("%Y%m%d"), "flr_nm": self.name}
+                out.append((report, self.report_document(report_nm, year, quarter, financials)))
+        return sorted(out, key=lambda item: item[0]["rcept_dt"])
+
+class SyntheticDart:
+    """Stands in for OpenDartReader: serves the generated documents by rcept_no."""
+    def __init__(self, documents):
+        self.documents = documents
+
+    def document(self, rcept_no):
+        return self.documents.get(rcept_no)
+
+def synthetic_disclosures(documents):
+    """A DisclosuresCollector whose document fetches are served from `documents`."""
+    from collectors.disclosures import DisclosuresCollector
+
+    class SyntheticDisclosures(DisclosuresCollector):
+        def __init__(self):
+            self.api_key = None
+
+        @property
+        def dart(self):
+            return SyntheticDart(documents)
+
+    return SyntheticDisclosures()
+
+class SyntheticUniverse:
+    """
+    Fills a database with a synthetic market for load and scale tests:
+    companies, `years` of daily bars, quarterly financials, shareholders and,
+    for the last `report_years`, DART-like periodic report bodies. Prices,
+    financials and shareholders are bulk-inserted; the reports go through
+    DisclosuresCollector.save_reports like fetched documents, so report_tables,
+    the segment/R&D extractors, narratives and What's New are exercised too.
+    """
+    def __init__(self, companies=2000, years=20, report_years=3, seed=42, today=None, verbose=False):
+        self.companies = companies
+        self.years = years
+        self.report_years = report_years
+        self.seed = seed
+        self.today = today or date.today()
+        self.verbose = verbose
+        self.counts = {"companies": 0, "market_daily": 0, "financials": 0, "shareholder_filings": 0, "reports": 0}
+
+    def _quiet(self):
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    def write_company(self, conn, company, days, years):
+        financials = company.financials(years, self.today)
+        start_cap, end_cap = (company.valuation(r) for r in (company.annual_revenue[0], company.annual_revenue[-1]))
+        bars, close = company.bars(days, start_cap, end_cap)
+        filings, holders = company.shareholders(self.today)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO companies (ticker, name, sector, market_type, est_dt, listing_dt, market_cap,
+                                              shares_outstanding, desc_summary, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, company.company_row(close))
+        cursor.executemany("""
+            INSERT OR REPLACE INTO market_daily (ticker, date, close, open, high, low, volume, ma5, ma20, ma60)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, bars)
+        if financials:
+            columns = list(financials[0])
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO financials ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+                [tuple(row[c] for c in columns) for row in financials]
+            )
+        cursor.executemany("""
+            INSERT OR REPLACE INTO shareholder_filings (rcept_no, holder_name, ticker, rcept_dt, report_tp, share_count,
+                                                        share_count_change, share_ratio, share_ratio_change, report_resn)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, filings)
+        cursor.executemany("""
+            INSERT OR REPLACE INTO shareholders (ticker, holder_name, rel_type, share_count, share_ratio, rcept_no, as_of)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, holders)
+        for table in ("companies", "market_daily", "financials", "shareholders"):
+            bump_data_version(cursor, table, [company.ticker])
+            forget_fingerprints(cursor, table, [company.ticker])
+        conn.commit()
+        self.counts["companies"] += 1
+        self.counts["market_daily"] += len(bars)
+        self.counts["financials"] += len(financials)
+        self.counts["shareholder_filings"] += len(filings)
+        return {(row["year"], row["quarter"]): row for row in financials}
+
+    def write_reports(self, company, financials):
+        current = self.today.year
+        report_years = range(current - self.report_years + 1, current + 1)
+        reports = company.reports(report_years, financials, self.today)
+        if not reports:
+            return
+        collector = synthetic_disclosures({report["rcept_no"]: document for report, document in reports})
+        with self._quiet():
+            collector.save_reports(company.ticker, [report for report, _ in reports])
+        self.counts["reports"] += len(reports)
+
+    def generate(self):
+        """Writes the universe; returns row counts per table."""
+        if self.companies > MAX_COMPANIES:
+            raise ValueError(f"at most {MAX_COMPANIES} synthetic companies")
+        init_db()
+        start = self.today.replace(year=self.today.year - self.years)
+        days = trading_days(start, self.today)
+        years = range(start.year + 1, self.today.year + 1)
+
+        started = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            for index in range(self.companies):
+                company = SyntheticCompany(index, self.seed)
+                financials = self.write_company(conn, company, days, years)
+                if self.report_years:
+                    self.write_reports(company, financials)
+                if (index + 1) % 100 == 0 or index + 1 == self.companies:
+                    elapsed = time.perf_counter() - started
+                    print(f"{index + 1}/{self.companies} companies ({self.counts['market_daily']:,} bars, "
+                          f"{self.counts['reports']:,} reports) in {elapsed:.1f}s")
+        finally:
+            conn.close()
+        return self.counts
+
+    def derive(self):
+        """Runs the processing paths over the universe: ratios, sector aggregates, rollups, screener table."""
+        from processors.ratios import RatioCalculator
+        from processors.sector_stats import SectorAggregates
+        from processors.rollups import refresh_rollups
+        from processors.screener import refresh_latest_fundamentals
+
+        calculator = RatioCalculator()
+        with self._quiet():
+            for index in range(self.companies):
+                calculator.calculate_ratios(f"{TICKER_BASE + index:06d}")
+        SectorAggregates().rebuild()
+        refresh_rollups()
+        refresh_latest_fundamentals()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the database with a synthetic universe for load and scale testing")
+    parser.add_argument("--companies", type=int, default=2000, help="Number of synthetic companies")
+    parser.add_argument("--years", type=int, default=20, help="Years of daily bars and quarterly financials")
+    parser.add_argument("--report-years", type=int, default=3, help="Years of periodic report bodies to ingest (0: none)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same seed gives the same universe")
+    parser.add_argument("--db", help=f"Database file (default: {utils.DB_FILE})")
+    parser.add_argument("--derive", action="store_true", help="Also compute ratios, sector aggregates, rollups and the screener table")
+    parser.add_argument("--verbose", action="store_true", help="Show the ingest output of every report")
+    args = parser.parse_args()
+
+    if args.companies > MAX_COMPANIES:
+        parser.error(f"--companies must be at most {MAX_COMPANIES}")
+    if args.db:
+        utils.DB_FILE = args.db
+
+    universe = SyntheticUniverse(args.companies, args.years, args.report_years, args.seed, verbose=args.verbose)
+    started = time.perf_counter()
+    counts = universe.generate()
+    if args.derive:
+        universe.derive()
+    if not args.db:
+        # A separate --db file is never published: that would swap the web app's snapshot.
+        from processors.snapshot import publish_snapshot
+        publish_snapshot()
+    print(f"Synthetic universe in {utils.DB_FILE}: " + ", ".join(f"{n:,} {table}" for table, n in counts.items())
+          + f" in {time.perf_counter() - started:.1f}s (tickers {TICKER_BASE:06d}-{TICKER_BASE + args.companies - 1:06d})")
@@ -0,0 +1,249 @@
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Per-statement query statistics for SQLite connections. QUERY_STATS=1 in the
+# environment (or enable()) makes utils.get_db_connection return
+# InstrumentedConnection objects: every statement is timed (execute plus
+# fetches) into a latency histogram keyed by its normalized SQL, statements
+# slower than SLOW_QUERY_MS (default 200) are printed with their
+# EXPLAIN QUERY PLAN, and a summary is printed when the process exits.
+
+BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000] # histogram upper bounds; the last bucket is open
+PROGRESS_STEPS = 1000 # VM instructions between progress-handler calls
+SUMMARY_TOP = 15
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+VALUE_LISTS = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+
+def normalize_sql(sql):
+    """
+    Statement shape used as the histogram key: literals become ?, `IN (?, ?, ...)`
+    and multi-row VALUES lists collapse, whitespace is squeezed.
+    """
+    sql = LITERALS.sub("?", sql)
+    sql = PLACEHOLDER_LISTS.sub("(...)", sql)
+    sql = VALUE_LISTS.sub(r"\1", sql)
+    return " ".join(sql.split())
+
+class StatementStats:
+    __slots__ = ("calls", "total_ms", "max_ms", "buckets", "vm_steps", "slow")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.vm_steps = 0
+        self.slow = 0
+
+    def percentile(self, p):
+        """Upper bound (ms) of the histogram bucket holding the p-th percentile."""
+        rank = p * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + [self.max_ms], self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+class QueryStats:
+    """Process-wide, thread-safe statistics shared by every instrumented connection."""
+    def __init__(self, slow_ms=200):
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.statements = {}
+        self.started = time.perf_counter()
+
+    def _entry(self, key):
+        entry = self.statements.get(key)
+        if entry is None:
+            entry = self.statements[key] = StatementStats()
+        return entry
+
+    def record(self, conn, sql, params, elapsed_ms, many=False):
+        key = normalize_sql(sql)
+        with self.lock:
+            entry = self._entry(key)
+            entry.calls += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.buckets[next((i for i, bound in enumerate(BUCKETS_MS) if elapsed_ms <= bound), len(BUCKETS_MS))] += 1
+            slow = elapsed_ms >= self.slow_ms
+            if slow:
+                entry.slow += 1
+        if slow:
+            self.log_slow(conn, sql, params, elapsed_ms, many)
+
+    def add_steps(self, sql, steps):
+        with self.lock:
+            self._entry(normalize_sql(sql)).vm_steps += steps
+
+    def log_slow(self, conn, sql, params, elapsed_ms, many):
+        print(f"[slow query] {elapsed_ms:.1f} ms: {' '.join(sql.split())[:300]}")
+        if many or not sql.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            return
+        try:
+            # Plain sqlite3 cursor, so the plan lookup is not recorded itself.
+            plan = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+            for row in plan:
+                print(f"    {'  ' * (1 if row[1] else 0)}{row[3]}")
+        except sqlite3.Error as e:
+            print(f"    (no plan: {e})")
+
+    def summary(self, top=SUMMARY_TOP):
+        with self.lock:
+            entries = sorted(self.statements.items(), key=lambda item: item[1].total_ms, reverse=True)
+        if not entries:
+            return "Query stats: no statements recorded."
+        total_calls = sum(e.calls for _, e in entries)
+        total_ms = sum(e.total_ms for _, e in entries)
+        slow = sum(e.slow for _, e in entries)
+        lines = [
+            f"Query stats: {total_calls} statement(s), {len(entries)} distinct, {total_ms / 1000:.2f}s in SQLite "
+            f"over {time.perf_counter() - self.started:.2f}s; {slow} slower than {self.slow_ms} ms",
+            f"{'total ms':>10} {'calls':>7} {'mean':>8} {'p50':>7} {'p95':>7} {'max':>8} {'vm steps':>10}  statement",
+        ]
+        for sql, e in entries[:top]:
+            lines.append(
+                f"{e.total_ms:>10.1f} {e.calls:>7} {e.total_ms / e.calls:>8.2f} {e.percentile(0.5):>7.1f} "
+                f"{e.percentile(0.95):>7.1f} {e.max_ms:>8.1f} {e.vm_steps:>10}  {sql[:120]}"
+            )
+        return "\n".join(lines)
+
+STATS = None
+
+def enable(slow_ms=None):
+    """Turns on instrumentation for connections opened from now on and prints a summary at exit."""
+    global STATS
+    if STATS is None:
+        STATS = QueryStats(slow_ms if slow_ms is not None else float(os.getenv("SLOW_QUERY_MS", "200")))
+        atexit.register(lambda: print(STATS.summary()))
+    return STATS
+
+def enabled():
+    return STATS is not None
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Times each statement from execute() until its rows are exhausted (or the
+    cursor is reused or closed), so lazily fetched SELECTs are measured whole.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = None # [sql, params, elapsed_ms, many]
+
+    def _flush(self):
+        if self._pending:
+            sql, params, elapsed_ms, many = self._pending
+            self._pending = None
+            STATS.record(self.connection, sql, params, elapsed_ms, many)
+
+    def _timed(self, sql, params, many, run):
+        self._flush()
+        self.connection._current = sql
+        started = time.perf_counter()
+        try:
+            run()
+        finally:
+            self._pending = [sql, params, (time.perf_counter() - started) * 1000, many]
+            if self.description is None:
+                self._flush()
+        return self
+
+    def _add(self, started, done):
+        if self._pending:
+            self._pending[2] += (time.perf_counter() - started) * 1000
+            if done:
+                self._flush()
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sql, parameters, False, lambda: super(InstrumentedCursor, self).execute(sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sql, None, True, lambda: super(InstrumentedCursor, self).executemany(sql, seq_of_parameters))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(size if size is not None else self.arraysize)
+        self._add(started, not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(started, True)
+            raise
+        self._add(started, False)
+        return row
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._flush()
+        except Exception:
+            pass
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection whose statements are recorded in STATS. The progress
+    handler attributes VM instructions to the statement running them, and the
+    trace callback records statements run by executescript() and triggers.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._current = None
+        self._in_script = False
+        self.set_progress_handler(self._progress, PROGRESS_STEPS)
+        self.set_trace_callback(self._trace)
+
+    def _progress(self):
+        if self._current:
+            STATS.add_steps(self._current, PROGRESS_STEPS)
+        return 0
+
+    def _trace(self, statement):
+        if self._in_script:
+            self._current = statement
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        self._in_script = True
+        started = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            self._in_script = False
+            STATS.record(self, f"executescript: {' '.join(script.split())[:80]}", None, (time.perf_counter() - started) * 1000, many=True)
+
+if os.getenv("QUERY_STATS", "").lower() in ("1", "true", "yes"):
+    enable()
@@ -23,7 +23,13 @@ run_collector() {
     python collector.py "$1"
 }
 
-# 3. Function to run web server
+# 3. Function to run the persistent collector worker (serves web collection requests)
+run_worker() {
+    echo "Starting Collector Worker..."
+    python worker.py
+}
+
+# 4. Function to run web server
 run_web() {
     echo "Starting Web Application..."
     cd web
@@ -34,9 +40,11 @@ run_web() {
     npm run dev
 }
 
-# 4. Main logic
+# 5. Main logic
 if [ "$1" == "collect" ]; then
     run_collector "$2"
+elif [ "$1" == "worker" ]; then
+    run_worker
 elif [ "$1" == "web" ]; then
     run_web
 else
@@ -46,5 +54,6 @@ else
     echo "   Example: ./run.sh collect 005930"
     echo ""
     echo "2. To start website: ./run.sh web"
+    echo "   (and in another terminal: ./run.sh worker)"
     echo "-------------------------------"
 fi
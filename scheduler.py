@@ -0,0 +1,204 @@
+import argparse
+import math
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from utils import get_db_connection, init_db
+from stages import STAGES, StageContext, StageExecutor
+from processors.snapshot import publish_snapshot
+
+# Estimated cost of refreshing one ticker per stage: (DART API calls, seconds).
+STAGE_COSTS = {
+    "company": (3, 3.0), # corp code + company + major shareholders
+    "financials": (10, 15.0), # 4 annual + 6 quarterly finstate calls
+    "disclosures": (6, 30.0), # list + one document per periodic report
+    "market": (0, 2.0), # FinanceDataReader only
+}
+# Re-run for every refreshed ticker; local and cheap.
+DERIVED_STAGES = ["ratios", "markdown"]
+DERIVED_SECONDS = 0.5
+
+# Periodic report deadlines (month, day, period). Annual reports are due 90 days
+# after the fiscal year end, quarterly and half-year reports 45 days after quarter end.
+FILING_DEADLINES = [(3, 31, "annual"), (5, 15, "1Q"), (8, 14, "half"), (11, 14, "3Q")]
+SEASON_BEFORE = 20 # days before a deadline when most filings arrive
+SEASON_AFTER = 10
+POPULARITY_DAYS = 30
+
+RefreshTask = namedtuple("RefreshTask", ["ticker", "stage", "value", "dart_calls", "seconds", "reason"])
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10].replace(".", "-"), "%Y-%m-%d").date()
+
+def business_days_between(start, end):
+    """Weekdays in (start, end]."""
+    if end <= start:
+        return 0
+    days = (end - start).days
+    weeks, rest = divmod(days, 7)
+    count = weeks * 5
+    for i in range(1, rest + 1):
+        if (start + timedelta(days=weeks * 7 + i)).weekday() < 5:
+            count += 1
+    return count
+
+def filing_season(today):
+    """Returns (deadline, period) when today falls in a filing season, else None."""
+    for year in (today.year - 1, today.year, today.year + 1):
+        for month, day, period in FILING_DEADLINES:
+            deadline = date(year, month, day)
+            if deadline - timedelta(days=SEASON_BEFORE) <= today <= deadline + timedelta(days=SEASON_AFTER):
+                return deadline, period
+    return None
+
+def expected_annual_year(today):
+    """Latest fiscal year whose annual report is past its deadline."""
+    month, day, _ = FILING_DEADLINES[0]
+    return today.year - 1 if today > date(today.year, month, day) else today.year - 2
+
+class RefreshScheduler:
+    """
+    Ranks (ticker, stage) refresh work by data age, request popularity and
+    filing-season deadlines, then runs the most valuable work that fits within
+    a time and DART-quota budget.
+    """
+    def __init__(self, today=None):
+        init_db()
+        self.conn = get_db_connection()
+        self.today = today or date.today()
+        # When the market-wide disclosure poller is current, tracked companies'
+        # filings already arrive through it; per-ticker listing is only for new ones.
+        polled = self.conn.execute(
+            "SELECT value FROM poller_state WHERE name = 'disclosures.complete_through'"
+        ).fetchone()
+        self.disclosures_polled = bool(polled) and _to_date(polled['value']) >= self.today - timedelta(days=2)
+
+    def load_state(self):
+        """One row per company with the freshness of each table and its popularity."""
+        return self.conn.execute(f"""
+            SELECT c.ticker,
+                   -- Unchanged company info is not rewritten, so the last check counts too.
+                   NULLIF(MAX(COALESCE(c.updated_at, ''), COALESCE(sr.run_at, '')), '') AS updated_at,
+                   m.last_date, d.last_rcept_dt, f.last_annual_year,
+                   COALESCE(v.hits, 0) + COALESCE(j.requests, 0) AS popularity
+            FROM companies c
+            LEFT JOIN stage_runs sr ON sr.ticker = c.ticker AND sr.stage = 'company' AND sr.status = 'ok'
+            LEFT JOIN (SELECT ticker, MAX(date) AS last_date FROM market_daily GROUP BY ticker) m ON m.ticker = c.ticker
+            LEFT JOIN (SELECT ticker, MAX(rcept_dt) AS last_rcept_dt FROM disclosures GROUP BY ticker) d ON d.ticker = c.ticker
+            LEFT JOIN (SELECT ticker, MAX(year) AS last_annual_year FROM financials WHERE quarter = 0 AND revenue IS NOT NULL GROUP BY ticker) f ON f.ticker = c.ticker
+            LEFT JOIN (SELECT ticker, SUM(hits) AS hits FROM ticker_requests
+                       WHERE day >= date(?, '-{POPULARITY_DAYS} day') GROUP BY ticker) v ON v.ticker = c.ticker
+            LEFT JOIN (SELECT ticker, SUM(requests) AS requests FROM collection_jobs
+                       WHERE ticker IS NOT NULL AND created_at >= date(?, '-{POPULARITY_DAYS} day') GROUP BY ticker) j ON j.ticker = c.ticker
+        """, (self.today.isoformat(), self.today.isoformat())).fetchall()
+
+    def score(self, row):
+        """Returns the refresh tasks worth doing for one company row."""
+        today = self.today
+        season = filing_season(today)
+        tasks = []
+
+        def add(stage, value, reason):
+            if value > 0:
+                calls, seconds = STAGE_COSTS[stage]
+                tasks.append(RefreshTask(row['ticker'], stage, value, calls, seconds, reason))
+
+        last_date = _to_date(row['last_date'])
+        if last_date is None:
+            add("market", 10, "no market data")
+        else:
+            stale = business_days_between(last_date, today)
+            add("market", min(stale, 20) / 2, f"{stale} trading day(s) behind")
+
+        updated_at = _to_date(row['updated_at'])
+        age = (today - updated_at).days if updated_at else None
+        if age is None:
+            add("company", 3, "never refreshed")
+        elif age >= 7:
+            add("company", min(age / 30, 3), f"company info {age} days old")
+
+        last_rcept = _to_date(row['last_rcept_dt'])
+        if last_rcept is None:
+            add("disclosures", 10, "no disclosures")
+        elif not self.disclosures_polled:
+            days = (today - last_rcept).days
+            value = min(days / 90, 2)
+            reason = f"last filing {days} days ago"
+            if season and last_rcept < season[0] - timedelta(days=SEASON_BEFORE):
+                value += 6
+                reason += f", {season[1]} filing season (deadline {season[0]})"
+            add("disclosures", value, reason)
+
+        expected = expected_annual_year(today)
+        if row['last_annual_year'] is None or row['last_annual_year'] < expected:
+            boost = 2 if season and season[1] == "annual" else 1
+            add("financials", 8 * boost, f"missing FY{expected} financials")
+
+        popularity = 1 + math.log1p(row['popularity'])
+        return [task._replace(value=round(task.value * popularity, 3)) for task in tasks]
+
+    def plan(self, time_budget, dart_quota, limit=None):
+        """
+        Orders all tasks by value per second and keeps those that fit the budgets.
+        Returns the selected tasks in dispatch order.
+        """
+        tasks = [task for row in self.load_state() for task in self.score(row)]
+        tasks.sort(key=lambda t: t.value / max(t.seconds, 1), reverse=True)
+
+        selected, touched = [], set()
+        seconds_left, calls_left = time_budget, dart_quota
+        for task in tasks:
+            cost = task.seconds + (DERIVED_SECONDS if task.ticker not in touched else 0)
+            if cost > seconds_left or task.dart_calls > calls_left:
+                continue
+            selected.append(task)
+            touched.add(task.ticker)
+            seconds_left -= cost
+            calls_left -= task.dart_calls
+            if limit and len(selected) >= limit:
+                break
+        return selected
+
+    def run(self, time_budget, dart_quota, limit=None, dry_run=False):
+        tasks = self.plan(time_budget, dart_quota, limit)
+        print(f"Planned {len(tasks)} refresh task(s) within {time_budget:.0f}s / {dart_quota} DART calls.")
+        for task in tasks:
+            print(f"  {task.ticker} {task.stage:<12} value={task.value:<7} ({task.reason})")
+        if dry_run or not tasks:
+            return tasks
+
+        ctx = StageContext()
+        started = time.perf_counter()
+        calls_used = 0
+        done, touched = [], []
+        for task in tasks:
+            if time.perf_counter() - started > time_budget:
+                print("Time budget exhausted; remaining tasks deferred to the next run.")
+                break
+            StageExecutor(ctx, task.ticker).run([STAGES[task.stage]])
+            calls_used += task.dart_calls
+            done.append(task)
+            if task.ticker not in touched:
+                touched.append(task.ticker)
+
+        for ticker in touched:
+            StageExecutor(ctx, ticker).run([STAGES[name] for name in DERIVED_STAGES])
+        publish_snapshot()
+
+        print(f"Ran {len(done)} task(s) for {len(touched)} ticker(s) in {time.perf_counter() - started:.1f}s "
+              f"(~{calls_used} DART calls).")
+        return done
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the most valuable stale data within a budget")
+    parser.add_argument("--time-budget", type=float, default=3600, help="Seconds this run may spend")
+    parser.add_argument("--dart-quota", type=int, default=10000, help="DART API calls this run may spend")
+    parser.add_argument("--limit", type=int, help="Max number of tasks")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan without running it")
+    args = parser.parse_args()
+
+    RefreshScheduler().run(args.time_budget, args.dart_quota, limit=args.limit, dry_run=args.dry_run)
@@ -17,7 +17,7 @@ create table if not exists financials (
   id integer primary key autoincrement,
   ticker varchar(10) references companies(ticker) not null,
   year int not null,
-  quarter int not null, -- 0: Yearly, 1-4: Quarterly
+  quarter int not null, -- 0: Yearly, 1-4: Quarterly (standalone three-month figures)
   revenue bigint,
   op_profit bigint,
   net_income bigint,
@@ -37,7 +37,11 @@ create table if not exists financials (
   per float, -- Price Earnings Ratio
   pbr float, -- Price Book-value Ratio
   rnd_expenses bigint, -- Research & Development Expenses
+  revenue_ttm bigint, -- Trailing twelve months (rolling sum of standalone quarters; annual rows: the annual figure)
+  op_profit_ttm bigint,
+  net_income_ttm bigint,
   is_estimated boolean default false,
+  is_derived boolean default false, -- Q4 derived as annual minus the nine-month cumulative figure
   created_at datetime default current_timestamp,
   unique(ticker, year, quarter)
 );
@@ -79,6 +83,8 @@ create table if not exists company_segments (
   division varchar(100) not null, -- e.g., 'DS', 'DX'
   revenue varchar(50), -- Storing as string for flexibility with units like '33.1T' or raw numbers
   op_profit varchar(50),
+  revenue_krw bigint, -- The figures above parsed to KRW at ingest, for sorting and aggregation in SQL
+  op_profit_krw bigint,
   insight text,
   created_at datetime default current_timestamp,
   unique(ticker, period, division)
@@ -104,9 +110,30 @@ create table if not exists shareholders (
   rel_type varchar(50), -- Relation (e.g., 본인, 특수관계인)
   share_count bigint,
   share_ratio float, -- Percentage
+  rcept_no varchar(20), -- Filing the current stake comes from (latest per holder)
+  as_of date, -- Date of that filing
   created_at datetime default current_timestamp,
   unique(ticker, holder_name)
 );
+create index if not exists idx_shareholders_top on shareholders(ticker, share_ratio desc);
+
+-- 7b. Shareholder Filings Table (NEW)
+-- Every major-shareholder filing, ingested once per rcept_no; the stake history per holder.
+create table if not exists shareholder_filings (
+  rcept_no varchar(20) not null,
+  holder_name varchar(100) not null,
+  ticker varchar(10) not null,
+  rcept_dt date,
+  report_tp varchar(50),
+  share_count bigint,
+  share_count_change bigint,
+  share_ratio float,
+  share_ratio_change float,
+  report_resn text,
+  created_at datetime default current_timestamp,
+  primary key(rcept_no, holder_name)
+);
+create index if not exists idx_shareholder_filings_holder on shareholder_filings(ticker, holder_name, rcept_no);
 
 -- Indexing for Performance
 create index if not exists idx_financials_ticker on financials(ticker);
@@ -123,3 +150,258 @@ create table if not exists feedbacks (
   contact varchar(100),
   created_at datetime default current_timestamp
 );
+
+-- 9. Data Versions Table (NEW)
+-- Bumped by every upsert into a ticker's tables; the per-ticker stamp is SUM(version).
+create table if not exists data_versions (
+  ticker varchar(10) not null,
+  table_name varchar(50) not null,
+  version int not null default 0,
+  updated_at datetime default current_timestamp,
+  primary key(ticker, table_name)
+);
+
+-- 10. Artifact Cache Table (NEW)
+create table if not exists artifact_cache (
+  ticker varchar(10) not null,
+  artifact varchar(50) not null, -- e.g., 'Overview.md', 'web:chart'
+  data_version int not null, -- data_versions stamp the content was rendered from
+  etag varchar(64) not null,
+  content blob not null,
+  created_at datetime default current_timestamp,
+  primary key(ticker, artifact)
+);
+
+-- 11. Collection Jobs Table (NEW)
+-- Durable queue consumed by worker.py. At most one queued job per query:
+-- concurrent requests for the same ticker are merged by bumping `requests`.
+create table if not exists collection_jobs (
+  id integer primary key autoincrement,
+  query varchar(100) not null, -- Ticker or company name as requested
+  ticker varchar(10), -- Resolved ticker, filled in by the worker
+  status varchar(20) not null default 'queued', -- 'queued', 'running', 'done', 'failed', 'merged'
+  requests int not null default 1, -- Number of merged requests
+  worker_id varchar(100),
+  error text,
+  merged_into int, -- Set when a job recovered after a crash was folded into a newer queued one
+  created_at datetime default current_timestamp,
+  started_at datetime,
+  finished_at datetime
+);
+create unique index if not exists idx_collection_jobs_queued on collection_jobs(query) where status = 'queued';
+create index if not exists idx_collection_jobs_status on collection_jobs(status, id);
+
+-- 12. Ticker Requests Table (NEW)
+-- Daily lookup counts from the web app; scheduler.py uses them as a popularity signal.
+create table if not exists ticker_requests (
+  ticker varchar(10) not null,
+  day date not null,
+  hits int not null default 0,
+  primary key(ticker, day)
+);
+
+-- 13. Stage Runs Table (NEW)
+-- Last run of each collection stage per ticker; the DAG executor skips a stage whose inputs are unchanged.
+create table if not exists stage_runs (
+  ticker varchar(10) not null,
+  stage varchar(50) not null,
+  status varchar(20) not null, -- 'ok', 'error'
+  input_version int, -- Sum of data_versions for the stage's input tables after its last successful run
+  duration real, -- Seconds spent in the stage
+  finished_offset real, -- Seconds from the start of the run until the stage finished
+  critical_path int default 0, -- 1 if the stage was on the run's longest dependency chain
+  run_at datetime default current_timestamp,
+  primary key(ticker, stage)
+);
+
+-- 14. Row Fingerprints Table (NEW)
+-- Hash of the last rows upsert_data wrote per (table, ticker, period, column set); unchanged groups are not rewritten.
+create table if not exists row_fingerprints (
+  table_name varchar(50) not null,
+  ticker varchar(10) not null,
+  period varchar(50) not null, -- Non-ticker key columns; dates are bucketed by month (YYYY-MM)
+  columns text not null, -- Comma-separated columns covered by the fingerprint
+  fingerprint varchar(40) not null,
+  updated_at datetime default current_timestamp,
+  primary key(table_name, ticker, period, columns)
+);
+
+-- 15. Sector Members Table (NEW)
+-- Each company's latest-period ratios, filed under its sector; source of sector_stats.
+create table if not exists sector_members (
+  ticker varchar(10) not null,
+  metric varchar(20) not null, -- 'per', 'pbr', 'roe', 'debt_ratio'
+  sector varchar(100) not null,
+  value float not null,
+  year int, -- Period the value was taken from
+  quarter int,
+  updated_at datetime default current_timestamp,
+  primary key(ticker, metric)
+);
+create index if not exists idx_sector_members_sector on sector_members(sector, metric, value);
+
+-- 16. Sector Stats Table (NEW)
+-- Distribution of each metric within a sector; refreshed per sector when a member changes.
+create table if not exists sector_stats (
+  sector varchar(100) not null,
+  metric varchar(20) not null,
+  n int not null, -- Number of companies with a meaningful value
+  p25 float,
+  median float,
+  p75 float,
+  min float,
+  max float,
+  updated_at datetime default current_timestamp,
+  primary key(sector, metric)
+);
+
+-- 17. Latest Fundamentals Table (NEW)
+-- One row per company: latest-period fundamentals and valuation at the latest close, for the screener.
+-- Maintained by RatioCalculator and MarketCollector (processors/screener.py); NULL where a ratio is undefined.
+create table if not exists latest_fundamentals (
+  ticker varchar(10) primary key,
+  name varchar(100),
+  sector varchar(100),
+  market_type varchar(10),
+  year int, -- Period of the fundamentals
+  quarter int,
+  revenue_ttm bigint,
+  op_profit_ttm bigint,
+  net_income_ttm bigint,
+  eps float, -- TTM
+  bps float,
+  roe float,
+  roa float,
+  debt_ratio float,
+  current_ratio float,
+  close float, -- Latest close
+  price_date date,
+  market_cap bigint, -- close * shares_outstanding
+  per float, -- close / TTM EPS
+  pbr float, -- close / BPS
+  updated_at datetime default current_timestamp
+);
+create index if not exists idx_latest_fundamentals_sector on latest_fundamentals(sector);
+create index if not exists idx_latest_fundamentals_per on latest_fundamentals(per);
+create index if not exists idx_latest_fundamentals_pbr on latest_fundamentals(pbr);
+create index if not exists idx_latest_fundamentals_roe on latest_fundamentals(roe);
+create index if not exists idx_latest_fundamentals_debt_ratio on latest_fundamentals(debt_ratio);
+create index if not exists idx_latest_fundamentals_market_cap on latest_fundamentals(market_cap);
+
+-- 18. Market Weekly / Monthly Tables (NEW)
+-- OHLCV rollups of market_daily (weeks start on Monday, months on the 1st); refreshed on ingest from the first changed period.
+create table if not exists market_weekly (
+  ticker varchar(10) references companies(ticker) not null,
+  period_start date not null,
+  open float,
+  high float,
+  low float,
+  close float,
+  volume bigint,
+  days int, -- Trading days in the period
+  last_date date, -- Last trading day included
+  primary key(ticker, period_start)
+);
+
+create table if not exists market_monthly (
+  ticker varchar(10) references companies(ticker) not null,
+  period_start date not null,
+  open float,
+  high float,
+  low float,
+  close float,
+  volume bigint,
+  days int,
+  last_date date,
+  primary key(ticker, period_start)
+);
+
+-- 19. Corp Codes Table (NEW)
+-- Local copy of DART's corp-code registry; maps market-wide filings to tickers.
+create table if not exists corp_codes (
+  corp_code varchar(8) primary key,
+  ticker varchar(10), -- stock_code; NULL for unlisted companies
+  corp_name varchar(100),
+  modify_date varchar(8),
+  updated_at datetime default current_timestamp
+);
+create index if not exists idx_corp_codes_ticker on corp_codes(ticker);
+
+-- 20. Document Queue Table (NEW)
+-- Filings of tracked companies whose documents still have to be fetched and extracted.
+create table if not exists document_queue (
+  rcept_no varchar(20) primary key,
+  ticker varchar(10) not null,
+  report_nm varchar(255) not null,
+  rcept_dt varchar(8) not null, -- YYYYMMDD as listed by DART
+  flr_nm varchar(100),
+  status varchar(20) not null default 'queued', -- 'queued', 'done', 'failed'
+  attempts int not null default 0,
+  error text,
+  queued_at datetime default current_timestamp,
+  fetched_at datetime
+);
+create index if not exists idx_document_queue_status on document_queue(status, rcept_dt);
+
+-- 21. Poller State Table (NEW)
+-- Progress of background pollers, e.g. the last day whose market-wide filing list is complete.
+create table if not exists poller_state (
+  name varchar(50) primary key,
+  value text,
+  updated_at datetime default current_timestamp
+);
+
+-- 22. Section Tokens Table (NEW)
+-- Token counts of context-pack sections, keyed by a hash of their text, so unchanged text is never re-tokenized.
+create table if not exists section_tokens (
+  content_hash varchar(40) not null, -- sha1 of the section text
+  tokenizer varchar(50) not null, -- e.g. 'tiktoken:cl100k_base', 'heuristic'
+  tokens int not null,
+  created_at datetime default current_timestamp,
+  primary key(content_hash, tokenizer)
+);
+
+-- 23. Report Tables (NEW)
+-- Every table of each processed filing in long format (one row per cell), so new
+-- extractions are SQL queries over stored tables instead of document re-fetches.
+create table if not exists report_tables (
+  rcept_no varchar(20) not null,
+  ticker varchar(10) not null,
+  table_index int not null, -- position of the table in the document
+  section varchar(255), -- heading path, e.g. 'II. 사업의 내용 > 4. 매출 및 수주상황'
+  caption varchar(255), -- text just before the table
+  unit varchar(20), -- e.g. '백만원', '%', '명'
+  row_index int not null,
+  col_index int not null,
+  row_label varchar(255), -- label cells of the row, ' / '-joined
+  col_label varchar(255), -- header cells of the column, ' / '-joined
+  value_text text, -- cell as filed
+  value numeric, -- parsed number; money units normalized to KRW
+  primary key(rcept_no, table_index, row_index, col_index)
+) without rowid;
+create index if not exists idx_report_tables_ticker on report_tables(ticker);
+create index if not exists idx_report_tables_section on report_tables(section);
+
+-- 24. Backfill Runs & Run Ledger (NEW)
+-- A resumable universe backfill: the run's parameters, and per (run, ticker, stage)
+-- its status plus a cursor of paginated progress (e.g. disclosure years done).
+create table if not exists backfill_runs (
+  run_id varchar(50) primary key,
+  params text not null, -- JSON: tickers, years, stages
+  status varchar(20) not null default 'running', -- 'running', 'done'
+  created_at datetime default current_timestamp,
+  finished_at datetime
+);
+
+create table if not exists run_ledger (
+  run_id varchar(50) not null references backfill_runs(run_id),
+  ticker varchar(10) not null,
+  stage varchar(50) not null,
+  status varchar(20) not null default 'pending', -- 'pending', 'running', 'done', 'error'
+  cursor text, -- JSON progress within the stage
+  attempts int not null default 0,
+  error text,
+  updated_at datetime default current_timestamp,
+  primary key(run_id, ticker, stage)
+);
+create index if not exists idx_run_ledger_status on run_ledger(run_id, status);
@@ -0,0 +1,224 @@
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from utils import get_db_connection, init_db
+
+class Stage:
+    def __init__(self, name, description, run, target=None, inputs=(), outputs=()):
+        self.name = name
+        self.description = description
+        self.run = run
+        self.target = target # "module:Class" of the collector the stage uses, if any
+        self.inputs = tuple(inputs) # tables the stage reads
+        self.outputs = tuple(outputs) # tables the stage writes
+
+# Ordered registry of collection stages. Registering a stage imports nothing:
+# each stage pulls in its collector module (and pandas, FinanceDataReader, bs4,
+# ...) only when it actually runs.
+# A stage depends on every earlier stage that writes one of the tables it reads,
+# so the registry forms a DAG and independent stages can run concurrently.
+STAGES = {}
+
+def stage(name, description, target=None, inputs=(), outputs=()):
+    def register(run):
+        STAGES[name] = Stage(name, description, run, target, inputs, outputs)
+        return run
+    return register
+
+def dependencies(selected):
+    """Maps each selected stage name to the selected stages it must wait for."""
+    deps = {}
+    for i, s in enumerate(selected):
+        deps[s.name] = [u.name for u in selected[:i] if set(u.outputs) & set(s.inputs)]
+    return deps
+
+class StageContext:
+    """
+    Holds the collector instances shared by stages. A long-lived worker keeps
+    one context so clients and caches stay warm between jobs.
+    """
+    def __init__(self, instances=None):
+        self.instances = {} if instances is None else instances
+        self.lock = threading.RLock() # stages run on executor threads
+
+    def instance(self, target):
+        """Returns the shared instance for "module:Class", importing the module on first use."""
+        with self.lock:
+            if target not in self.instances:
+                module_name, class_name = target.split(":")
+                module = importlib.import_module(module_name)
+                self.instances[target] = getattr(module, class_name)()
+            return self.instances[target]
+
+    def collector(self, stage_name):
+        """Returns the shared collector registered for a stage."""
+        return self.instance(STAGES[stage_name].target)
+
+    def warm_up(self, stages=None):
+        """Imports and builds every stage's collector up front (for long-lived workers)."""
+        for s in STAGES.values():
+            if s.target and (stages is None or s.name in stages):
+                self.instance(s.target)
+
+@stage("company", "Collecting Company Info & Shareholders", target="collectors.companies:CompanyCollector",
+       outputs=["companies", "shareholders"])
+def run_company(ctx, ticker):
+    company_collector = ctx.collector("company")
+    company_collector.collect_and_save(ticker)
+    company_collector.fetch_shareholders(ticker)
+
+@stage("financials", "Collecting Financials", target="collectors.financials:FinancialsCollector",
+       outputs=["financials"])
+def run_financials(ctx, ticker):
+    # Four annual reports, plus the quarterlies of the last two years for Q4 and TTM.
+    ctx.collector("financials").backfill(ticker, years=4, quarterly_years=2)
+
+# Disclosures also fill financials.rnd_expenses, which ratios never reads; only
+# markdown shows it, and markdown already waits for this stage.
+@stage("disclosures", "Collecting Disclosures", target="collectors.disclosures:DisclosuresCollector",
+       outputs=["disclosures", "company_segments", "company_narratives"])
+def run_disclosures(ctx, ticker):
+    ctx.collector("disclosures").fetch_disclosures(ticker, days=1095)
+
+@stage("market", "Collecting Market Data", target="collectors.market:MarketCollector",
+       outputs=["market_daily"])
+def run_market(ctx, ticker):
+    ctx.collector("market").fetch_daily_data(ticker, days=365)
+
+@stage("ratios", "Calculating Financial Ratios", target="processors.ratios:RatioCalculator",
+       inputs=["companies", "financials", "market_daily"], outputs=["financials", "sector_members", "sector_stats"])
+def run_ratios(ctx, ticker):
+    ctx.collector("ratios").calculate_ratios(ticker)
+    # Only this ticker's sectors are recomputed. Their members' sector_stats version
+    # is bumped, so peers' cached Overviews and markdown stages see the change.
+    ctx.instance("processors.sector_stats:SectorAggregates").update_ticker(ticker)
+
+@stage("markdown", "Generating Markdown Reports",
+       inputs=["companies", "financials", "company_segments", "company_narratives", "disclosures",
+               "sector_members", "sector_stats"])
+def run_markdown(ctx, ticker):
+    from processors.markdown_generator import MarkdownGenerator
+    MarkdownGenerator(ticker).save_files()
+
+def resolve_ticker(ctx, name_or_ticker):
+    """Resolves a name to a ticker; 6-digit codes are returned without touching any collector."""
+    if name_or_ticker.isdigit() and len(name_or_ticker) == 6:
+        return name_or_ticker
+    return ctx.collector("company").resolve_ticker(name_or_ticker)
+
+class StageExecutor:
+    """
+    Runs a ticker's stages as a DAG: a stage starts as soon as the stages it
+    depends on have finished, so independent collectors overlap and the run
+    takes as long as its longest chain. A stage with declared inputs is skipped
+    when none of those tables changed since its last successful run.
+    """
+    def __init__(self, ctx, ticker):
+        init_db()
+        self.ctx = ctx
+        self.ticker = ticker
+
+    def input_version(self, s):
+        """Stamp of the stage's input tables for this ticker; grows on every write to any of them."""
+        placeholders = ', '.join(['?'] * len(s.inputs))
+        conn = get_db_connection()
+        try:
+            return conn.execute(
+                f"SELECT COALESCE(SUM(version), 0) FROM data_versions WHERE ticker = ? AND table_name IN ({placeholders})",
+                (self.ticker, *s.inputs)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def last_version(self, s):
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT input_version FROM stage_runs WHERE ticker = ? AND stage = ? AND status = 'ok'",
+                (self.ticker, s.name)
+            ).fetchone()
+            return row['input_version'] if row else None
+        finally:
+            conn.close()
+
+    def run_stage(self, s, force, clock_start):
+        """Runs one stage; returns (status, input_version, start offset, end offset)."""
+        begin = time.perf_counter() - clock_start
+        if s.inputs and not force and self.input_version(s) == self.last_version(s):
+            print(f"\n[{s.name}] Inputs unchanged since last run, skipping.")
+            return "skipped", None, begin, begin
+
+        print(f"\n[{s.name}] {s.description}...")
+        try:
+            s.run(self.ctx, self.ticker)
+            status = "ok"
+        except Exception as e:
+            print(f"Error in stage '{s.name}': {e}")
+            status = "error"
+        # Read after the run: a stage that writes one of its own inputs (ratios
+        # updates financials) must not look changed on the next run because of it.
+        version = self.input_version(s) if s.inputs and status == "ok" else None
+        return status, version, begin, time.perf_counter() - clock_start
+
+    def run(self, selected, force=False):
+        """Runs the selected stages; returns {stage: (status, input_version, start, end)}."""
+        deps = dependencies(selected)
+        pending = {s.name: s for s in selected}
+        results = {}
+        clock_start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max(len(selected), 1)) as pool:
+            running = {}
+            while pending or running:
+                for name in [n for n in pending if all(d in results for d in deps[n])]:
+                    running[pool.submit(self.run_stage, pending.pop(name), force, clock_start)] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+
+        path = self.critical_path(deps, results)
+        self.record(results, path)
+        wall = time.perf_counter() - clock_start
+        chain = " -> ".join(f"{name} {results[name][3] - results[name][2]:.1f}s" for name in path)
+        print(f"\nCritical path: {chain} (wall time {wall:.1f}s)")
+        return results
+
+    @staticmethod
+    def critical_path(deps, results):
+        """Walks back from the last stage to finish through the dependency each stage waited on longest."""
+        if not results:
+            return []
+        name = max(results, key=lambda n: results[n][3])
+        path = [name]
+        while deps[name]:
+            name = max(deps[name], key=lambda n: results[n][3])
+            path.append(name)
+        return path[::-1]
+
+    def record(self, results, path):
+        conn = get_db_connection()
+        try:
+            for name, (status, version, begin, end) in results.items():
+                on_path = 1 if name in path else 0
+                if status == "skipped":
+                    # Keep the input version of the last real run.
+                    conn.execute("""
+                        UPDATE stage_runs SET duration = 0, finished_offset = ?, critical_path = ?, run_at = CURRENT_TIMESTAMP
+                        WHERE ticker = ? AND stage = ?
+                    """, (round(end, 3), on_path, self.ticker, name))
+                    continue
+                conn.execute("""
+                    INSERT INTO stage_runs (ticker, stage, status, input_version, duration, finished_offset, critical_path)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(ticker, stage) DO UPDATE SET
+                    status = excluded.status,
+                    input_version = excluded.input_version,
+                    duration = excluded.duration,
+                    finished_offset = excluded.finished_offset,
+                    critical_path = excluded.critical_path,
+                    run_at = CURRENT_TIMESTAMP
+                """, (self.ticker, name, status, version, round(end - begin, 3), round(end, 3), on_path))
+            conn.commit()
+        finally:
+            conn.close()
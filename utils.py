@@ -1,23 +1,93 @@
 import sqlite3
 import os
+import hashlib
+import json
+import threading
 from datetime import datetime, date
+import query_stats
 
 DB_FILE = "data.db"
 
+_db_initialized = False
+_env_loaded = False
+_dart_readers = {}
+_dart_lock = threading.Lock()
+
+def load_env():
+    """Loads .env into the environment, once per process."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def get_dart_reader(api_key):
+    """
+    Returns the process-wide OpenDartReader for api_key, creating it on first use.
+    Construction downloads DART's corp-code table, so collectors share one reader
+    instead of each building their own.
+    """
+    with _dart_lock:
+        if api_key not in _dart_readers:
+            import OpenDartReader
+            _dart_readers[api_key] = OpenDartReader(api_key)
+        return _dart_readers[api_key]
+
 def get_db_connection():
-    """Establishes a connection to the local SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
+    """
+    Establishes a connection to the local SQLite database.
+    With QUERY_STATS=1 the connection records per-statement latencies (see query_stats.py).
+    """
+    # Stages run concurrently, so writers wait for each other instead of failing.
+    factory = query_stats.InstrumentedConnection if query_stats.enabled() else sqlite3.Connection
+    conn = sqlite3.connect(DB_FILE, timeout=30, factory=factory)
     conn.row_factory = sqlite3.Row
     return conn
 
+# Columns added to existing tables after their first release: {table: {column: type}}.
+ADDED_COLUMNS = {
+    "financials": {
+        "per": "REAL",
+        "pbr": "REAL",
+        "revenue_ttm": "INTEGER",
+        "op_profit_ttm": "INTEGER",
+        "net_income_ttm": "INTEGER",
+        "is_derived": "BOOLEAN DEFAULT 0",
+    },
+    "shareholders": {
+        "rcept_no": "TEXT",
+        "as_of": "DATE",
+    },
+    "company_segments": {
+        "revenue_krw": "INTEGER",
+        "op_profit_krw": "INTEGER",
+    },
+}
+
+def ensure_columns(cursor, table, columns):
+    """Adds any of `columns` ({name: type}) missing from `table`. Returns the added names."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {info[1] for info in cursor.fetchall()}
+    added = [name for name in columns if name not in existing]
+    for name in added:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+    return added
+
 def init_db():
     """Initializes the database with tables if they don't exist."""
-    if os.path.exists(DB_FILE) and os.path.getsize(DB_FILE) > 0:
+    global _db_initialized
+    if _db_initialized:
         return
 
-    print("Initializing local SQLite database...")
+    # Every statement is idempotent, so existing databases pick up tables
+    # added after they were first created.
+    is_new = not (os.path.exists(DB_FILE) and os.path.getsize(DB_FILE) > 0)
+    if is_new:
+        print("Initializing local SQLite database...")
     conn = get_db_connection()
     cursor = conn.cursor()
+    # WAL lets readers (the web app, reports) proceed while a stage is writing.
+    cursor.execute("PRAGMA journal_mode=WAL")
     
     # SQLite compatible schema
     schema = """
@@ -55,8 +125,14 @@ def init_db():
         roa REAL,
         debt_ratio REAL,
         current_ratio REAL,
+        per REAL,
+        pbr REAL,
         rnd_expenses INTEGER,
+        revenue_ttm INTEGER,
+        op_profit_ttm INTEGER,
+        net_income_ttm INTEGER,
         is_estimated BOOLEAN DEFAULT 0,
+        is_derived BOOLEAN DEFAULT 0,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         UNIQUE(ticker, year, quarter),
         FOREIGN KEY(ticker) REFERENCES companies(ticker)
@@ -98,6 +174,8 @@ def init_db():
         division TEXT NOT NULL,
         revenue TEXT,
         op_profit TEXT,
+        revenue_krw INTEGER,
+        op_profit_krw INTEGER,
         insight TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         UNIQUE(ticker, period, division),
@@ -127,18 +205,346 @@ def init_db():
         UNIQUE(ticker, holder_name),
         FOREIGN KEY(ticker) REFERENCES companies(ticker)
     );
+    CREATE INDEX IF NOT EXISTS idx_shareholders_top ON shareholders(ticker, share_ratio DESC);
+
+    CREATE TABLE IF NOT EXISTS shareholder_filings (
+        rcept_no TEXT NOT NULL,
+        holder_name TEXT NOT NULL,
+        ticker TEXT NOT NULL,
+        rcept_dt DATE,
+        report_tp TEXT,
+        share_count INTEGER,
+        share_count_change INTEGER,
+        share_ratio REAL,
+        share_ratio_change REAL,
+        report_resn TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(rcept_no, holder_name)
+    );
+    CREATE INDEX IF NOT EXISTS idx_shareholder_filings_holder ON shareholder_filings(ticker, holder_name, rcept_no);
+
+    CREATE TABLE IF NOT EXISTS data_versions (
+        ticker TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(ticker, table_name)
+    );
+
+    CREATE TABLE IF NOT EXISTS artifact_cache (
+        ticker TEXT NOT NULL,
+        artifact TEXT NOT NULL,
+        data_version INTEGER NOT NULL,
+        etag TEXT NOT NULL,
+        content BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(ticker, artifact)
+    );
+
+    CREATE TABLE IF NOT EXISTS collection_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query TEXT NOT NULL,
+        ticker TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        requests INTEGER NOT NULL DEFAULT 1,
+        worker_id TEXT,
+        error TEXT,
+        merged_into INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_collection_jobs_queued ON collection_jobs(query) WHERE status = 'queued';
+    CREATE INDEX IF NOT EXISTS idx_collection_jobs_status ON collection_jobs(status, id);
+
+    CREATE TABLE IF NOT EXISTS ticker_requests (
+        ticker TEXT NOT NULL,
+        day DATE NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY(ticker, day)
+    );
+
+    CREATE TABLE IF NOT EXISTS stage_runs (
+        ticker TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        status TEXT NOT NULL,
+        input_version INTEGER,
+        duration REAL,
+        finished_offset REAL,
+        critical_path INTEGER DEFAULT 0,
+        run_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(ticker, stage)
+    );
+
+    CREATE TABLE IF NOT EXISTS row_fingerprints (
+        table_name TEXT NOT NULL,
+        ticker TEXT NOT NULL,
+        period TEXT NOT NULL,
+        columns TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(table_name, ticker, period, columns)
+    );
+
+    CREATE TABLE IF NOT EXISTS sector_members (
+        ticker TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        sector TEXT NOT NULL,
+        value REAL NOT NULL,
+        year INTEGER,
+        quarter INTEGER,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(ticker, metric)
+    );
+    CREATE INDEX IF NOT EXISTS idx_sector_members_sector ON sector_members(sector, metric, value);
+
+    CREATE TABLE IF NOT EXISTS sector_stats (
+        sector TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        p25 REAL,
+        median REAL,
+        p75 REAL,
+        min REAL,
+        max REAL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(sector, metric)
+    );
+
+    CREATE TABLE IF NOT EXISTS latest_fundamentals (
+        ticker TEXT PRIMARY KEY,
+        name TEXT,
+        sector TEXT,
+        market_type TEXT,
+        year INTEGER,
+        quarter INTEGER,
+        revenue_ttm INTEGER,
+        op_profit_ttm INTEGER,
+        net_income_ttm INTEGER,
+        eps REAL,
+        bps REAL,
+        roe REAL,
+        roa REAL,
+        debt_ratio REAL,
+        current_ratio REAL,
+        close REAL,
+        price_date DATE,
+        market_cap INTEGER,
+        per REAL,
+        pbr REAL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_latest_fundamentals_sector ON latest_fundamentals(sector);
+    CREATE INDEX IF NOT EXISTS idx_latest_fundamentals_per ON latest_fundamentals(per);
+    CREATE INDEX IF NOT EXISTS idx_latest_fundamentals_pbr ON latest_fundamentals(pbr);
+    CREATE INDEX IF NOT EXISTS idx_latest_fundamentals_roe ON latest_fundamentals(roe);
+    CREATE INDEX IF NOT EXISTS idx_latest_fundamentals_debt_ratio ON latest_fundamentals(debt_ratio);
+    CREATE INDEX IF NOT EXISTS idx_latest_fundamentals_market_cap ON latest_fundamentals(market_cap);
+
+    CREATE TABLE IF NOT EXISTS market_weekly (
+        ticker TEXT NOT NULL,
+        period_start DATE NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        days INTEGER,
+        last_date DATE,
+        PRIMARY KEY(ticker, period_start)
+    );
+
+    CREATE TABLE IF NOT EXISTS market_monthly (
+        ticker TEXT NOT NULL,
+        period_start DATE NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        days INTEGER,
+        last_date DATE,
+        PRIMARY KEY(ticker, period_start)
+    );
+
+    CREATE TABLE IF NOT EXISTS corp_codes (
+        corp_code TEXT PRIMARY KEY,
+        ticker TEXT,
+        corp_name TEXT,
+        modify_date TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_corp_codes_ticker ON corp_codes(ticker);
+
+    CREATE TABLE IF NOT EXISTS document_queue (
+        rcept_no TEXT PRIMARY KEY,
+        ticker TEXT NOT NULL,
+        report_nm TEXT NOT NULL,
+        rcept_dt TEXT NOT NULL,
+        flr_nm TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fetched_at TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_document_queue_status ON document_queue(status, rcept_dt);
+
+    CREATE TABLE IF NOT EXISTS poller_state (
+        name TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS section_tokens (
+        content_hash TEXT NOT NULL,
+        tokenizer TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(content_hash, tokenizer)
+    );
+
+    CREATE TABLE IF NOT EXISTS report_tables (
+        rcept_no TEXT NOT NULL,
+        ticker TEXT NOT NULL,
+        table_index INTEGER NOT NULL,
+        section TEXT,
+        caption TEXT,
+        unit TEXT,
+        row_index INTEGER NOT NULL,
+        col_index INTEGER NOT NULL,
+        row_label TEXT,
+        col_label TEXT,
+        value_text TEXT,
+        value NUMERIC,
+        PRIMARY KEY(rcept_no, table_index, row_index, col_index)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_report_tables_ticker ON report_tables(ticker);
+    CREATE INDEX IF NOT EXISTS idx_report_tables_section ON report_tables(section);
+
+    CREATE TABLE IF NOT EXISTS backfill_runs (
+        run_id TEXT PRIMARY KEY,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS run_ledger (
+        run_id TEXT NOT NULL,
+        ticker TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        cursor TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(run_id, ticker, stage)
+    );
+    CREATE INDEX IF NOT EXISTS idx_run_ledger_status ON run_ledger(run_id, status);
     """
     cursor.executescript(schema)
+    # CREATE TABLE IF NOT EXISTS leaves older tables alone; add their new columns.
+    for table, columns in ADDED_COLUMNS.items():
+        ensure_columns(cursor, table, columns)
     conn.commit()
     conn.close()
-    print("Database initialized.")
+    _db_initialized = True
+    if is_new:
+        print("Database initialized.")
+
+def bump_data_version(cursor, table, tickers):
+    """
+    Marks the given tickers' data in `table` as changed.
+    Must run inside the same transaction as the write it describes.
+    """
+    cursor.executemany("""
+        INSERT INTO data_versions (ticker, table_name, version) VALUES (?, ?, 1)
+        ON CONFLICT(ticker, table_name) DO UPDATE SET
+        version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    """, [(ticker, table) for ticker in sorted(set(tickers))])
+
+def forget_fingerprints(cursor, table, tickers):
+    """
+    Drops the upsert_data fingerprints of the given tickers' rows in `table`.
+    Every write that bypasses upsert_data (raw INSERT/UPDATE/DELETE) must call it:
+    the stored fingerprints no longer describe the rows, and the next identical
+    upsert would be skipped.
+    """
+    cursor.executemany(
+        "DELETE FROM row_fingerprints WHERE table_name = ? AND ticker = ?",
+        [(table, ticker) for ticker in sorted(set(tickers))]
+    )
 
-def upsert_data(table, data, conflict_columns, update_columns=None):
+def get_data_version(conn, ticker):
+    """Returns the ticker's data-version stamp; it grows on every write to any of its tables."""
+    row = conn.execute(
+        "SELECT COALESCE(SUM(version), 0) FROM data_versions WHERE ticker = ?", (ticker,)
+    ).fetchone()
+    return row[0]
+
+# Bookkeeping columns that change on every write without the data changing.
+FINGERPRINT_EXCLUDE = {"updated_at", "created_at"}
+
+def _plain(value):
+    """Normalizes a value for fingerprinting (numpy scalars, dates)."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _period(row, conflict_columns):
+    """The row group a row belongs to within its ticker; daily rows are grouped by month."""
+    parts = []
+    for col in conflict_columns:
+        if col == "ticker":
+            continue
+        value = _plain(row[col])
+        if isinstance(value, str) and len(value) >= 10 and value[4] == "-" and value[7] == "-":
+            value = value[:7]
+        parts.append(str(value))
+    return "|".join(parts)
+
+def _changed_groups(cursor, table, data, keys, conflict_columns):
+    """
+    Fingerprints the rows by (ticker, period) and compares them with the stored
+    fingerprints. Returns (changed groups as {(ticker, period): rows}, columns, fingerprints).
+    """
+    columns = [k for k in sorted(keys) if k not in FINGERPRINT_EXCLUDE]
+    groups = {}
+    for row in data:
+        groups.setdefault((row["ticker"], _period(row, conflict_columns)), []).append(row)
+
+    fingerprints = {}
+    for key, rows in groups.items():
+        payload = sorted(json.dumps([_plain(row[c]) for c in columns], default=str, ensure_ascii=False) for row in rows)
+        fingerprints[key] = hashlib.sha1("\n".join(payload).encode("utf-8")).hexdigest()
+
+    signature = ",".join(columns)
+    stored = {}
+    for ticker in {ticker for ticker, _ in groups}:
+        cursor.execute(
+            "SELECT period, fingerprint FROM row_fingerprints WHERE table_name = ? AND ticker = ? AND columns = ?",
+            (table, ticker, signature)
+        )
+        stored.update({(ticker, r[0]): r[1] for r in cursor.fetchall()})
+
+    changed = {key: rows for key, rows in groups.items() if stored.get(key) != fingerprints[key]}
+    return changed, signature, fingerprints
+
+def upsert_data(table, data, conflict_columns, update_columns=None, force=False):
     """
     Upserts data into a table using SQLite.
+    Rows are fingerprinted per (ticker, period); groups identical to what was last
+    written are skipped, so unchanged data causes no write and no version bump.
+    Writes that bypass this function clear the fingerprints (forget_fingerprints).
+    force: write every row even if its group is unchanged.
+    Returns the number of rows written.
     """
     if not data:
-        return
+        return 0
 
     # Ensure DB is initialized
     init_db()
@@ -163,12 +569,34 @@ def upsert_data(table, data, conflict_columns, update_columns=None):
         sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
         if conflict_columns:
             sql += f" ON CONFLICT({conflict_str}) DO UPDATE SET {update_set}"
-            
-        values = [tuple(row[k] for k in keys) for row in data]
+
+        fingerprinted = 'ticker' in keys and bool(conflict_columns)
+        rows = data
+        if fingerprinted:
+            changed, signature, fingerprints = _changed_groups(cursor, table, data, keys, conflict_columns)
+            if not force:
+                rows = [row for group in changed.values() for row in group]
+            if not rows:
+                print(f"No changes in {len(data)} rows for {table}, skipped.")
+                return 0
+
+        values = [tuple(row[k] for k in keys) for row in rows]
         
         cursor.executemany(sql, values)
+        if fingerprinted:
+            written = fingerprints if force else changed
+            cursor.executemany("""
+                INSERT INTO row_fingerprints (table_name, ticker, period, columns, fingerprint) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(table_name, ticker, period, columns) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                updated_at = CURRENT_TIMESTAMP
+            """, [(table, ticker, period, signature, fingerprints[(ticker, period)]) for ticker, period in written])
+        if 'ticker' in keys:
+            bump_data_version(cursor, table, [row['ticker'] for row in rows])
         conn.commit()
-        print(f"Successfully upserted {len(data)} rows into {table}.")
+        skipped = len(data) - len(rows)
+        print(f"Successfully upserted {len(rows)} rows into {table}." + (f" ({skipped} unchanged)" if skipped else ""))
+        return len(rows)
         
     except Exception as e:
         print(f"Error upserting data to {table}: {e}")
@@ -1,8 +1,47 @@
 import { NextResponse } from 'next/server'
-import db from '@/lib/db'
+import db, { writeDb } from '@/lib/db'
+import { downsampleCandles, withMovingAverages } from '@/lib/downsample'
 
 export const dynamic = 'force-dynamic'
 
+// Chart range -> SQLite date modifier relative to the latest trading day (null: full history)
+const RANGES: Record<string, string | null> = {
+  '3m': '-3 months', '6m': '-6 months', '1y': '-1 year', '3y': '-3 years',
+  '5y': '-5 years', '10y': '-10 years', 'max': null,
+}
+const MAX_POINTS = 500
+
+// Daily candles up to a year, weekly up to five years, monthly beyond.
+function chartInterval(range: string): 'day' | 'week' | 'month' {
+  if (['3m', '6m', '1y'].includes(range)) return 'day'
+  if (['3y', '5y'].includes(range)) return 'week'
+  return 'month'
+}
+
+const ROLLUP_TABLES: Record<string, string> = { week: 'market_weekly', month: 'market_monthly' }
+
+function hasTable(name: string): boolean {
+  return !!db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?").get(name)
+}
+
+function fetchMarket(ticker: string, range: string, interval: string, maxPoints: number) {
+  const modifier = RANGES[range]
+  const since = (column: string) => modifier ? `AND ${column} >= (SELECT date(MAX(date), ?) FROM market_daily WHERE ticker = ?)` : ''
+  const params = modifier ? [ticker, modifier, ticker] : [ticker]
+  let rows: any[]
+  if (interval === 'day') {
+    rows = db.prepare(`SELECT * FROM market_daily WHERE ticker = ? ${since('date')} ORDER BY date ASC`).all(...params)
+  } else {
+    // Rollups maintained by processors/rollups.py; their MAs are computed over the interval here.
+    const table = ROLLUP_TABLES[interval]
+    rows = withMovingAverages(db.prepare(`
+      SELECT ticker, period_start AS date, open, high, low, close, volume FROM ${table}
+      WHERE ticker = ? ${since('period_start')} ORDER BY period_start ASC
+    `).all(...params))
+  }
+  return { rows: downsampleCandles(rows, maxPoints), sourceRows: rows.length }
+}
+
 export async function GET(request: Request) {
   const { searchParams } = new URL(request.url)
   const query = searchParams.get('query') || searchParams.get('ticker')
@@ -30,22 +69,42 @@ export async function GET(request: Request) {
     
     const ticker = company.ticker; // Use the found company's ticker for subsequent queries
 
-    // 2. Fetch Financials (History - last 4 quarters/years)
-    const financials = db.prepare('SELECT * FROM financials WHERE ticker = ? ORDER BY year DESC, quarter DESC LIMIT 4').all(ticker)
+    // Popularity signal for the refresh scheduler (scheduler.py)
+    try {
+      writeDb.prepare(`
+        INSERT INTO ticker_requests (ticker, day, hits) VALUES (?, date('now'), 1)
+        ON CONFLICT(ticker, day) DO UPDATE SET hits = hits + 1
+      `).run(ticker)
+    } catch (error) {
+      // Table is created by the Python pipeline; lookups work without it.
+    }
+
+    // 2. Fetch Financials (History - last 4 years). Annual rows only: quarterly and
+    // derived-Q4 rows hold three-month figures and would share a year on the chart.
+    const financials = db.prepare('SELECT * FROM financials WHERE ticker = ? AND quarter = 0 ORDER BY year DESC LIMIT 4').all(ticker)
 
-    // 3. Fetch Market Data (History - last 365 days)
-    const market = db.prepare('SELECT * FROM market_daily WHERE ticker = ? ORDER BY date ASC LIMIT 365').all(ticker)
+    // 3. Fetch Market Data (latest `range`, default one year, at most `points` candles)
+    const rangeParam = searchParams.get('range') || '1y'
+    const range = rangeParam in RANGES ? rangeParam : '1y'
+    const requested = searchParams.get('interval')
+    let interval = requested === 'day' || requested === 'week' || requested === 'month' ? requested : chartInterval(range)
+    const maxPoints = Math.min(Math.max(Number(searchParams.get('points')) || MAX_POINTS, 50), 2000)
+    if (interval !== 'day' && !hasTable(ROLLUP_TABLES[interval])) {
+      interval = 'day' // Snapshot predates the rollup tables
+    }
+    const market = fetchMarket(ticker, range, interval, maxPoints)
 
     // 4. Fetch Shareholders (Top 5)
     const shareholders = db.prepare('SELECT * FROM shareholders WHERE ticker = ? ORDER BY share_ratio DESC LIMIT 5').all(ticker)
 
     // 5. Fetch Segments (Latest period)
-    const segments = db.prepare('SELECT * FROM company_segments WHERE ticker = ? ORDER BY period DESC LIMIT 10').all(ticker)
+    const segments = db.prepare('SELECT * FROM company_segments WHERE ticker = ? ORDER BY period DESC, revenue_krw DESC LIMIT 10').all(ticker)
 
     return NextResponse.json({
       company,
       financials: financials || [],
-      market: market || [],
+      market: market.rows,
+      marketMeta: { range, interval, points: market.rows.length, sourceRows: market.sourceRows },
       shareholders: shareholders || [],
       segments: segments || []
     })
@@ -1,53 +1,69 @@
 import { NextResponse } from 'next/server'
-import { exec } from 'child_process'
-import path from 'path'
+import { writeDb as db } from '@/lib/db'
+
+export const dynamic = 'force-dynamic'
+
+// Collection runs in the long-lived Python worker (`python3 worker.py`).
+// This route only queues jobs in `collection_jobs` and reports their status.
+// Job state changes constantly, so it uses data.db rather than the read snapshot.
 
 export async function POST(request: Request) {
   try {
     const body = await request.json()
-    const { ticker } = body
+    const ticker = typeof body.ticker === 'string' ? body.ticker.trim() : ''
 
     if (!ticker) {
       return NextResponse.json({ error: 'Invalid ticker or name' }, { status: 400 })
     }
 
-    // Path to the collector script
-    // Assuming the web app is in /web and collector is in root
-    const projectRoot = path.resolve(process.cwd(), '..')
-    const scriptPath = path.join(projectRoot, 'collector.py')
-    
-    // Command to run python script
-    // Using python3, assuming it's in the path. 
-    // In a real env, might need absolute path to python executable.
-    const command = `python3 "${scriptPath}" ${ticker}`
-    
-    console.log(`Executing command: ${command}`)
-
-    const util = require('util');
-    const execPromise = util.promisify(exec);
-
-    try {
-        const { stdout, stderr } = await execPromise(command, { cwd: projectRoot });
-        console.log(`stdout: ${stdout}`);
-        if (stderr) console.error(`stderr: ${stderr}`);
-
-        // Run generator
-        const generatorPath = path.join(projectRoot, 'processors', 'markdown_generator.py')
-        const genCommand = `python3 "${generatorPath}"`
-        
-        try {
-             await execPromise(genCommand, { cwd: projectRoot });
-        } catch (genError) {
-             console.error(`Generator error: ${genError}`)
-        }
-
-        return NextResponse.json({ success: true, message: 'Collection completed' })
-
-    } catch (error: any) {
-        console.error(`exec error: ${error}`)
-        return NextResponse.json({ error: 'Collection failed', details: error.stderr || error.message }, { status: 500 })
+    // A request for a ticker that is already queued is merged into that job.
+    const job = db.prepare(`
+      INSERT INTO collection_jobs (query) VALUES (?)
+      ON CONFLICT(query) WHERE status = 'queued' DO UPDATE SET requests = requests + 1
+      RETURNING id, status, requests
+    `).get(ticker)
+
+    return NextResponse.json({ success: true, jobId: job.id, status: job.status, requests: job.requests }, { status: 202 })
+
+  } catch (error: any) {
+    console.error('API error:', error)
+    return NextResponse.json({ error: 'Internal Server Error' }, { status: 500 })
+  }
+}
+
+export async function GET(request: Request) {
+  const { searchParams } = new URL(request.url)
+  const id = Number(searchParams.get('id'))
+
+  if (!id) {
+    return NextResponse.json({ error: 'Job id is required' }, { status: 400 })
+  }
+
+  try {
+    let job = db.prepare('SELECT * FROM collection_jobs WHERE id = ?').get(id)
+    // Jobs recovered after a worker crash may have been folded into a newer one.
+    while (job && job.merged_into) {
+      job = db.prepare('SELECT * FROM collection_jobs WHERE id = ?').get(job.merged_into)
     }
+    if (!job) {
+      return NextResponse.json({ error: 'Job not found' }, { status: 404 })
+    }
+
+    const position = job.status === 'queued'
+      ? db.prepare("SELECT COUNT(*) AS n FROM collection_jobs WHERE status = 'queued' AND id < ?").get(job.id).n
+      : 0
 
+    return NextResponse.json({
+      jobId: job.id,
+      status: job.status,
+      ticker: job.ticker,
+      requests: job.requests,
+      position,
+      error: job.error,
+      createdAt: job.created_at,
+      startedAt: job.started_at,
+      finishedAt: job.finished_at
+    })
   } catch (error: any) {
     console.error('API error:', error)
     return NextResponse.json({ error: 'Internal Server Error' }, { status: 500 })
@@ -1,148 +1,371 @@
-
 import { NextResponse } from 'next/server'
-import db from '@/lib/db'
+import db, { writeDb } from '@/lib/db'
+import crypto from 'crypto'
 import fs from 'fs'
 import path from 'path'
+import { Readable } from 'stream'
 
 export const dynamic = 'force-dynamic'
 
+// Rendered artifacts are cached in `artifact_cache`, keyed by the ticker's
+// data-version stamp. Every Python upsert bumps `data_versions`, so an entry
+// stays valid until the underlying data changes. Content and its version come
+// from the read snapshot; the cache itself lives in data.db.
+function dataVersion(ticker: string): number {
+  const row = db.prepare('SELECT COALESCE(SUM(version), 0) AS v FROM data_versions WHERE ticker = ?').get(ticker)
+  return row.v
+}
+
+function cachedArtifact(ticker: string, artifact: string, render: () => string | null) {
+  let version: number | null = null
+  try {
+    version = dataVersion(ticker)
+    const row = writeDb.prepare('SELECT data_version, etag, content FROM artifact_cache WHERE ticker = ? AND artifact = ?').get(ticker, artifact)
+    if (row && row.data_version === version) {
+      return { content: Buffer.from(row.content), etag: row.etag as string }
+    }
+  } catch (error) {
+    // Cache tables are created by the Python pipeline; render uncached until they exist.
+    version = null
+  }
+
+  const rendered = render()
+  if (rendered === null) return null
+
+  const content = Buffer.from(rendered, 'utf-8')
+  const etag = `"${version ?? 0}-${crypto.createHash('sha1').update(content).digest('hex').slice(0, 16)}"`
+  if (version !== null) {
+    writeDb.prepare(`
+      INSERT INTO artifact_cache (ticker, artifact, data_version, etag, content)
+      VALUES (?, ?, ?, ?, ?)
+      ON CONFLICT(ticker, artifact) DO UPDATE SET
+      data_version=excluded.data_version, etag=excluded.etag, content=excluded.content, created_at=CURRENT_TIMESTAMP
+    `).run(ticker, artifact, version, etag, content)
+  }
+  return { content, etag }
+}
+
+function notModified(request: Request, etag: string) {
+  const ifNoneMatch = request.headers.get('if-none-match')
+  return !!ifNoneMatch && ifNoneMatch.split(',').map(tag => tag.trim()).some(tag => tag === etag || tag === '*')
+}
+
+function artifactResponse(request: Request, artifact: { content: Buffer, etag: string }, contentType: string, filename: string) {
+  if (notModified(request, artifact.etag)) {
+    return new NextResponse(null, { status: 304, headers: { 'ETag': artifact.etag } })
+  }
+  return new NextResponse(new Uint8Array(artifact.content), {
+    headers: {
+      'Content-Type': contentType,
+      'Content-Disposition': `attachment; filename="${encodeURIComponent(filename)}"`,
+      'ETag': artifact.etag,
+      'Cache-Control': 'no-cache'
+    }
+  })
+}
+
+function renderOverview(ticker: string, company: any): string {
+  // Same rows and order as the Python Overview (markdown_generator.py): latest periods first,
+  // derived Q4 ahead of the annual row of the same year.
+  const financials = db.prepare('SELECT * FROM financials WHERE ticker = ? ORDER BY year DESC, quarter DESC LIMIT 4').all(ticker)
+  const disclosures = db.prepare('SELECT * FROM disclosures WHERE ticker = ? ORDER BY rcept_dt DESC LIMIT 10').all(ticker)
+
+  // Generate Markdown
+  let md = `# ${company.name} (${ticker}) - Corporate Overview\n\n`
+  md += `**Sector:** ${company.sector || '-'} | **Market:** ${company.market_type || '-'}\n`
+  md += `**Summary:** ${company.desc_summary || '-'}\n\n`
+  
+  md += "## 1. Financial Highlights (Recent)\n"
+  if (financials && financials.length > 0) {
+    md += "| Year | Quarter | Revenue | Op Profit | Net Income | Assets | Liabilities | Equity |\n"
+    md += "|---|---|---|---|---|---|---|---|\n"
+    financials.forEach((f: any) => {
+      const q = f.quarter === 0 ? 'Yearly' : `${f.quarter}Q`
+      const amount = (v: number | null) => v != null ? v.toLocaleString() : '-'
+      md += `| ${f.year} | ${q} | ${amount(f.revenue)} | ${amount(f.op_profit)} | ${amount(f.net_income)} | ${amount(f.assets)} | ${amount(f.liabilities)} | ${amount(f.equity)} |\n`
+    })
+  } else {
+    md += "No financial data available.\n"
+  }
+
+  // Segment Data
+  const segments = db.prepare('SELECT * FROM company_segments WHERE ticker = ? ORDER BY period DESC, division ASC').all(ticker)
+  
+  md += "\n\n## 2. Segment Performance (Recent)\n"
+  if (segments && segments.length > 0) {
+    md += "| Period | Division | Revenue (KRW) | Op. Profit (KRW) |\n"
+    md += "| :--- | :--- | :--- | :--- |\n"
+    segments.forEach((s: any) => {
+       // KRW figures parsed at ingest; the filed text when they could not be parsed
+       const rev = s.revenue_krw != null ? s.revenue_krw.toLocaleString() : (s.revenue || '-')
+       const op = s.op_profit_krw != null ? s.op_profit_krw.toLocaleString() : (s.op_profit || '-')
+       md += `| ${s.period} | ${s.division} | ${rev} | ${op} |\n`
+    })
+  } else {
+    md += "No segment data available.\n"
+  }
+
+  md += "\n\n## 3. Recent Disclosures\n"
+  if (disclosures && disclosures.length > 0) {
+    disclosures.forEach((d: any) => {
+      md += `- **${d.rcept_dt}** [${d.report_nm}](${d.url})\n`
+    })
+  } else {
+    md += "No disclosures found.\n"
+  }
+
+  // Sector aggregates are maintained by processors/sector_stats.py; two index lookups.
+  let sector: any[] = []
+  try {
+    sector = db.prepare(`
+      SELECT m.metric, m.value, m.year, m.quarter, s.n, s.p25, s.median, s.p75
+      FROM sector_members m JOIN sector_stats s ON s.sector = m.sector AND s.metric = m.metric
+      WHERE m.ticker = ?
+    `).all(ticker)
+  } catch (error) {
+    // Snapshot predates the sector tables
+  }
+  const metricLabels: Record<string, string> = { per: 'PER', pbr: 'PBR', roe: 'ROE (%)', debt_ratio: 'Debt Ratio (%)' }
+  sector.sort((a, b) => Object.keys(metricLabels).indexOf(a.metric) - Object.keys(metricLabels).indexOf(b.metric))
+
+  md += "\n\n## 4. Valuation vs. Sector\n"
+  if (sector.length > 0) {
+    const period = sector[0].quarter ? `${sector[0].year} Q${sector[0].quarter}` : `${sector[0].year} Annual`
+    md += `Latest period (${period}) against ${company.sector} peers (latest period of each company).\n\n`
+    md += "| Metric | Company | Sector Median | Q1 | Q3 | Peers | Position |\n"
+    md += "|---|---|---|---|---|---|---|\n"
+    sector.forEach((s: any) => {
+      const position = s.n < 4 ? '-'
+        : s.value < s.p25 ? 'Bottom quartile'
+        : s.value < s.median ? 'Below median'
+        : s.value <= s.p75 ? 'Above median' : 'Top quartile'
+      md += `| ${metricLabels[s.metric]} | ${s.value.toFixed(2)} | ${s.median.toFixed(2)} | ${s.p25.toFixed(2)} | ${s.p75.toFixed(2)} | ${s.n} | ${position} |\n`
+    })
+  } else {
+    md += "No sector data available.\n"
+  }
+
+  return md
+}
+
+function renderNarratives(ticker: string, company: any): string {
+  const narratives = db.prepare('SELECT * FROM company_narratives WHERE ticker = ? ORDER BY period DESC, section_type').all(ticker)
+  const disclosures = db.prepare('SELECT * FROM disclosures WHERE ticker = ? ORDER BY rcept_dt DESC LIMIT 10').all(ticker)
+
+  let md = `# ${company.name} (${ticker}) - Deep Dive Narratives\n\n`
+  
+  if (narratives && narratives.length > 0) {
+      // Group by period (taking the latest one for now)
+      const latestPeriod = narratives[0].period
+      md += `## 분기보고서 (${latestPeriod}) Key Takeaways\n`
+      
+      const currentNarratives = narratives.filter((n: any) => n.period === latestPeriod)
+      const sectionOrder = ["Key Takeaways", "What's New", "Business Overview", "MD&A", "News"]
+      
+      sectionOrder.forEach(section => {
+          const sectionData = currentNarratives.filter((n: any) => n.section_type === section)
+          if (sectionData.length > 0) {
+              let displayHeader = section
+              if (section === "What's New") displayHeader = "What's New Since the Previous Report"
+              else if (section === "Business Overview") displayHeader = "1. Business Overview (사업의 내용)"
+              else if (section === "MD&A") displayHeader = "2. MD&A (이사의 경영진단 및 분석의견)"
+              else if (section === "News") displayHeader = "3. News & Conference Call Summary"
+              
+              if (section !== "Key Takeaways") {
+                  md += `## ${displayHeader}\n`
+              }
+              
+              sectionData.forEach((row: any) => {
+                  if (row.title) md += `### ${row.title}\n`
+                  md += `${row.content}\n\n`
+              })
+          }
+      })
+  } else {
+      md += "> [!NOTE]\n> Detailed text analysis will be available in the next update.\n\n"
+  }
+  
+  // Append links
+  if (disclosures && disclosures.length > 0) {
+      md += "---\n## Reference Links\n"
+      disclosures.forEach((d: any) => {
+          md += `- **${d.rcept_dt}** [${d.report_nm}](${d.url})\n`
+      })
+  }
+
+  return md
+}
+
+const CHART_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'ma5', 'ma20', 'ma60']
+const STREAM_CHUNK_ROWS = 5000
+
+type ChartFilter = { tickers: string[], sector: string | null, start: string | null, end: string | null }
+
+// Yields market_daily rows as CSV in keyset-paginated chunks (the header first), so
+// memory stays flat for long histories and multi-ticker/sector bundles. Each chunk is
+// its own short query; an open iterator would hold the shared connection busy between
+// pulls. The statement is prepared per chunk through `db`: a snapshot published
+// mid-stream closes the old connection, and the keyset cursor continues on the new one.
+function* chartChunks(filter: ChartFilter): Generator<string> {
+  const bundle = filter.sector !== null || filter.tickers.length !== 1
+  const columns = (bundle ? ['ticker'] : []).concat(CHART_COLUMNS)
+
+  const where: string[] = ['(m.ticker, m.date) > (?, ?)']
+  const params: any[] = []
+  let join = ''
+  if (filter.tickers.length > 0) {
+    where.push('m.ticker IN (SELECT value FROM json_each(?))')
+    params.push(JSON.stringify(filter.tickers))
+  }
+  if (filter.sector !== null) {
+    join = 'JOIN companies c ON c.ticker = m.ticker'
+    where.push('c.sector = ?')
+    params.push(filter.sector)
+  }
+  if (filter.start) { where.push('m.date >= ?'); params.push(filter.start) }
+  if (filter.end) { where.push('m.date <= ?'); params.push(filter.end) }
+
+  const sql = `
+    SELECT m.ticker AS ticker, ${CHART_COLUMNS.map(c => `m.${c} AS ${c}`).join(', ')}
+    FROM market_daily m ${join}
+    WHERE ${where.join(' AND ')}
+    ORDER BY m.ticker, m.date
+    LIMIT ${STREAM_CHUNK_ROWS}
+  `
+
+  yield columns.join(',') + '\n'
+  let last = ['', '']
+  while (true) {
+    const rows = db.prepare(sql).all(last[0], last[1], ...params)
+    if (rows.length === 0) return
+    yield rows.map((m: any) => columns.map(c => m[c] ?? '').join(',')).join('\n') + '\n'
+    const tail: any = rows[rows.length - 1]
+    last = [tail.ticker, tail.date]
+  }
+}
+
+function streamChartCsv(filter: ChartFilter, compress: boolean) {
+  const chunks = chartChunks(filter)
+  const encoder = new TextEncoder()
+  const csv = new ReadableStream<Uint8Array>({
+    pull(controller) {
+      const next = chunks.next()
+      if (next.done) controller.close()
+      else controller.enqueue(encoder.encode(next.value))
+    }
+  })
+  return compress ? csv.pipeThrough(new CompressionStream('gzip')) : csv
+}
+
+// Full single-ticker charts are cached as files next to data.db rather than as
+// artifact_cache blobs, so neither writing nor serving one holds the history in memory.
+// The artifact_cache entry records the file's path, data version and etag.
+const ARTIFACT_DIR = path.join(process.cwd(), '..', 'artifacts')
+
+function cachedChartFile(ticker: string): { path: string, etag: string } | null {
+  let version: number | null = null
+  const file = path.join(ARTIFACT_DIR, `${ticker}_Chart.csv`)
+  try {
+    version = dataVersion(ticker)
+    const row = writeDb.prepare('SELECT data_version, etag, content FROM artifact_cache WHERE ticker = ? AND artifact = ?').get(ticker, 'web:chart')
+    if (row && row.data_version === version && Buffer.from(row.content).toString('utf-8') === file && fs.existsSync(file)) {
+      return { path: file, etag: row.etag as string }
+    }
+  } catch (error) {
+    // Cache tables are created by the Python pipeline; the file is still written, just not recorded.
+    version = null
+  }
+
+  fs.mkdirSync(ARTIFACT_DIR, { recursive: true })
+  const partial = `${file}.tmp${process.pid}`
+  const hash = crypto.createHash('sha1')
+  let bytes = 0
+  const fd = fs.openSync(partial, 'w')
+  try {
+    for (const chunk of chartChunks({ tickers: [ticker], sector: null, start: null, end: null })) {
+      const data = Buffer.from(chunk, 'utf-8')
+      fs.writeSync(fd, data)
+      hash.update(data)
+      bytes += data.length
+    }
+  } finally {
+    fs.closeSync(fd)
+  }
+  if (bytes === CHART_COLUMNS.join(',').length + 1) { // header only
+    fs.unlinkSync(partial)
+    return null
+  }
+  fs.renameSync(partial, file)
+
+  const etag = `"${version ?? 0}-${hash.digest('hex').slice(0, 16)}"`
+  if (version !== null) {
+    writeDb.prepare(`
+      INSERT INTO artifact_cache (ticker, artifact, data_version, etag, content)
+      VALUES (?, ?, ?, ?, ?)
+      ON CONFLICT(ticker, artifact) DO UPDATE SET
+      data_version=excluded.data_version, etag=excluded.etag, content=excluded.content, created_at=CURRENT_TIMESTAMP
+    `).run(ticker, 'web:chart', version, etag, Buffer.from(file, 'utf-8'))
+  }
+  return { path: file, etag }
+}
+
 export async function GET(request: Request) {
   const { searchParams } = new URL(request.url)
-  const ticker = searchParams.get('ticker')
+  const ticker = searchParams.get('ticker') || ''
   const type = searchParams.get('type') // 'overview', 'narratives', 'chart'
 
-  if (!ticker || !type) {
+  const isBundle = type === 'chart' && (searchParams.get('tickers') || searchParams.get('sector'))
+  if ((!ticker && !isBundle) || !type) {
     return NextResponse.json({ error: 'Ticker and type are required' }, { status: 400 })
   }
 
   try {
     if (type === 'overview') {
-      // Fetch Data
       const company = db.prepare('SELECT * FROM companies WHERE ticker = ?').get(ticker)
-      const financials = db.prepare('SELECT * FROM financials WHERE ticker = ? ORDER BY year DESC LIMIT 4').all(ticker)
-      const disclosures = db.prepare('SELECT * FROM disclosures WHERE ticker = ? ORDER BY rcept_dt DESC LIMIT 10').all(ticker)
-
       if (!company) return NextResponse.json({ error: 'Data not found' }, { status: 404 })
 
-      // Generate Markdown
-      let md = `# ${company.name} (${ticker}) - Corporate Overview\n\n`
-      md += `**Sector:** ${company.sector || '-'} | **Market:** ${company.market_type || '-'}\n`
-      md += `**Summary:** ${company.desc_summary || '-'}\n\n`
-      
-      md += "## 1. Financial Highlights (Recent)\n"
-      if (financials && financials.length > 0) {
-        md += "| Year | Quarter | Revenue | Op Profit | Net Income | Assets | Liabilities | Equity |\n"
-        md += "|---|---|---|---|---|---|---|---|\n"
-        financials.forEach((f: any) => {
-          const q = f.quarter === 0 ? 'Yearly' : `${f.quarter}Q`
-          md += `| ${f.year} | ${q} | ${f.revenue?.toLocaleString()} | ${f.op_profit?.toLocaleString()} | ${f.net_income?.toLocaleString()} | ${f.assets?.toLocaleString()} | ${f.liabilities?.toLocaleString()} | ${f.equity?.toLocaleString()} |\n`
-        })
-      } else {
-        md += "No financial data available.\n"
-      }
-
-      // Segment Data
-      const segments = db.prepare('SELECT * FROM company_segments WHERE ticker = ? ORDER BY period DESC, division ASC').all(ticker)
-      
-      md += "\n\n## 2. Segment Performance (Recent)\n"
-      if (segments && segments.length > 0) {
-        md += "| Period | Division | Revenue (KRW) | Op. Profit (KRW) |\n"
-        md += "| :--- | :--- | :--- | :--- |\n"
-        segments.forEach((s: any) => {
-           // Simple formatting
-           const rev = s.revenue ? Number(s.revenue).toLocaleString() : '-'
-           const op = s.op_profit ? Number(s.op_profit).toLocaleString() : '-'
-           md += `| ${s.period} | ${s.division} | ${rev} | ${op} |\n`
-        })
-      } else {
-        md += "No segment data available.\n"
-      }
-
-      md += "\n\n## 3. Recent Disclosures\n"
-      if (disclosures && disclosures.length > 0) {
-        disclosures.forEach((d: any) => {
-          md += `- **${d.rcept_dt}** [${d.report_nm}](${d.url})\n`
-        })
-      } else {
-        md += "No disclosures found.\n"
-      }
-
-      return new NextResponse(md, {
-        headers: {
-          'Content-Type': 'text/markdown; charset=utf-8',
-          'Content-Disposition': `attachment; filename="${encodeURIComponent(company.name)}_Overview.md"`
-        }
-      })
+      const artifact = cachedArtifact(ticker, 'web:overview', () => renderOverview(ticker, company))!
+      return artifactResponse(request, artifact, 'text/markdown; charset=utf-8', `${company.name}_Overview.md`)
 
     } else if (type === 'narratives') {
       const company = db.prepare('SELECT name FROM companies WHERE ticker = ?').get(ticker)
-      const narratives = db.prepare('SELECT * FROM company_narratives WHERE ticker = ? ORDER BY period DESC, section_type').all(ticker)
-      const disclosures = db.prepare('SELECT * FROM disclosures WHERE ticker = ? ORDER BY rcept_dt DESC LIMIT 10').all(ticker)
-      
       if (!company) return NextResponse.json({ error: 'Data not found' }, { status: 404 })
 
-      let md = `# ${company.name} (${ticker}) - Deep Dive Narratives\n\n`
-      
-      if (narratives && narratives.length > 0) {
-          // Group by period (taking the latest one for now)
-          const latestPeriod = narratives[0].period
-          md += `## 분기보고서 (${latestPeriod}) Key Takeaways\n`
-          
-          const currentNarratives = narratives.filter((n: any) => n.period === latestPeriod)
-          const sectionOrder = ["Key Takeaways", "Business Overview", "MD&A", "News"]
-          
-          sectionOrder.forEach(section => {
-              const sectionData = currentNarratives.filter((n: any) => n.section_type === section)
-              if (sectionData.length > 0) {
-                  let displayHeader = section
-                  if (section === "Business Overview") displayHeader = "1. Business Overview (사업의 내용)"
-                  else if (section === "MD&A") displayHeader = "2. MD&A (이사의 경영진단 및 분석의견)"
-                  else if (section === "News") displayHeader = "3. News & Conference Call Summary"
-                  
-                  if (section !== "Key Takeaways") {
-                      md += `## ${displayHeader}\n`
-                  }
-                  
-                  sectionData.forEach((row: any) => {
-                      if (row.title) md += `### ${row.title}\n`
-                      md += `${row.content}\n\n`
-                  })
-              }
-          })
-      } else {
-          md += "> [!NOTE]\n> Detailed text analysis will be available in the next update.\n\n"
-      }
-      
-      // Append links
-      if (disclosures && disclosures.length > 0) {
-          md += "---\n## Reference Links\n"
-          disclosures.forEach((d: any) => {
-              md += `- **${d.rcept_dt}** [${d.report_nm}](${d.url})\n`
-          })
-      }
-
-      return new NextResponse(md, {
-        headers: {
-          'Content-Type': 'text/markdown; charset=utf-8',
-          'Content-Disposition': `attachment; filename="${encodeURIComponent(company.name)}_Narratives.md"`
-        }
-      })
+      const artifact = cachedArtifact(ticker, 'web:narratives', () => renderNarratives(ticker, company))!
+      return artifactResponse(request, artifact, 'text/markdown; charset=utf-8', `${company.name}_Narratives.md`)
 
     } else if (type === 'chart') {
-      // Generate CSV
-      const market = db.prepare('SELECT date, open, high, low, close, volume, ma5, ma20, ma60 FROM market_daily WHERE ticker = ? ORDER BY date ASC').all(ticker)
-
-      if (!market || market.length === 0) return NextResponse.json({ error: 'Data not found' }, { status: 404 })
+      // Bundles, date ranges and gzip are streamed; the plain single-ticker chart is cached as a file.
+      const tickers = (searchParams.get('tickers') || ticker).split(',').map(t => t.trim()).filter(Boolean)
+      const sector = searchParams.get('sector')
+      const start = searchParams.get('start')
+      const end = searchParams.get('end')
+      const compress = searchParams.get('gzip') === '1'
+      if (tickers.length > 1 || sector !== null || start || end || compress) {
+        const name = tickers.length === 1 && sector === null ? `${tickers[0]}_Chart.csv` : 'bundle_Chart.csv'
+        return new NextResponse(streamChartCsv({ tickers, sector, start, end }, compress), {
+          headers: {
+            'Content-Type': compress ? 'application/gzip' : 'text/csv; charset=utf-8',
+            'Content-Disposition': `attachment; filename="${encodeURIComponent(name)}${compress ? '.gz' : ''}"`
+          }
+        })
+      }
 
-      const header = "date,open,high,low,close,volume,ma5,ma20,ma60\n"
-      const rows = market.map((m: any) => 
-          `${m.date},${m.open},${m.high},${m.low},${m.close},${m.volume},${m.ma5||''},${m.ma20||''},${m.ma60||''}`
-      ).join("\n")
+      const chartTicker = tickers[0]
+      const chart = cachedChartFile(chartTicker)
+      if (!chart) return NextResponse.json({ error: 'Data not found' }, { status: 404 })
 
-      return new NextResponse(header + rows, {
+      if (notModified(request, chart.etag)) {
+        return new NextResponse(null, { status: 304, headers: { 'ETag': chart.etag } })
+      }
+      // Opened right away: a newer version renamed over the file later does not affect this handle.
+      const file = fs.createReadStream('', { fd: fs.openSync(chart.path, 'r') })
+      return new NextResponse(Readable.toWeb(file) as ReadableStream, {
         headers: {
           'Content-Type': 'text/csv; charset=utf-8',
-          'Content-Disposition': `attachment; filename="${encodeURIComponent(ticker)}_Chart.csv"`
+          'Content-Disposition': `attachment; filename="${encodeURIComponent(`${chartTicker}_Chart.csv`)}"`,
+          'ETag': chart.etag,
+          'Cache-Control': 'no-cache'
         }
       })
     }
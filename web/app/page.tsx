@@ -9,6 +9,9 @@ import { FinancialCharts } from '@/components/FinancialCharts'
 import { DownloadSection } from '@/components/DownloadSection'
 import { UsageGuide } from '@/components/UsageGuide'
 
+// How long the page waits on a collection job before giving up on it.
+const COLLECT_TIMEOUT_MS = 10 * 60 * 1000
+
 export default function Home() {
   const [query, setQuery] = useState('')
   const [data, setData] = useState<any>(null)
@@ -49,10 +52,26 @@ export default function Home() {
         body: JSON.stringify({ ticker })
       })
       
+      const json = await res.json()
       if (!res.ok) {
-        const json = await res.json()
         throw new Error(json.error || 'Collection failed')
       }
+
+      // The worker runs the job in the background; poll until it finishes or the deadline passes.
+      const deadline = Date.now() + COLLECT_TIMEOUT_MS
+      while (true) {
+        await new Promise(resolve => setTimeout(resolve, 2000))
+        const statusRes = await fetch(`/api/collect?id=${json.jobId}`)
+        const job = await statusRes.json()
+        if (!statusRes.ok) throw new Error(job.error || 'Collection failed')
+        if (job.status === 'done') break
+        if (job.status === 'failed') throw new Error(job.error || 'Collection failed')
+        if (Date.now() >= deadline) {
+          throw new Error(job.status === 'queued'
+            ? 'Collection is still queued. Check that the worker (python worker.py) is running.'
+            : 'Collection is still running. Search again in a few minutes.')
+        }
+      }
       
       // Success! Retry search
       handleSearch(new Event('submit') as any)
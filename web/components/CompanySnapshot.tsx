@@ -34,18 +34,18 @@ export function CompanySnapshot({ company, market, segments }: CompanySnapshotPr
   // Process Segments for Business Mix
   const segmentData = useMemo(() => {
     if (!segments || segments.length === 0) return []
-    // Filter for latest period
+    // Filter for latest period (rows arrive largest revenue first within a period)
     const latestPeriod = segments[0].period
-    const currentSegments = segments.filter(s => s.period === latestPeriod)
+    const currentSegments = segments.filter(s => s.period === latestPeriod && s.revenue_krw != null)
     
     // Calculate total revenue for percentage
-    const totalRevenue = currentSegments.reduce((sum, s) => sum + Number(s.revenue), 0)
+    const totalRevenue = currentSegments.reduce((sum, s) => sum + s.revenue_krw, 0)
     
     return currentSegments.map(s => ({
       name: s.division,
-      value: Number(s.revenue),
-      percent: (Number(s.revenue) / totalRevenue) * 100
-    })).sort((a, b) => b.value - a.value) // Sort largest first
+      value: s.revenue_krw,
+      percent: (s.revenue_krw / totalRevenue) * 100
+    }))
   }, [segments])
 
   return (
@@ -26,6 +26,7 @@ export function FinancialCharts({ financials, shareholders }: FinancialChartsPro
         </h3>
         <div className="h-64 md:h-80 w-full">
           <ResponsiveContainer width="100%" height="100%">
+            {/* Annual rows only (see /api/analyze), so each year is one group of bars */}
             <BarChart data={[...financials].reverse()}>
               <CartesianGrid strokeDasharray="3 3" stroke="var(--border)" vertical={false} />
               <XAxis dataKey="year" stroke="var(--muted-foreground)" tick={{fontSize: 12}} />
@@ -54,7 +55,7 @@ export function FinancialCharts({ financials, shareholders }: FinancialChartsPro
             <div className="text-2xl md:text-3xl font-bold text-foreground mb-1">
               {formatMoney(financials[0]?.rnd_expenses)}
             </div>
-            <div className="text-xs md:text-sm text-muted-foreground">최근 연간/분기 지출</div>
+            <div className="text-xs md:text-sm text-muted-foreground">최근 연간 지출</div>
          </div>
 
          {/* Shareholders Card */}
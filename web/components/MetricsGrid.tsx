@@ -21,27 +21,18 @@ export function MetricsGrid({ company, financials }: MetricsGridProps) {
     return val.toLocaleString()
   }
 
-  // Fallback Calculation for PER/PBR if DB value is missing
-  const latestFinancial = financials[0] || {}
+  // Fallback Calculation for PER/PBR if DB value is missing.
+  // /api/analyze returns annual rows only (quarter = 0), latest first.
+  const latestFinancial = financials.find((f) => f.quarter === 0) || {}
   
   let per = latestFinancial.per
   let pbr = latestFinancial.pbr
   
   // If PER is missing but we have Net Income and Market Cap
   if (!per && latestFinancial.net_income && company.market_cap) {
-    // Annualize Net Income if it looks like a quarterly figure (simple heuristic)
-    // Or just use as is if it's yearly. 
-    // For safety, let's just use the raw value if it's reasonable, or skip.
-    // Better heuristic: If net_income is < 1/10th of market cap, it might be quarterly? 
-    // Let's just try to calculate Price / EPS if we have EPS.
+    // Net income is a full-year figure here, so Market Cap / Net Income needs no annualizing.
     if (latestFinancial.eps) {
-       // We need price. We don't have price here, only market cap.
-       // Price = Market Cap / Shares. 
-       // Let's use Market Cap / Net Income directly.
-       // Assuming Net Income is for the period. If it's quarterly, we should multiply by 4.
-       // But `latestFinancial` might be yearly (quarter=0).
-       const factor = latestFinancial.quarter === 0 ? 1 : 4
-       per = (company.market_cap / (latestFinancial.net_income * factor)).toFixed(2)
+       per = (company.market_cap / latestFinancial.net_income).toFixed(2)
     }
   }
 
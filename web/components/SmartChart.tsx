@@ -28,9 +28,10 @@ export function SmartChart({ market, height = 400 }: SmartChartProps) {
       low: Number(d.low),
       close: Number(d.close),
       volume: Number(d.volume),
-      ma5: Number(d.ma5),
-      ma20: Number(d.ma20),
-      ma60: Number(d.ma60),
+      // Missing averages stay null so the lines start where the window fills
+      ma5: d.ma5 == null ? null : Number(d.ma5),
+      ma20: d.ma20 == null ? null : Number(d.ma20),
+      ma60: d.ma60 == null ? null : Number(d.ma60),
       // For candle color
       isUp: Number(d.close) >= Number(d.open)
     }))
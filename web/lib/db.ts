@@ -1,19 +1,68 @@
 import Database from 'better-sqlite3'
+import fs from 'fs'
 import path from 'path'
 
 // Assuming the web app is running from the 'web' directory
 // and data.db is in the parent directory.
 const dbPath = path.join(process.cwd(), '..', 'data.db')
 
-let db: any
+// Read-only snapshot published by the Python pipeline (processors/snapshot.py)
+// at the end of each batch. It is swapped in with an atomic rename, so page
+// loads never wait on collectors writing to data.db.
+const snapshotPath = path.join(process.cwd(), '..', 'data_read.db')
+const SNAPSHOT_CHECK_MS = 100 // stat() at most this often
+
+// Writes (jobs, feedback, popularity, artifact cache) go to data.db.
+let writeDb: any
 
 try {
-  db = new Database(dbPath, { verbose: console.log })
-  db.pragma('journal_mode = WAL')
+  writeDb = new Database(dbPath, { verbose: console.log })
+  writeDb.pragma('journal_mode = WAL')
+  writeDb.pragma('busy_timeout = 5000')
 } catch (error) {
   console.error('Failed to open database:', error)
   // Fallback or re-throw depending on how you want to handle it
   throw error
 }
 
+let snapshot: any = null
+let snapshotId = ''
+let checkedAt = 0
+
+// Returns the current snapshot, reopening it when a new one has been published.
+// Until the first snapshot exists, reads fall back to data.db.
+function readDb() {
+  const now = Date.now()
+  if (now - checkedAt >= SNAPSHOT_CHECK_MS) {
+    checkedAt = now
+    try {
+      const stat = fs.statSync(snapshotPath)
+      const id = `${stat.ino}-${stat.mtimeMs}`
+      if (id !== snapshotId) {
+        const previous = snapshot
+        snapshot = new Database(snapshotPath, { readonly: true, fileMustExist: true, verbose: console.log })
+        snapshotId = id
+        // The replaced file stays readable through open handles; statements are synchronous,
+        // so no query is running on the old connection here. Statements prepared on it
+        // stop working, though: anything that queries across requests or stream pulls
+        // must prepare through `db` each time (see streamChartCsv).
+        previous?.close()
+      }
+    } catch (error) {
+      // No snapshot published yet
+    }
+  }
+  return snapshot || writeDb
+}
+
+// Read connection; always resolves to the latest snapshot.
+const db: any = new Proxy({}, {
+  get(_target, prop) {
+    const conn = readDb()
+    const value = conn[prop]
+    return typeof value === 'function' ? value.bind(conn) : value
+  }
+})
+
+export { writeDb }
 export default db
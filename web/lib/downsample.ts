@@ -0,0 +1,92 @@
+// Chart payload helpers for the analyze route: moving averages for rollup
+// series and Largest-Triangle-Three-Buckets downsampling that keeps candles valid.
+
+export interface Candle {
+  date: string
+  open: number
+  high: number
+  low: number
+  close: number
+  volume: number
+  [key: string]: any
+}
+
+// Indices picked by LTTB on (index, value): first and last points are kept and
+// each bucket in between contributes the point forming the largest triangle
+// with the previous pick and the next bucket's average, so peaks and troughs survive.
+export function lttbIndices(values: number[], threshold: number): number[] {
+  const n = values.length
+  if (threshold >= n || threshold < 3) return values.map((_, i) => i)
+
+  const picked = [0]
+  const bucketSize = (n - 2) / (threshold - 2)
+  let a = 0
+  for (let bucket = 0; bucket < threshold - 2; bucket++) {
+    const start = Math.floor(bucket * bucketSize) + 1
+    const end = Math.min(Math.floor((bucket + 1) * bucketSize) + 1, n - 1)
+
+    // Average of the next bucket (the last point for the final bucket)
+    const nextStart = end
+    const nextEnd = Math.min(Math.floor((bucket + 2) * bucketSize) + 1, n)
+    let avgX = 0
+    let avgY = 0
+    for (let i = nextStart; i < nextEnd; i++) {
+      avgX += i
+      avgY += values[i]
+    }
+    const count = Math.max(nextEnd - nextStart, 1)
+    avgX /= count
+    avgY /= count
+
+    let best = start
+    let bestArea = -1
+    for (let i = start; i < end; i++) {
+      const area = Math.abs((a - avgX) * (values[i] - values[a]) - (a - i) * (avgY - values[a]))
+      if (area > bestArea) {
+        bestArea = area
+        best = i
+      }
+    }
+    picked.push(best)
+    a = best
+  }
+  picked.push(n - 1)
+  return picked
+}
+
+// Caps a candle series at maxPoints. Points are picked by LTTB on the close;
+// each kept candle absorbs the dropped ones since the previous pick (first open,
+// max high, min low, summed volume), so the chart still spans every price traded.
+export function downsampleCandles(rows: Candle[], maxPoints: number): Candle[] {
+  if (rows.length <= maxPoints) return rows
+  const indices = lttbIndices(rows.map(r => Number(r.close)), maxPoints)
+  const out: Candle[] = []
+  let from = 0
+  for (const index of indices) {
+    const span = rows.slice(from, index + 1)
+    out.push({
+      ...rows[index],
+      open: span[0].open,
+      high: Math.max(...span.map(r => Number(r.high))),
+      low: Math.min(...span.map(r => Number(r.low))),
+      volume: span.reduce((sum, r) => sum + Number(r.volume || 0), 0),
+    })
+    from = index + 1
+  }
+  return out
+}
+
+// Simple moving averages of the close over the series' own interval (MA5 on
+// weekly candles is five weeks); null until the window is full.
+export function withMovingAverages(rows: Candle[], windows = [5, 20, 60]): Candle[] {
+  const sums = windows.map(() => 0)
+  return rows.map((row, i) => {
+    const out: Candle = { ...row }
+    windows.forEach((w, k) => {
+      sums[k] += Number(row.close)
+      if (i >= w) sums[k] -= Number(rows[i - w].close)
+      out[`ma${w}`] = i >= w - 1 ? sums[k] / w : null
+    })
+    return out
+  })
+}
@@ -0,0 +1,129 @@
+import argparse
+import os
+import socket
+import time
+import traceback
+from job_queue import JobQueue
+from collector import collect_all
+from stages import StageContext, resolve_ticker
+from processors.snapshot import publish_snapshot
+
+# Longest a finished job waits for the snapshot when jobs keep arriving.
+BATCH_MAX_SECONDS = 120
+# Publishing copies the whole database, so its cost grows with the database, not
+# the batch: with one-ticker jobs arriving one by one, publish at most this often.
+PUBLISH_MIN_SECONDS = 30
+
+class CollectorWorker:
+    """
+    Long-running collector. Takes jobs from the collection_jobs queue and runs
+    them in-process, so interpreter start-up, library imports, the DART corp-code
+    table and the KRX listing are paid once per worker rather than once per request.
+    """
+    def __init__(self, worker_id=None, poll_interval=1.0):
+        # Unique per process, so workers sharing a host never requeue each other's jobs.
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.queue = JobQueue()
+        self.ctx = StageContext()
+
+    def recover(self):
+        """
+        Requeues jobs left running under this worker's id and by workers on this
+        host that have exited: a default id ends in the pid, so a process that is
+        gone cannot still be executing its jobs. Returns the number requeued.
+        """
+        host = socket.gethostname()
+        recovered = self.queue.recover(self.worker_id)
+        for worker_id in self.queue.running_workers():
+            prefix, _, pid = worker_id.rpartition("-")
+            if worker_id == self.worker_id or prefix != host or not pid.isdigit():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                recovered += self.queue.recover(worker_id)
+            except PermissionError:
+                pass # alive, owned by another user
+        return recovered
+
+    def run_job(self, job):
+        query = job['query']
+        print(f"\n[job {job['id']}] Collecting '{query}' ({job['requests']} request(s))...")
+        started = time.perf_counter()
+        try:
+            ticker = resolve_ticker(self.ctx, query)
+            if not ticker:
+                self.queue.fail(job['id'], f"Could not resolve ticker for '{query}'")
+                return False
+            self.queue.set_ticker(job['id'], ticker)
+            collect_all(ticker, self.ctx)
+            print(f"[job {job['id']}] Collected in {time.perf_counter() - started:.1f}s")
+            return True
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.fail(job['id'], e)
+        return False
+
+    def publish(self, job_ids):
+        """
+        Publishes the web tier's read snapshot, then marks the batch's jobs done,
+        so a job only reports done once its data is visible to the web app.
+        The snapshot is not VACUUMed here; processors/snapshot.py compacts it.
+        """
+        try:
+            publish_snapshot(vacuum=False)
+        except Exception as e:
+            print(f"Failed to publish read snapshot: {e}")
+        for job_id in job_ids:
+            self.queue.finish(job_id)
+
+    def run(self, once=False):
+        """Processes jobs until stopped; with once, exits when the queue is empty."""
+        # Pay every import and client set-up once, before the first job arrives.
+        self.ctx.warm_up()
+        self.ctx.collector("company").dart # Shared OpenDART reader (downloads the corp-code table)
+        recovered = self.recover()
+        if recovered:
+            print(f"Recovered {recovered} interrupted job(s).")
+        print(f"Collector worker {self.worker_id} started. Waiting for jobs...")
+
+        batch, batch_started, published_at = [], time.perf_counter(), float("-inf")
+        while True:
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                # A batch held back by PUBLISH_MIN_SECONDS is published once it has waited long enough.
+                if batch and (once or time.perf_counter() - published_at >= PUBLISH_MIN_SECONDS):
+                    self.publish(batch)
+                    batch, published_at = [], time.perf_counter()
+                if once:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            if not batch:
+                batch_started = time.perf_counter()
+            if self.run_job(job):
+                batch.append(job['id'])
+            # A batch ends when the queue drains (or runs too long under steady load).
+            if (batch and time.perf_counter() - published_at >= PUBLISH_MIN_SECONDS
+                    and (self.queue.pending() == 0 or time.perf_counter() - batch_started > BATCH_MAX_SECONDS)):
+                self.publish(batch)
+                batch, published_at = [], time.perf_counter()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smart Data Feeder collector worker")
+    parser.add_argument("--id", help="Worker id (default: <hostname>-<pid>)")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between queue polls when idle")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    parser.add_argument("--enqueue", nargs="+", metavar="TICKER", help="Queue tickers/names and exit")
+    parser.add_argument("--status", type=int, metavar="JOB_ID", help="Print a job's status and exit")
+    args = parser.parse_args()
+
+    if args.enqueue:
+        queue = JobQueue()
+        for query in args.enqueue:
+            print(f"Queued '{query}' as job {queue.enqueue(query)}")
+    elif args.status is not None:
+        print(JobQueue().status(args.status) or f"Job {args.status} not found")
+    else:
+        CollectorWorker(args.id, args.poll_interval).run(once=args.once)